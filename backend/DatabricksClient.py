@@ -1,13 +1,117 @@
 from databricks_langchain import ChatDatabricks
+import asyncio
+import functools
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, List, Dict, Any
 from dotenv import load_dotenv
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, BaseCallbackHandler
 from langchain_core.language_models import BaseChatModel
-from langchain_core.messages import BaseMessage
+from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.outputs import LLMResult
+from uuid import UUID
+
+from tracing import Span, Tracer, tracer
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Upper bound on in-flight requests per serving endpoint, shared by every user of the endpoint
+MAX_CONCURRENCY_PER_ENDPOINT = int(os.getenv("DATABRICKS_MAX_CONCURRENCY", "16"))
+
+_endpoint_slots: Dict[str, threading.BoundedSemaphore] = {}
+_endpoint_slots_lock = threading.Lock()
+
+# Async callers wait for a slot here, never on the default executor: its threads
+# run the next()/finish() calls the slot holders need to make progress
+_slot_waiters = ThreadPoolExecutor(thread_name_prefix="endpoint-slots")
+
+def _slots_for(endpoint: str) -> threading.BoundedSemaphore:
+    with _endpoint_slots_lock:
+        if endpoint not in _endpoint_slots:
+            _endpoint_slots[endpoint] = threading.BoundedSemaphore(MAX_CONCURRENCY_PER_ENDPOINT)
+        return _endpoint_slots[endpoint]
+
+
+async def _aacquire(slots: threading.BoundedSemaphore) -> None:
+    acquiring = asyncio.get_running_loop().run_in_executor(_slot_waiters, slots.acquire)
+    try:
+        await asyncio.shield(acquiring)
+    except asyncio.CancelledError:
+        # The waiter thread still gets the slot eventually; hand it straight back
+        acquiring.add_done_callback(lambda _: slots.release())
+        raise
+
+
+class PooledChatDatabricks(ChatDatabricks):
+    """ChatDatabricks that limits concurrent requests per endpoint.
+
+    ChatDatabricks makes its HTTP calls synchronously and the async APIs run
+    them in an executor, so one thread semaphore per endpoint bounds every
+    path. A streaming call holds its slot until the stream is exhausted or
+    closed; the async stream also closes the HTTP stream and frees the slot
+    when the consumer is cancelled or drops it. Async calls wait for a slot
+    on their own threads so waiters can't starve the executor the slot
+    holders run on.
+    """
+
+    def _endpoint_name(self) -> str:
+        # The serving endpoint field is called `model` (alias `endpoint`) in newer releases
+        return getattr(self, "model", None) or getattr(self, "endpoint", "")
+
+    def _generate(self, *args: Any, **kwargs: Any):
+        with _slots_for(self._endpoint_name()):
+            return super()._generate(*args, **kwargs)
+
+    def _stream(self, *args: Any, **kwargs: Any):
+        slots = _slots_for(self._endpoint_name())
+        slots.acquire()
+        try:
+            yield from super()._stream(*args, **kwargs)
+        finally:
+            slots.release()
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any):
+        slots = _slots_for(self._endpoint_name())
+        await _aacquire(slots)
+        generating = asyncio.get_running_loop().run_in_executor(None, functools.partial(
+            super()._generate, messages, stop, run_manager.get_sync() if run_manager else None, **kwargs))
+        # Released when the request finishes on its thread, even if the caller is cancelled first
+        generating.add_done_callback(lambda _: slots.release())
+        return await asyncio.shield(generating)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any):
+        loop = asyncio.get_running_loop()
+        slots = _slots_for(self._endpoint_name())
+        await _aacquire(slots)
+
+        chunks = super()._stream(messages, stop, run_manager.get_sync() if run_manager else None, **kwargs)
+        done = object()
+        pending = None
+        try:
+            while True:
+                pending = loop.run_in_executor(None, next, chunks, done)
+                chunk = await asyncio.shield(pending)  # so pending.done() tracks the thread
+                if chunk is done:
+                    return
+                yield chunk
+        finally:
+            def finish() -> None:
+                try:
+                    chunks.close()
+                finally:
+                    slots.release()
+
+            if pending is not None and not pending.done():
+                # Cancelled mid-chunk: the generator is still running on its thread, close it once next() returns
+                pending.add_done_callback(lambda _: loop.run_in_executor(None, finish))
+            else:
+                loop.run_in_executor(None, finish)
+
+
 class DatabricksChatModel:
     def __init__(
         self,
@@ -15,8 +119,15 @@ class DatabricksChatModel:
         token: Optional[str] = None,
         endpoint: str = "databricks-claude-sonnet-4",
         temperature: float = 0.1,
-        max_tokens: int = 1000
+        max_tokens: int = 1000,
+        chat_model: Optional[BaseChatModel] = None
     ):
+        self.tools = None
+        if chat_model is not None:
+            # A stand-in model (see fake_chat_model.py); no Databricks credentials needed
+            self.chat_model = chat_model
+            return
+
         # Use environment variables if not provided
         self.host = host or os.getenv("DATABRICKS_HOST")
         self.token = token or os.getenv("DATABRICKS_TOKEN")
@@ -28,12 +139,11 @@ class DatabricksChatModel:
         os.environ["DATABRICKS_HOST"] = self.host
         os.environ["DATABRICKS_TOKEN"] = self.token
             
-        self.chat_model = ChatDatabricks(
+        self.chat_model = PooledChatDatabricks(
             endpoint=endpoint,
             temperature=temperature,
             max_tokens=max_tokens,
         )
-        self.tools = None
     
     def bind_tools(self, tools: List[Any]) -> 'DatabricksChatModel':
         """Bind tools to the chat model."""
@@ -45,3 +155,202 @@ class DatabricksChatModel:
         """Invoke the chat model with messages."""
         return self.chat_model.invoke(messages)
 
+
+_models: Dict[tuple, DatabricksChatModel] = {}
+_models_lock = threading.Lock()
+
+def get_chat_model(
+    endpoint: str = "databricks-claude-sonnet-4",
+    temperature: float = 0.1,
+    max_tokens: int = 1000
+) -> DatabricksChatModel:
+    """Return the process-wide DatabricksChatModel for these settings, creating it once.
+
+    Sharing the model shares its HTTP client and keep-alive connections across
+    sessions. Don't call bind_tools on the shared instance; bind on
+    `.chat_model`, which returns a new runnable.
+
+    With FAKE_CHAT_MODEL=1 every model is the offline stand-in from
+    fake_chat_model.py, configured from its FAKE_CHAT_MODEL_* variables.
+    """
+    key = (endpoint, temperature, max_tokens)
+    with _models_lock:
+        if key not in _models:
+            if os.getenv("FAKE_CHAT_MODEL", "0").lower() in ("1", "true", "yes"):
+                from fake_chat_model import FakeChatModel
+                _models[key] = DatabricksChatModel(chat_model=FakeChatModel.from_env())
+            else:
+                _models[key] = DatabricksChatModel(endpoint=endpoint, temperature=temperature, max_tokens=max_tokens)
+        return _models[key]
+
+
+def prompt_cache_enabled() -> bool:
+    """Prompt caching is opt-in: PROMPT_CACHE=1 for endpoints that accept cache_control (Claude)."""
+    return os.getenv("PROMPT_CACHE", "0").lower() in ("1", "true", "yes")
+
+
+def cached_system_message(prompt: str, enabled: Optional[bool] = None) -> SystemMessage:
+    """Build the system message with a cache-control marker on the static prefix.
+
+    Endpoints that honor the marker (Claude on Databricks) cache everything up to
+    and including it, i.e. the tool schemas and the system prompt, so the
+    intermediate ReAct steps of a turn only pay for the new messages. Other
+    endpoints may reject content blocks carrying the marker, hence opt-in.
+    """
+    if enabled is None:
+        enabled = prompt_cache_enabled()
+    if not enabled:
+        return SystemMessage(content=prompt)
+    return SystemMessage(content=[{"type": "text", "text": prompt, "cache_control": {"type": "ephemeral"}}])
+
+
+class PromptCacheUsage(BaseCallbackHandler):
+    """Callback that totals cached vs. uncached prompt tokens over one request's model calls.
+
+    Understands LangChain usage_metadata as well as OpenAI style
+    (prompt_tokens_details.cached_tokens) and Anthropic style
+    (cache_read_input_tokens / cache_creation_input_tokens) usage payloads.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self.model_calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.cache_write_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = self._usage_of(message, response.llm_output or {})
+                with self._lock:
+                    self.model_calls += 1
+                    self.prompt_tokens += usage["prompt"]
+                    self.cached_tokens += usage["cached"]
+                    self.cache_write_tokens += usage["cache_write"]
+                    self.completion_tokens += usage["completion"]
+
+    @staticmethod
+    def _usage_of(message: Optional[BaseMessage], llm_output: Dict[str, Any]) -> Dict[str, int]:
+        usage_metadata = getattr(message, "usage_metadata", None)
+        if usage_metadata:
+            details = usage_metadata.get("input_token_details") or {}
+            return {
+                "prompt": usage_metadata.get("input_tokens", 0),
+                "cached": details.get("cache_read", 0),
+                "cache_write": details.get("cache_creation", 0),
+                "completion": usage_metadata.get("output_tokens", 0),
+            }
+
+        usage = (getattr(message, "response_metadata", None) or {}).get("usage") or llm_output.get("usage") or {}
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or usage.get("cache_read_input_tokens", 0)
+        cache_write = usage.get("cache_creation_input_tokens", 0)
+        prompt = usage.get("prompt_tokens")
+        if prompt is None:
+            # Anthropic reports input_tokens excluding the cached part
+            prompt = usage.get("input_tokens", 0) + cached + cache_write
+        return {
+            "prompt": prompt or 0,
+            "cached": cached or 0,
+            "cache_write": cache_write or 0,
+            "completion": usage.get("completion_tokens", usage.get("output_tokens", 0)) or 0,
+        }
+
+    def as_dict(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "model_calls": self.model_calls,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_prompt_tokens": self.cached_tokens,
+                "cache_write_prompt_tokens": self.cache_write_tokens,
+                "uncached_prompt_tokens": self.prompt_tokens - self.cached_tokens,
+                "completion_tokens": self.completion_tokens,
+            }
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Turns LangChain model and tool runs into spans ("model.call", "tool.call").
+
+    Model spans carry prompt and completion token counts. Chains (graph
+    nodes, the nested provider search agent) get no span of their own, but
+    runs inside them are parented to the closest enclosing span.
+    """
+
+    run_inline = True
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self._spans: Dict[UUID, Span] = {}  # model/tool run -> its span
+        self._parents: Dict[UUID, Span] = {}  # chain run -> span its children belong to
+        self._lock = threading.Lock()
+
+    def _parent_of(self, parent_run_id: Optional[UUID]) -> Optional[Span]:
+        with self._lock:
+            parent = self._spans.get(parent_run_id) or self._parents.get(parent_run_id)
+        return parent or self.tracer.current()
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], name: str, **attributes: Any) -> None:
+        span = self.tracer.start(name, parent=self._parent_of(parent_run_id), **attributes)
+        with self._lock:
+            self._spans[run_id] = span
+
+    def _finish(self, run_id: UUID, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            span = self._spans.pop(run_id, None)
+        if span is not None:
+            self.tracer.finish(span, error)
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID,
+                            parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        model = (kwargs.get("metadata") or {}).get("ls_model_name") or (serialized or {}).get("name", "")
+        self._start(run_id, parent_run_id, "model.call", model=model, messages=sum(len(batch) for batch in messages))
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = PromptCacheUsage._usage_of(getattr(generation, "message", None), response.llm_output or {})
+                prompt_tokens += usage["prompt"]
+                completion_tokens += usage["completion"]
+        with self._lock:
+            span = self._spans.get(run_id)
+        if span is not None:
+            span.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        self.tracer.metrics.add_tokens("prompt", prompt_tokens)
+        self.tracer.metrics.add_tokens("completion", completion_tokens)
+        self._finish(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, error)
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID,
+                      parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        self._start(run_id, parent_run_id, "tool.call", tool=(serialized or {}).get("name", ""))
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, error)
+
+    def on_chain_start(self, serialized: Dict[str, Any], inputs: Any, *, run_id: UUID,
+                       parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        parent = self._parent_of(parent_run_id)
+        if parent is not None:
+            with self._lock:
+                self._parents[run_id] = parent
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            self._parents.pop(run_id, None)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            self._parents.pop(run_id, None)
+
+
+tracing_callbacks = TracingCallbackHandler(tracer)
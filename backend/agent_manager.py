@@ -3,108 +3,192 @@ from databricks.sdk import WorkspaceClient
 from databricks.sdk.service.serving import EndpointCoreConfigInput
 import json
 import asyncio
-from datetime import datetime
+import os
+from contextlib import aclosing
+from answer_cache import CachedAnswer, SemanticAnswerCache, get_answer_cache, is_personalized
 from chat_graph_manager import ChatGraphManager
-from plan_manager import PlanManager
+from plan_service import get_plan_service
+from DatabricksClient import PromptCacheUsage
+from idle_cache import user_cache
+from session_store import SessionStore, get_session_store
+from tool_executor import run_blocking
+from tracing import tracer
+from transcript import TranscriptMessage
+from turn_queue import TurnQueue
 
 class AgentManager:
-    def __init__(self, workspace_client: Optional[WorkspaceClient] = None):
-        """Initialize the AgentManager with optional workspace client for Databricks integration."""
+    def __init__(self, workspace_client: Optional[WorkspaceClient] = None, chat_graph: Optional[ChatGraphManager] = None,
+                 session_store: Optional[SessionStore] = None, coalesce_turns: Optional[bool] = None,
+                 answer_cache: Optional[SemanticAnswerCache] = None):
+        """Initialize the AgentManager with optional workspace client for Databricks integration.
+
+        Transcripts and per-turn usage live in the session store (SESSION_STORE),
+        so any worker can serve any user's next message. A user's turns run one
+        at a time; with coalesce_turns (default: the TURN_COALESCE environment
+        variable) messages sent during a turn are answered together by the next one.
+        Nothing per user is kept here beyond the recently active users
+        (MAX_RESIDENT_USERS, USER_IDLE_SECONDS).
+        With an answer cache (default: when ANSWER_CACHE is on), generic questions
+        that were answered before are served from it instead of the graph. A
+        generic question it can't answer goes to the model on its own, without
+        the conversation, the plan or tools, and that answer is stored, so no
+        user's details can reach another user.
+        """
         self.workspace_client = workspace_client
-        self.conversation_history: Dict[str, List[Dict]] = {}  # username -> messages
-        self.pregnancy_plans: Dict[str, Dict] = {}  # username -> plan data
-        self.chat_graph = ChatGraphManager()
-        self.plan_manager = PlanManager()
+        self.session_store = session_store or get_session_store()
+        self.chat_graph = chat_graph or ChatGraphManager()
+        self.history_manager = self.chat_graph.history_manager
+        self.plan_service = get_plan_service()
+        if coalesce_turns is None:
+            coalesce_turns = os.getenv("TURN_COALESCE", "0").lower() in ("1", "true", "yes")
+        self.turn_queue = TurnQueue(coalesce=coalesce_turns)
+        self.answer_cache = answer_cache or get_answer_cache()
+        # The model's view of a conversation is compacted by the history manager; this
+        # transcript is only for display, so just the most recent messages are kept
+        self.max_history_messages = 200
+        self._restored = user_cache()  # users whose transcript this process has recently checked
+
+    async def _load_history(self, username: str) -> List[Dict]:
+        """The user's transcript, restored from the graph checkpoint if the store has none."""
+        history = await self.session_store.aget_list(f"transcript:{username}")
+        self._restored.set(username, True)
+        if history:
+            return [TranscriptMessage.from_stored(message).to_dict() for message in history]
+        history = (await self.chat_graph.aget_messages(username))[-self.max_history_messages:]
+        for message in history:
+            await self._append_history(username, TranscriptMessage.from_stored(message))
+        return history
+
+    async def _append_history(self, username: str, message: TranscriptMessage) -> None:
+        await self.session_store.aappend(f"transcript:{username}", message, max_len=self.max_history_messages)
 
     async def start_conversation(self, username: str) -> AsyncGenerator[str, None]:
         """Initialize a new conversation for a user and get initial response."""
-        if username not in self.conversation_history:
-            self.conversation_history[username] = []
-            self.pregnancy_plans[username] = {
-                "content": "",
-                "last_updated": datetime.now().isoformat()
-            }
+        # Users with a checkpointed conversation pick up where they left off
+        if not await self._load_history(username):
             # Note: Plan will be automatically initialized when first written to by the agent
             
-            # Create initial message to start the conversation
-            initial_message = {
-                "role": "user",
-                "content": "Hello, I'm ready to help you with your pregnancy journey. Let's get started!",
-                "timestamp": datetime.now().isoformat()
-            }
-            
-            # Add to conversation history
-            self.conversation_history[username].append(initial_message)
+            # Initial message to start the conversation
+            initial_message = "Hello, I'm ready to help you with your pregnancy journey. Let's get started!"
             
-            # Process the conversation (which now has the initial message)
-            async for chunk in self.process_message(username, initial_message["content"]):
+            async for chunk in self.process_message(username, initial_message):
                 yield chunk
 
     async def process_message(self, username: str, message: str) -> AsyncGenerator[str, None]:
-        """Process a user message and yield responses as they come in."""
-        if username not in self.conversation_history:
-            await self.start_conversation(username)
+        """Process a user message and yield the assistant's text as it is generated."""
+        async with aclosing(self.stream_turn(username, message)) as frames:
+            async for frame in frames:
+                if frame["type"] in ("token", "error"):
+                    yield frame["content"]
+
+    async def stream_turn(self, username: str, message: str) -> AsyncGenerator[Dict, None]:
+        """Process a user message and yield protocol frames as they come in.
+
+        Frames are token deltas, tool_start/tool_end events, and a final
+        "done" frame carrying the complete response (or an "error" frame).
+        A "coalesced" frame first means the turn also answers other messages.
+        """
+        # Closing this generator early (the client went away) cancels the turn
+        async with aclosing(self.turn_queue.submit(username, message, self._run_turn)) as frames:
+            async for frame in frames:
+                yield frame
+
+    async def _run_turn(self, username: str, message: str) -> AsyncGenerator[Dict, None]:
+        if username not in self._restored:
+            await self._load_history(username)
 
         # Add user message to history
-        user_message = {
-            "role": "user",
-            "content": message,
-            "timestamp": datetime.now().isoformat()
-        }
-        self.conversation_history[username].append(user_message)
+        await self._append_history(username, TranscriptMessage.now("user", message))
+        self.history_manager.start_turn(username)
+        prompt_cache_usage = PromptCacheUsage()
 
         try:
-            # Convert conversation history to the format expected by LangGraph
-            langgraph_messages = []
-            for msg in self.conversation_history[username]:
-                langgraph_messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"]
-                })
+            cached = await self._cached_answer(message)
+            if cached is not None:
+                await self._record_exchange(username, message, cached.answer)
+                yield {"type": "token", "content": cached.answer}
+                yield {"type": "done", "content": cached.answer, "cached": True}
+                return
+
+            if self.answer_cache is not None and not is_personalized(message):
+                # The answer depends on nothing but the question, so every user can be given it
+                response_parts = []
+                async for text in self.chat_graph.astream_generic_answer(message, callbacks=[prompt_cache_usage]):
+                    response_parts.append(text)
+                    yield {"type": "token", "content": text}
+                response_content = "".join(response_parts)
+                await self._record_exchange(username, message, response_content)
+                await self.session_store.aset(f"prompt_cache_usage:{username}", prompt_cache_usage.as_dict())
+                await run_blocking(self.answer_cache.store, message, response_content)
+                yield {"type": "done", "content": response_content}
+                return
+
+            # Earlier turns live in the graph checkpoint, only the new message is sent
+            langgraph_messages = [{"role": "user", "content": message}]
             
-            # Process message through ChatGraphManager with full history
-            response_content = ""
-            for event in self.chat_graph.stream_message(langgraph_messages, username):
-                for value in event.values():
-                    if "messages" in value and value["messages"]:
-                        response = value["messages"][-1]
-                        response_content = response.content
-                        yield response.content
+            response_parts = []
+            async for frame in self.chat_graph.astream_events(langgraph_messages, username, callbacks=[prompt_cache_usage]):
+                if frame["type"] == "token":
+                    response_parts.append(frame["content"])
+                yield frame
+            response_content = "".join(response_parts)
 
             # Add assistant response to history
-            self.conversation_history[username].append({
-                "role": "assistant",
-                "content": response_content,
-                "timestamp": datetime.now().isoformat()
-            })
+            await self._append_history(username, TranscriptMessage.now("assistant", response_content))
+            await self.session_store.aset(f"prompt_cache_usage:{username}", prompt_cache_usage.as_dict())
+            yield {"type": "done", "content": response_content}
 
+        except asyncio.CancelledError:
+            # The client went away; leave the conversation in a state the next turn can build on
+            await self.chat_graph.aclose_pending_tool_calls(username)
+            await self._append_history(username, TranscriptMessage.now("system", "Response cancelled: the client disconnected."))
+            raise
         except Exception as e:
             error_message = f"Error processing message: {str(e)}"
-            yield error_message
-            self.conversation_history[username].append({
-                "role": "system",
-                "content": error_message,
-                "timestamp": datetime.now().isoformat()
-            })
+            yield {"type": "error", "content": error_message}
+            await self._append_history(username, TranscriptMessage.now("system", error_message))
+
+    async def _record_exchange(self, username: str, message: str, answer: str) -> None:
+        """Save a turn answered outside the graph to the checkpoint, so later turns can refer to it, and the transcript."""
+        await self.chat_graph.arecord_exchange(username, message, answer)
+        await self._append_history(username, TranscriptMessage.now("assistant", answer))
+
+    async def _cached_answer(self, message: str) -> Optional[CachedAnswer]:
+        if self.answer_cache is None:
+            return None
+        with tracer.span("answer_cache.lookup") as span:
+            cached = await run_blocking(self.answer_cache.lookup, message)
+            span.set(hit=cached is not None)
+            return cached
+
+    async def aclose(self) -> None:
+        """Release the chat graph's checkpointer connection; call on shutdown."""
+        await self.chat_graph.aclose()
 
     async def get_conversation_history(self, username: str) -> List[Dict]:
         """Get the conversation history for a user."""
-        return self.conversation_history.get(username, [])
+        return await self._load_history(username)
+
+    def get_turn_metrics(self, username: str) -> Dict[str, int]:
+        """Tokens in the conversation vs. tokens sent to the model during the user's last turn."""
+        return self.history_manager.turn_metrics(username)
+
+    def get_turn_queue_stats(self) -> Dict[str, int]:
+        """Queue depth and coalescing counters of the per-user turn queue."""
+        return self.turn_queue.stats()
+
+    def get_answer_cache_stats(self) -> Dict:
+        """Hit rate and size of the semantic answer cache (empty when it is off)."""
+        return self.answer_cache.stats() if self.answer_cache is not None else {}
+
+    def get_prompt_cache_usage(self, username: str) -> Dict[str, int]:
+        """Cached vs. uncached prompt tokens over the model calls of the user's last turn."""
+        return self.session_store.get(f"prompt_cache_usage:{username}") or {}
 
     async def get_pregnancy_plan(self, username: str) -> Dict:
         """Get the pregnancy plan for a user."""
-        return self.pregnancy_plans.get(username, {
-            "content": "",
-            "last_updated": datetime.now().isoformat()
-        })
+        return await self.plan_service.aget_plan(username)
 
     async def update_pregnancy_plan(self, username: str, content: str) -> Dict:
         """Update the pregnancy plan for a user."""
-        if username not in self.pregnancy_plans:
-            await self.start_conversation(username)
-        
-        self.pregnancy_plans[username] = {
-            "content": content,
-            "last_updated": datetime.now().isoformat()
-        }
-        return self.pregnancy_plans[username]
\ No newline at end of file
+        return await self.plan_service.awrite_plan(username, content)
@@ -0,0 +1,334 @@
+import hashlib
+import itertools
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # optional; questions are embedded with feature hashing instead
+    SentenceTransformer = None
+
+Vector = Dict[int, float]  # sparse, L2-normalized
+
+STOPWORDS = frozenset(
+    "a an the is are was were be been do does did can could should would will i you it its to of in on at for "
+    "with about during while when what how why which who much many any some and or if there this my me".split()
+)
+
+# Questions about the user's own situation, or that only make sense in the conversation, bypass the cache
+PERSONAL = re.compile(
+    r"\b(my|mine|me|i'm|im|i am|i've|i have|i had|i was|i live|we|we're|our|us|myself)\b"
+    r"|\b(that|those|these|them|above|previous|earlier|again|instead)\b"
+    r"|\b(find|book|schedule|remind|update|add|remove|change|set|plan)\b",
+    re.IGNORECASE,
+)
+# Answers that draw on the user's plan or earlier messages are not reusable either
+PERSONAL_ANSWER = re.compile(
+    r"\byour (plan|due date|provider|doctor|appointment|location|checklist|insurance)\b|\byou mentioned\b|\byou told\b|\byou're \d+",
+    re.IGNORECASE,
+)
+# Words that change the answer even when the rest of the question matches ("first" vs "third" trimester)
+QUALIFIERS = re.compile(r"\b(\d+\w*|first|second|third|one|two|three|four|five|six|seven|eight|nine|ten|twins?)\b", re.IGNORECASE)
+
+
+def _tokens(text: str) -> List[str]:
+    words = re.findall(r"[a-z0-9']+", text.casefold())
+    return [w[:-1] if len(w) > 3 and w.endswith("s") else w for w in words if w not in STOPWORDS]
+
+
+def _normalize(weights: Dict[int, float]) -> Vector:
+    norm = math.sqrt(sum(w * w for w in weights.values()))
+    return {i: w / norm for i, w in weights.items()} if norm else {}
+
+
+def _dot(a: Vector, b: Vector) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(i, 0.0) for i, w in a.items())
+
+
+def is_personalized(question: str) -> bool:
+    """Whether a message depends on the user (their plan, situation or the conversation so far)."""
+    return bool(PERSONAL.search(question)) or len(question) > 300 or len(_tokens(question)) < 2
+
+
+class HashingEmbedder:
+    """Embeds text by hashing words, word pairs and character trigrams into `dim` buckets.
+
+    Needs nothing beyond the standard library and is deterministic. It sees
+    shared wording rather than meaning, so it suits a high similarity threshold.
+    """
+
+    name = "hashing"
+    default_threshold = 0.8
+
+    def __init__(self, dim: int = 4096):
+        self.dim = dim
+
+    def _bucket(self, feature: str) -> Tuple[int, float]:
+        digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        return value % self.dim, 1.0 if value >> 63 else -1.0
+
+    def embed(self, text: str) -> Vector:
+        words = _tokens(text)
+        features = [(w, 1.0) for w in words]
+        features += [(f"{a} {b}", 1.0) for a, b in zip(words, words[1:])]
+        features += [(f"#{w[i:i + 3]}", 0.3) for w in words for i in range(max(len(w) - 2, 1))]
+        weights: Dict[int, float] = defaultdict(float)
+        for feature, weight in features:
+            bucket, sign = self._bucket(feature)
+            weights[bucket] += sign * weight
+        return _normalize(weights)
+
+
+class SentenceTransformerEmbedder:
+    """Embeds text with a local sentence-transformers model on the CPU."""
+
+    default_threshold = 0.88
+
+    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
+        self.name = model_name
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self._lock = threading.Lock()
+
+    def embed(self, text: str) -> Vector:
+        with self._lock:
+            values = self.model.encode(text, normalize_embeddings=True)
+        return {i: float(v) for i, v in enumerate(values)}
+
+
+def create_embedder(spec: str = "auto"):
+    """"hashing", "sentence-transformers[:model]" or "auto" (the model if the package is installed)."""
+    if spec == "hashing" or (spec == "auto" and SentenceTransformer is None):
+        return HashingEmbedder()
+    if spec in ("auto", "sentence-transformers"):
+        return SentenceTransformerEmbedder()
+    if spec.startswith("sentence-transformers:"):
+        return SentenceTransformerEmbedder(spec[len("sentence-transformers:"):])
+    raise ValueError(f"Unsupported ANSWER_CACHE_EMBEDDER: {spec}")
+
+
+class SimHashIndex:
+    """Approximate nearest neighbours by cosine similarity, with random-hyperplane LSH.
+
+    Each of `tables` hash tables buckets a vector by the signs of its
+    projections onto `bits` random hyperplanes; similar vectors tend to share
+    a bucket in at least one table. Candidates are then scored exactly.
+    """
+
+    def __init__(self, tables: int = 8, bits: int = 12, seed: int = 0):
+        self.tables = tables
+        self.bits = bits
+        self.seed = seed
+        self._planes: Dict[int, List[float]] = {}  # dimension -> tables * bits hyperplane components
+        self._buckets: Dict[Tuple[int, int], Set[int]] = defaultdict(set)
+
+    def _plane(self, dimension: int) -> List[float]:
+        plane = self._planes.get(dimension)
+        if plane is None:
+            # Seeded per dimension, so the hyperplanes don't depend on the order vectors arrive in
+            rng = random.Random(self.seed * 1_000_003 + dimension)
+            plane = self._planes[dimension] = [rng.gauss(0, 1) for _ in range(self.tables * self.bits)]
+        return plane
+
+    def codes(self, vector: Vector) -> List[Tuple[int, int]]:
+        projections = [0.0] * (self.tables * self.bits)
+        for dimension, weight in vector.items():
+            for k, component in enumerate(self._plane(dimension)):
+                projections[k] += weight * component
+        codes = []
+        for table in range(self.tables):
+            code = 0
+            for projection in projections[table * self.bits:(table + 1) * self.bits]:
+                code = (code << 1) | (projection > 0)
+            codes.append((table, code))
+        return codes
+
+    def add(self, entry_id: int, codes: List[Tuple[int, int]]) -> None:
+        for code in codes:
+            self._buckets[code].add(entry_id)
+
+    def remove(self, entry_id: int, codes: List[Tuple[int, int]]) -> None:
+        for code in codes:
+            bucket = self._buckets.get(code)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[code]
+
+    def candidates(self, codes: List[Tuple[int, int]]) -> Set[int]:
+        found: Set[int] = set()
+        for code in codes:
+            found |= self._buckets.get(code, set())
+        return found
+
+
+class _Entry:
+    __slots__ = ("question", "answer", "vector", "codes", "qualifiers", "expires_at", "hits")
+
+    def __init__(self, question: str, answer: str, vector: Vector, codes: List[Tuple[int, int]], expires_at: float):
+        self.question = question
+        self.answer = answer
+        self.vector = vector
+        self.codes = codes
+        self.qualifiers = frozenset(q.casefold() for q in QUALIFIERS.findall(question))
+        self.expires_at = expires_at
+        self.hits = 0
+
+
+class CachedAnswer(NamedTuple):
+    answer: str
+    question: str  # the previously answered question it matched
+    similarity: float
+
+
+class SemanticAnswerCache:
+    """Answers to generic, plan-independent questions, looked up by meaning rather than exact text.
+
+    A question is embedded and compared with previously answered ones; the
+    closest match at or above `threshold` cosine similarity is a hit, provided
+    both mention the same numbers and ordinals. Messages that look personal
+    (is_personalized) bypass the cache both ways, and answers that refer to the
+    user's plan are not stored. Entries expire after `ttl_seconds`; at most
+    `max_entries` are kept, least recently used first out. Below
+    `exact_below` entries every entry is scored, above it only LSH candidates.
+    """
+
+    def __init__(self, embedder=None, threshold: Optional[float] = None, ttl_seconds: float = 24 * 3600,
+                 max_entries: int = 5000, exact_below: int = 256):
+        self.embedder = embedder or HashingEmbedder()
+        self.threshold = threshold if threshold is not None else self.embedder.default_threshold
+        # A new answer replaces a stored one this close instead of adding a near duplicate
+        self.replace_threshold = min(1.0, self.threshold + (1 - self.threshold) / 2)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.exact_below = exact_below
+        self.index = SimHashIndex()
+        self.lookups = 0
+        self.hits = 0
+        self.bypassed = 0
+        self.stores = 0
+        self.expired = 0
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()  # least recently used first
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def _nearest(self, vector: Vector, codes: List[Tuple[int, int]]) -> Tuple[Optional[int], float]:
+        now = time.time()
+        if len(self._entries) <= self.exact_below:
+            candidates = list(self._entries)
+        else:
+            candidates = self.index.candidates(codes)
+        best_id, best = None, 0.0
+        for entry_id in candidates:
+            entry = self._entries[entry_id]
+            if entry.expires_at <= now:
+                self._remove(entry_id)
+                self.expired += 1
+                continue
+            similarity = _dot(vector, entry.vector)
+            if similarity > best:
+                best_id, best = entry_id, similarity
+        return best_id, best
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        self.index.remove(entry_id, entry.codes)
+
+    def lookup(self, question: str) -> Optional[CachedAnswer]:
+        """The stored answer to the closest matching question, or None (also for personal questions)."""
+        if is_personalized(question):
+            with self._lock:
+                self.bypassed += 1
+            return None
+        vector = self.embedder.embed(question)
+        codes = self.index.codes(vector)
+        qualifiers = frozenset(q.casefold() for q in QUALIFIERS.findall(question))
+        with self._lock:
+            self.lookups += 1
+            entry_id, similarity = self._nearest(vector, codes)
+            if entry_id is None or similarity < self.threshold:
+                return None
+            entry = self._entries[entry_id]
+            if entry.qualifiers != qualifiers:
+                return None
+            entry.hits += 1
+            self.hits += 1
+            self._entries.move_to_end(entry_id)
+            return CachedAnswer(entry.answer, entry.question, similarity)
+
+    def store(self, question: str, answer: str) -> bool:
+        """Remember the answer to a generic question; returns False if it isn't cacheable."""
+        if not answer.strip() or is_personalized(question) or PERSONAL_ANSWER.search(answer):
+            return False
+        vector = self.embedder.embed(question)
+        codes = self.index.codes(vector)
+        with self._lock:
+            entry_id, similarity = self._nearest(vector, codes)
+            if entry_id is not None and similarity >= self.replace_threshold:
+                self._remove(entry_id)
+            entry_id = next(self._ids)
+            self._entries[entry_id] = _Entry(question, answer, vector, codes, time.time() + self.ttl_seconds)
+            self.index.add(entry_id, codes)
+            self.stores += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+        return True
+
+    def invalidate(self, question: Optional[str] = None) -> int:
+        """Drop the answers matching `question` (at the hit threshold), or everything; returns how many."""
+        with self._lock:
+            if question is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                self.index = SimHashIndex()
+                return removed
+            vector = self.embedder.embed(question)
+            matching = [entry_id for entry_id, entry in self._entries.items() if _dot(vector, entry.vector) >= self.threshold]
+            for entry_id in matching:
+                self._remove(entry_id)
+            return len(matching)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "embedder": self.embedder.name,
+                "threshold": self.threshold,
+                "entries": len(self._entries),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "bypassed": self.bypassed,
+                "stores": self.stores,
+                "expired": self.expired,
+            }
+
+
+_answer_cache: Optional[SemanticAnswerCache] = None
+_answer_cache_lock = threading.Lock()
+
+def get_answer_cache() -> Optional[SemanticAnswerCache]:
+    """The process-wide answer cache if ANSWER_CACHE is on (default off), else None.
+
+    ANSWER_CACHE_EMBEDDER picks the embedder (see create_embedder),
+    ANSWER_CACHE_THRESHOLD and ANSWER_CACHE_TTL_SECONDS tune matching and expiry.
+    """
+    global _answer_cache
+    if os.getenv("ANSWER_CACHE", "0").lower() not in ("1", "true", "yes"):
+        return None
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            threshold = os.getenv("ANSWER_CACHE_THRESHOLD")
+            _answer_cache = SemanticAnswerCache(
+                embedder=create_embedder(os.getenv("ANSWER_CACHE_EMBEDDER", "auto")),
+                threshold=float(threshold) if threshold else None,
+                ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 3600))),
+            )
+        return _answer_cache
@@ -0,0 +1,262 @@
+"""Hit rate and latency savings of the semantic answer cache on a replayed message log.
+
+The default log mixes paraphrased generic pregnancy questions (drawn with a
+skew towards the popular ones) with personal messages that must bypass the
+cache. Every miss is answered by "the model" and stored; a hit whose stored
+answer belongs to a different question is counted as a false hit. A real
+log can be replayed with --log (JSON lines with a "message" field); false
+hits can't be told apart there.
+
+By default turns cost --turn-latency seconds without being slept, and only
+the cache's own lookup and store time is measured. With --agent the log is
+sent through AgentManager with the stub chat model, once with the cache and
+once without, and real turn latencies are compared. Before that, --agent
+checks that a generic question is answered without the asker's plan and
+then served from the cache, and that an answer given with a user's plan in
+front of the model is never served to another user; it exits with status 1
+if either fails.
+
+    uv run python benchmarks/bench_answer_cache.py --messages 2000
+    uv run python benchmarks/bench_answer_cache.py --embedder sentence-transformers
+    uv run python benchmarks/bench_answer_cache.py --agent --messages 200 --turn-latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+from typing import List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scratch_dir  # noqa: F401  (before any backend module)
+
+from answer_cache import SemanticAnswerCache, create_embedder
+
+FAQ = {
+    "first_trimester_diet": [
+        "What should I eat in the first trimester?",
+        "What should I eat during the first trimester?",
+        "what to eat in the first trimester",
+        "What foods should I eat in the first trimester of pregnancy?",
+    ],
+    "third_trimester_diet": [
+        "What should I eat in the third trimester?",
+        "What foods should I eat in the third trimester of pregnancy?",
+    ],
+    "glucose_test": [
+        "When is the glucose test?",
+        "When is the glucose test done in pregnancy?",
+        "when do they do the glucose test",
+        "At what week is the glucose screening test?",
+    ],
+    "sushi": [
+        "Is it safe to eat sushi while pregnant?",
+        "Is sushi safe to eat during pregnancy?",
+        "can pregnant women eat sushi",
+    ],
+    "caffeine": [
+        "How much caffeine is safe during pregnancy?",
+        "How much caffeine can you have while pregnant?",
+        "Is caffeine safe during pregnancy?",
+    ],
+    "exercise": [
+        "What exercise is safe during pregnancy?",
+        "Which exercises are safe while pregnant?",
+        "Is exercise safe during pregnancy?",
+    ],
+    "morning_sickness": [
+        "How can I ease morning sickness?",
+        "What helps with morning sickness?",
+        "Tips for morning sickness relief?",
+    ],
+    "prenatal_vitamins": [
+        "Why are prenatal vitamins important?",
+        "What prenatal vitamins should I take?",
+        "Do I need to take prenatal vitamins?",
+    ],
+    "kick_counts": [
+        "When should I start counting baby kicks?",
+        "When do you start kick counts?",
+    ],
+    "anatomy_scan": [
+        "What happens at the 20 week anatomy scan?",
+        "What does the 20 week anatomy scan check?",
+    ],
+    "nt_scan": [
+        "What happens at the 12 week scan?",
+        "What does the 12 week scan check?",
+    ],
+}
+
+PERSONAL = [
+    "When is my next appointment?",
+    "I live in Denver, can you find me an OBGYN?",
+    "My due date is May 3.",
+    "I'm 14 weeks and feeling dizzy, is that normal?",
+    "Can you add the glucose test to my plan?",
+    "Is that normal?",
+    "What did my doctor mean by low-lying placenta?",
+    "We just found out it's twins!",
+    "Remind me to book the anatomy scan",
+    "Thanks!",
+]
+
+
+def synthetic_log(messages: int, personal_share: float, seed: int) -> List[Tuple[Optional[str], str]]:
+    """(intent, message) pairs; intent is None for personal messages."""
+    rng = random.Random(seed)
+    intents = list(FAQ)
+    weights = [1 / (rank + 1) for rank in range(len(intents))]  # a few questions make up most of the traffic
+    log = []
+    for _ in range(messages):
+        if rng.random() < personal_share:
+            log.append((None, rng.choice(PERSONAL)))
+        else:
+            intent = rng.choices(intents, weights)[0]
+            log.append((intent, rng.choice(FAQ[intent])))
+    return log
+
+
+def load_log(path: str) -> List[Tuple[Optional[str], str]]:
+    with open(path) as f:
+        return [(None, json.loads(line)["message"]) for line in f if line.strip()]
+
+
+def answer_for(intent: Optional[str], message: str) -> str:
+    return f"General guidance about {intent or message}. Always check with your healthcare provider."
+
+
+def replay(log: List[Tuple[Optional[str], str]], cache: SemanticAnswerCache, turn_latency: float) -> None:
+    lookup_times = []
+    store_times = []
+    false_hits = 0
+    for intent, message in log:
+        start = time.perf_counter()
+        cached = cache.lookup(message)
+        lookup_times.append(time.perf_counter() - start)
+        if cached is not None:
+            if intent is not None and cached.answer != answer_for(intent, message):
+                false_hits += 1
+            continue
+        start = time.perf_counter()
+        cache.store(message, answer_for(intent, message))
+        store_times.append(time.perf_counter() - start)
+
+    stats = cache.stats()
+    hits = stats["hits"]
+    lookup = statistics.fmean(lookup_times)
+    with_cache = (len(log) * lookup + (len(log) - hits) * turn_latency + sum(store_times)) / len(log)
+    print(f"embedder {stats['embedder']}, threshold {stats['threshold']:.2f}, {len(log)} messages")
+    print(f"hits {hits} ({hits / len(log):.1%} of messages, {stats['hit_rate']:.1%} of cacheable), "
+          f"bypassed {stats['bypassed']}, false hits {false_hits}, entries {stats['entries']}")
+    print(f"lookup mean {lookup * 1000:.3f}ms, p95 {sorted(lookup_times)[int(len(lookup_times) * 0.95)] * 1000:.3f}ms, "
+          f"store mean {statistics.fmean(store_times or [0]) * 1000:.3f}ms")
+    print(f"mean turn latency at {turn_latency:.2f}s per model turn: {turn_latency:.3f}s without the cache, "
+          f"{with_cache:.3f}s with it ({1 - with_cache / turn_latency:.1%} saved)")
+
+
+async def check_plan_answers_not_shared(embedder: str) -> bool:
+    """A user with a plan asks a generic and a personal question; only the generic answer, given without the plan, is shared."""
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    from agent_manager import AgentManager
+    from chat_graph_manager import ChatGraphManager
+    from fake_chat_model import FakeChatModel
+    from plan_service import get_plan_service
+    from session_store import InMemorySessionStore
+
+    def plan_aware(messages) -> AIMessage:
+        # Like the real model, tailor the answer to whatever plan it was shown
+        latest = str([m for m in messages if isinstance(m, HumanMessage)][-1].content)
+        marker = re.search(r"marker-\w+", latest)
+        return AIMessage(content="General guidance." + (f" Given your plan ({marker.group(0)})." if marker else ""))
+
+    async def ask(agent_manager: AgentManager, username: str, question: str) -> dict:
+        async for frame in agent_manager.stream_turn(username, question):
+            if frame["type"] == "done":
+                return frame
+        return {}
+
+    cache = SemanticAnswerCache(create_embedder(embedder))
+    agent_manager = AgentManager(
+        chat_graph=ChatGraphManager(chat_model=FakeChatModel(latency=0, responder=plan_aware), checkpoint_path="check.sqlite"),
+        session_store=InMemorySessionStore(), answer_cache=cache,
+    )
+    generic, personal = FAQ["first_trimester_diet"][0], "I'm 14 weeks and feeling dizzy, is that normal?"
+    get_plan_service().write_plan("check-planned", "- **Allergies:** marker-peanuts\n")
+    try:
+        planned_generic = await ask(agent_manager, "check-planned", generic)
+        other_generic = await ask(agent_manager, "check-other", generic)
+        planned_personal = await ask(agent_manager, "check-planned", personal)
+        other_personal = await ask(agent_manager, "check-other", personal)
+    finally:
+        await agent_manager.aclose()
+    ok = ("marker-peanuts" not in planned_generic.get("content", "") and other_generic.get("cached", False)
+          and "marker-peanuts" in planned_personal.get("content", "") and not planned_personal.get("cached")
+          and "marker-peanuts" not in other_personal.get("content", "") and not other_personal.get("cached"))
+    print(f"plan-aware answers kept out of the cache: {'ok' if ok else 'FAILED'}")
+    return ok
+
+
+async def replay_agent(log: List[Tuple[Optional[str], str]], embedder: str, turn_latency: float) -> None:
+    from agent_manager import AgentManager
+    from chat_graph_manager import ChatGraphManager
+    from fake_chat_model import FakeChatModel
+
+    if not await check_plan_answers_not_shared(embedder):
+        sys.exit(1)
+
+    async def run(cache: Optional[SemanticAnswerCache]) -> List[float]:
+        model = FakeChatModel(latency=turn_latency)
+        agent_manager = AgentManager(chat_graph=ChatGraphManager(chat_model=model), answer_cache=cache)
+        latencies = []
+        try:
+            for i, (_, message) in enumerate(log):
+                start = time.perf_counter()
+                async for _ in agent_manager.process_message(f"replay-{i % 50}", message):
+                    pass
+                latencies.append(time.perf_counter() - start)
+        finally:
+            await agent_manager.aclose()
+        return latencies
+
+    without = await run(None)
+    cache = SemanticAnswerCache(create_embedder(embedder))
+    with_cache = await run(cache)
+    print(f"hit rate {cache.stats()['hit_rate']:.1%}, bypassed {cache.stats()['bypassed']}")
+    for label, latencies in (("without cache", without), ("with cache", with_cache)):
+        latencies.sort()
+        print(f"{label:>14}: mean {statistics.fmean(latencies) * 1000:8.1f}ms, p50 {latencies[len(latencies) // 2] * 1000:8.1f}ms, "
+              f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Semantic answer cache replay benchmark")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--personal-share", type=float, default=0.3, help="Share of personal messages in the synthetic log")
+    parser.add_argument("--log", help="Replay this JSON lines file instead of the synthetic log")
+    parser.add_argument("--embedder", default="hashing", help='"hashing", "sentence-transformers[:model]" or "auto"')
+    parser.add_argument("--threshold", type=float, help="Similarity threshold (default: the embedder's)")
+    parser.add_argument("--turn-latency", type=float, default=4.0, help="Seconds per model turn")
+    parser.add_argument("--agent", action="store_true", help="Replay through AgentManager with the stub model")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    log = load_log(args.log) if args.log else synthetic_log(args.messages, args.personal_share, args.seed)
+    if args.agent:
+        # Plans and checkpoints are written relative to the working directory
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            asyncio.run(replay_agent(log, args.embedder, args.turn_latency))
+    else:
+        replay(log, SemanticAnswerCache(create_embedder(args.embedder), threshold=args.threshold), args.turn_latency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Model calls after a client disconnects mid-turn.
+
+The stub model keeps calling a tool for --steps steps. The "client" reads
+frames like the /ws/chat handler does and goes away after the first tool
+result; its task is cancelled the same way the handler cancels turns on
+disconnect. Model calls should stop within one step of that, where the old
+handler let the run go on for all remaining steps. A follow-up turn checks
+the conversation is still usable afterwards. Exits non-zero on failure.
+
+    uv run python benchmarks/bench_cancellation.py --steps 10 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import uuid
+from typing import List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scratch_dir  # noqa: F401  (before any backend module)
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from agent_manager import AgentManager
+from chat_graph_manager import ChatGraphManager
+from fake_chat_model import FakeChatModel
+from session_store import InMemorySessionStore
+
+
+def tool_loop(steps: int):
+    def respond(messages: List[BaseMessage]) -> AIMessage:
+        last_human = max(i for i, m in enumerate(messages) if isinstance(m, HumanMessage))
+        done = sum(isinstance(m, ToolMessage) for m in messages[last_human:])
+        if done >= steps:
+            return AIMessage(content="All done.")
+        return AIMessage(content="", tool_calls=[{
+            "name": "set_users_location", "args": {"location": f"Austin {done}"},
+            "id": f"call_{uuid.uuid4().hex[:12]}", "type": "tool_call",
+        }])
+    return respond
+
+
+async def run(steps: int, latency: float) -> bool:
+    model = FakeChatModel(latency=latency, responder=tool_loop(steps))
+    with tempfile.TemporaryDirectory() as workdir:
+        agent_manager = AgentManager(
+            chat_graph=ChatGraphManager(chat_model=model, checkpoint_path=os.path.join(workdir, "checkpoints.sqlite")),
+            session_store=InMemorySessionStore(),
+        )
+        first_tool_result = asyncio.Event()
+
+        async def client() -> None:
+            async for frame in agent_manager.stream_turn("bench", "Find me providers"):
+                if frame["type"] == "tool_end":
+                    first_tool_result.set()
+
+        task = asyncio.create_task(client())
+        await first_tool_result.wait()
+        task.cancel()  # what /ws/chat does when the socket goes away
+        calls_at_disconnect = model.calls
+        await asyncio.sleep(steps * latency * 1.5)
+        calls_after = model.calls
+
+        # The next turn must not trip over tool calls the cancelled turn left open
+        model.responder = None
+        reply = "".join([chunk async for chunk in agent_manager.process_message("bench", "Are you there?")])
+        await agent_manager.aclose()
+
+    stats = agent_manager.get_turn_queue_stats()
+    print(f"model calls at disconnect: {calls_at_disconnect}")
+    print(f"model calls afterwards:    {calls_after} (a full run makes {steps + 1})")
+    print(f"turns cancelled:           {stats['cancelled']}")
+    print(f"follow-up reply:           {reply!r}")
+    return calls_after - calls_at_disconnect <= 1 and reply == model.reply
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cancellation of abandoned turns")
+    parser.add_argument("--steps", type=int, default=10, help="Tool steps the stub model would take")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub model latency in seconds")
+    args = parser.parse_args()
+    ok = asyncio.run(run(args.steps, args.latency))
+    print("PASS" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
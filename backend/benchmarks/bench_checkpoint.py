@@ -0,0 +1,103 @@
+"""Per-turn latency and payload size, full-history resend vs checkpointed state.
+
+"resend" replays the whole transcript into a checkpoint-less graph every turn,
+which is what AgentManager used to do. "checkpoint" submits only the new
+message through AgentManager and lets the SQLite checkpointer load earlier
+turns.
+
+What the checkpointer saves is the client-to-server payload, which stays flat
+instead of growing with the conversation. It does not make short
+conversations faster: loading and writing the checkpoint (plus the rest of
+AgentManager's turn) costs more than resending a few turns, and only past a
+few hundred turns does it win. With the stub model, one checkpoint write per
+turn (checkpoint_during=False):
+
+    turns   resend   checkpoint   payload bytes (resend / checkpoint)
+       10    4.0ms       24.5ms        1059 / 114
+      100   13.3ms       39.8ms       18244 / 115
+      500  100.1ms       71.3ms       95040 / 116
+
+    uv run python benchmarks/bench_checkpoint.py --turns 10 100 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scratch_dir  # noqa: F401  (before any backend module)
+
+from langgraph.prebuilt import create_react_agent
+
+from agent_manager import AgentManager
+from chat_graph_manager import SYSTEM_PROMPT, ChatGraphManager, tools
+from fake_chat_model import FakeChatModel
+
+# Only the last few turns are timed, that's where the difference shows
+SAMPLE_TURNS = 10
+
+
+def _message(i: int) -> str:
+    return f"Turn {i}: I had some mild cramping today, is that normal at 14 weeks?"
+
+
+async def run_resend(turns: int) -> Dict:
+    model = FakeChatModel(latency=0)
+    graph = create_react_agent(model=model, tools=tools, prompt=SYSTEM_PROMPT)
+    history: List[Dict] = []
+    latencies, payloads = [], []
+    for i in range(turns):
+        history.append({"role": "user", "content": _message(i)})
+        payload = {"messages": history}
+        start = time.perf_counter()
+        await graph.ainvoke(payload, config={"configurable": {"username": "bench"}})
+        elapsed = time.perf_counter() - start
+        history.append({"role": "assistant", "content": model.reply})
+        if i >= turns - SAMPLE_TURNS:
+            latencies.append(elapsed)
+            payloads.append(len(json.dumps(payload)))
+    return {"latency": statistics.mean(latencies), "payload": statistics.mean(payloads)}
+
+
+async def run_checkpoint(turns: int, checkpoint_path: str) -> Dict:
+    agent_manager = AgentManager(chat_graph=ChatGraphManager(chat_model=FakeChatModel(latency=0), checkpoint_path=checkpoint_path))
+    latencies, payloads = [], []
+    for i in range(turns):
+        start = time.perf_counter()
+        async for _ in agent_manager.stream_turn("bench", _message(i)):
+            pass
+        elapsed = time.perf_counter() - start
+        if i >= turns - SAMPLE_TURNS:
+            latencies.append(elapsed)
+            payloads.append(len(json.dumps({"messages": [{"role": "user", "content": _message(i)}]})))
+    await agent_manager.aclose()
+    return {"latency": statistics.mean(latencies), "payload": statistics.mean(payloads)}
+
+
+async def run(turn_counts: List[int]) -> None:
+    print(f"{'turns':>6} {'mode':>10} {'turn latency':>14} {'payload bytes':>14}")
+    for turns in turn_counts:
+        with tempfile.TemporaryDirectory() as workdir:
+            results = {
+                "resend": await run_resend(turns),
+                "checkpoint": await run_checkpoint(turns, os.path.join(workdir, "checkpoints.sqlite")),
+            }
+        for mode, result in results.items():
+            print(f"{turns:>6} {mode:>10} {result['latency'] * 1000:>12.1f}ms {result['payload']:>14.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checkpointed state vs full-history resend")
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 100, 500])
+    args = parser.parse_args()
+    asyncio.run(run(args.turns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Tokens sent to the model per turn, with and without history compaction.
+
+A deterministic stub model writes an ever-growing plan with write_plan on
+every turn and then answers, like the real agent does. Reported per turn:
+tokens in the checkpointed conversation ("state") and tokens actually sent to
+the model ("sent"), summed over the turn's model calls.
+
+Before the run, it checks that a single oversized turn after an existing
+summary is left as is: the summary stays in state and no compaction is
+counted. If not, it exits with status 1.
+
+    uv run python benchmarks/bench_compaction.py --turns 200 --budget 8000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import uuid
+from typing import List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scratch_dir  # noqa: F401  (before any backend module)
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+from agent_manager import AgentManager
+from chat_graph_manager import ChatGraphManager
+from fake_chat_model import FakeChatModel
+from history_manager import SUMMARY_HEADER, SUMMARY_MESSAGE_ID, HistoryManager
+
+PLAN_LINE = "- [ ] Week {i}: discuss symptoms, nutrition and the next screening with the midwife\n"
+ANSWER = "Mild cramping can be normal as the uterus grows. " * 8
+
+
+def scripted_turn(messages: List[BaseMessage]) -> AIMessage:
+    """Rewrite the whole plan, then answer."""
+    last_human = max(i for i, m in enumerate(messages) if isinstance(m, HumanMessage))
+    if not any(isinstance(m, ToolMessage) for m in messages[last_human:]):
+        turn = sum(isinstance(m, HumanMessage) for m in messages)
+        plan = "# Pregnancy Plan\n\n" + "".join(PLAN_LINE.format(i=i) for i in range(turn))
+        return AIMessage(content="", tool_calls=[
+            {"name": "write_plan", "args": {"content": plan}, "id": f"call_{uuid.uuid4().hex[:12]}", "type": "tool_call"},
+        ])
+    return AIMessage(content=ANSWER)
+
+
+async def run_mode(turns: int, budget: int, workdir: str) -> List[dict]:
+    history_manager = HistoryManager(
+        summary_model=FakeChatModel(latency=0, reply="The user is in their second trimester and asked about cramping."),
+        max_tokens=budget,
+    )
+    chat_graph = ChatGraphManager(
+        chat_model=FakeChatModel(latency=0, responder=scripted_turn),
+        checkpoint_path=os.path.join(workdir, f"checkpoints-{budget}.sqlite"),
+        history_manager=history_manager,
+    )
+    agent_manager = AgentManager(chat_graph=chat_graph)
+
+    metrics = []
+    for i in range(turns):
+        async for _ in agent_manager.stream_turn("bench", f"Turn {i}: is mild cramping normal at 14 weeks?"):
+            pass
+        metrics.append(agent_manager.get_turn_metrics("bench"))
+    await agent_manager.aclose()
+    return metrics
+
+
+async def check_summary_kept(budget: int) -> bool:
+    """A turn too big for the budget with nothing older to fold leaves the summary and the metrics alone."""
+    history_manager = HistoryManager(summary_model=FakeChatModel(latency=0), max_tokens=budget)
+    summary = SystemMessage(content=SUMMARY_HEADER + "The user asked about cramping.", id=SUMMARY_MESSAGE_ID)
+    state = {"messages": [summary, HumanMessage(content="Is this normal? " * budget)]}
+    config = {"configurable": {"username": "check"}}
+    history_manager.start_turn("check")
+    update = await history_manager.apre_model_hook(state, config)
+    ok = "messages" not in update and history_manager.turn_metrics("check")["compactions"] == 0
+    print(f"summary kept on an oversized single turn: {'ok' if ok else 'FAILED'}")
+    return ok
+
+
+async def run(turns: int, budget: int, report_every: int) -> None:
+    if not await check_summary_kept(budget):
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        # An effectively unlimited budget never summarizes; its "state" column is what used to be sent on every call
+        baseline = await run_mode(turns, 10 ** 9, workdir)
+        compacted = await run_mode(turns, budget, workdir)
+
+    print(f"{'turn':>5} {'state (no budget)':>18} {'sent (no budget)':>17} {'state':>8} {'sent':>8} {'compactions':>12}")
+    for i in range(0, turns, report_every):
+        b, c = baseline[i], compacted[i]
+        print(f"{i + 1:>5} {b['tokens_before']:>18} {b['tokens_after']:>17} {c['tokens_before']:>8} {c['tokens_after']:>8} {c['compactions']:>12}")
+    print(f"total sent: {sum(m['tokens_after'] for m in baseline)} without budget, "
+          f"{sum(m['tokens_after'] for m in compacted)} with a {budget} token budget")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="History compaction benchmark")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--budget", type=int, default=8000)
+    parser.add_argument("--report-every", type=int, default=25)
+    args = parser.parse_args()
+    asyncio.run(run(args.turns, args.budget, args.report_every))
+
+
+if __name__ == "__main__":
+    main()
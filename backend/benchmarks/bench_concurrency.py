@@ -0,0 +1,62 @@
+"""Concurrent chat sessions against a stubbed model.
+
+Every session goes through AgentManager.process_message, the same path the
+/ws/chat handler awaits. With the async engine N sessions should take about
+as long as one; a blocking engine takes roughly N times as long.
+
+    uv run python benchmarks/bench_concurrency.py --sessions 20 --latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scratch_dir  # noqa: F401  (before any backend module)
+
+from agent_manager import AgentManager
+from chat_graph_manager import ChatGraphManager
+from fake_chat_model import FakeChatModel
+
+
+async def run_session(agent_manager: AgentManager, username: str) -> None:
+    async for _ in agent_manager.start_conversation(username):
+        pass
+    async for _ in agent_manager.process_message(username, "When is my next appointment?"):
+        pass
+
+
+async def run(sessions: int, latency: float) -> None:
+    model = FakeChatModel(latency=latency)
+    checkpoint_path = os.path.join(tempfile.mkdtemp(), "checkpoints.sqlite")
+    agent_manager = AgentManager(chat_graph=ChatGraphManager(chat_model=model, checkpoint_path=checkpoint_path))
+
+    start = time.perf_counter()
+    await run_session(agent_manager, "bench-single")
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_session(agent_manager, f"bench-{i}") for i in range(sessions)))
+    concurrent = time.perf_counter() - start
+    await agent_manager.aclose()
+
+    print(f"model latency:        {latency:.3f}s")
+    print(f"1 session:            {single:.3f}s")
+    print(f"{sessions} sessions:          {concurrent:.3f}s")
+    print(f"slowdown vs 1:        {concurrent / single:.2f}x")
+    print(f"model calls:          {model.calls}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent session benchmark")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub model latency in seconds")
+    args = parser.parse_args()
+    asyncio.run(run(args.sessions, args.latency))
+
+
+if __name__ == "__main__":
+    main()
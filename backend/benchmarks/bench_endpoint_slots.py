@@ -0,0 +1,137 @@
+"""Many concurrent async calls through PooledChatDatabricks' per-endpoint slots.
+
+The serving endpoint is replaced by a stub client whose requests sleep, so
+no credentials or network are needed. --streams astream calls and
+--invokes ainvoke calls run at once against --limit slots, far more than
+the default executor has threads; some streams are cancelled after their
+first chunk. Every call must finish, no more than --limit requests may be
+in flight at any time, and all slots must be free afterwards. Waiting for
+a slot on the default executor used to park its threads until the slot
+holders, which need those same threads for their next chunk, deadlocked.
+Exits non-zero on failure.
+
+    uv run python benchmarks/bench_endpoint_slots.py --streams 40 --limit 2
+"""
+import argparse
+import asyncio
+import math
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("DATABRICKS_HOST", "https://example.cloud.databricks.com")
+os.environ.setdefault("DATABRICKS_TOKEN", "placeholder")
+
+import DatabricksClient
+from DatabricksClient import PooledChatDatabricks, _slots_for
+
+ENDPOINT = "bench-endpoint"
+
+
+class StubServingClient:
+    """Stands in for the MLflow deployments client; counts requests in flight."""
+
+    def __init__(self, latency: float, chunks: int):
+        self.latency = latency
+        self.chunks = chunks
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def _enter(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+
+    def _exit(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def predict(self, endpoint: str, inputs: dict) -> dict:
+        self._enter()
+        try:
+            time.sleep(self.latency * self.chunks)
+            return {"choices": [{"index": 0, "message": {"role": "assistant", "content": "OK"}, "finish_reason": "stop"}]}
+        finally:
+            self._exit()
+
+    def predict_stream(self, endpoint: str, inputs: dict):
+        self._enter()
+        try:
+            for i in range(self.chunks):
+                time.sleep(self.latency)
+                yield {"choices": [{"index": 0, "delta": {"role": "assistant", "content": f"token{i} "}, "finish_reason": None}]}
+        finally:
+            self._exit()
+
+
+async def run(streams: int, invokes: int, cancelled: int, limit: int, latency: float, chunks: int, timeout: float) -> bool:
+    DatabricksClient.MAX_CONCURRENCY_PER_ENDPOINT = limit
+    client = StubServingClient(latency, chunks)
+    model = PooledChatDatabricks(endpoint=ENDPOINT)
+    model.client = client
+
+    async def stream(i: int) -> int:
+        received = 0
+        async for _ in model.astream(f"Stream {i}"):
+            received += 1
+        return received
+
+    async def leave(i: int) -> None:
+        first_chunk = asyncio.Event()
+
+        async def consume() -> None:
+            async for _ in model.astream(f"Abandoned {i}"):
+                first_chunk.set()
+
+        task = asyncio.create_task(consume())
+        await first_chunk.wait()
+        task.cancel()  # the consumer goes away mid-stream
+        await asyncio.gather(task, return_exceptions=True)
+
+    start = time.perf_counter()
+    calls = [stream(i) for i in range(streams)] + [model.ainvoke(f"Invoke {i}") for i in range(invokes)]
+    calls += [leave(i) for i in range(cancelled)]
+    try:
+        results = await asyncio.wait_for(asyncio.gather(*calls), timeout)
+    except asyncio.TimeoutError:
+        print(f"calls still waiting after {timeout:.0f}s: {client.in_flight} in flight (slot holders starved)")
+        return False
+    elapsed = time.perf_counter() - start
+
+    # Abandoned streams give their slot back once the stub's current chunk returns
+    slots = _slots_for(ENDPOINT)
+    deadline = time.perf_counter() + latency * 2 + 1
+    while slots._value < limit and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+
+    complete = sum(received == chunks for received in results[:streams])
+    ideal = math.ceil((streams + invokes) / limit) * latency * chunks
+    print(f"{streams} streams, {invokes} invokes, {cancelled} abandoned over {limit} slots: {elapsed:.2f}s "
+          f"(ideal {ideal:.2f}s)")
+    print(f"complete streams:   {complete}/{streams}")
+    print(f"peak in flight:     {client.peak} (limit {limit})")
+    print(f"free slots after:   {slots._value}/{limit}")
+    return complete == streams and client.peak <= limit and slots._value == limit
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent async calls through the per-endpoint slots")
+    parser.add_argument("--streams", type=int, default=40)
+    parser.add_argument("--invokes", type=int, default=10)
+    parser.add_argument("--cancelled", type=int, default=5, help="Streams abandoned after their first chunk")
+    parser.add_argument("--limit", type=int, default=2, help="Slots for the endpoint")
+    parser.add_argument("--latency", type=float, default=0.01, help="Stub latency per chunk in seconds")
+    parser.add_argument("--chunks", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+    ok = asyncio.run(run(args.streams, args.invokes, args.cancelled, args.limit, args.latency, args.chunks, args.timeout))
+    print("PASS" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Import time of the backend modules.
+
+Each sample imports the module in a fresh interpreter, so third-party imports
+(LangChain, LangGraph) are included. Importing must not touch the network:
+MCP tools are only discovered on the first provider search.
+
+    uv run python benchmarks/bench_import.py --module chat_graph_manager --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNIPPET = """
+import time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+
+def time_import(module: str) -> float:
+    result = subprocess.run(
+        [sys.executable, "-c", SNIPPET.format(module=module)],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Module import time benchmark")
+    parser.add_argument("--module", default="chat_graph_manager")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    samples = [time_import(args.module) for _ in range(args.runs)]
+    print(f"import {args.module}: median {statistics.median(samples) * 1000:.1f}ms, "
+          f"min {min(samples) * 1000:.1f}ms, max {max(samples) * 1000:.1f}ms over {args.runs} runs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Cross-user isolation under parallel sessions.
+
+Runs many conversations at once through a single ChatGraphManager. The stub
+model has every user set a location, write a plan tagged with their own
+marker, then read it back. Any plan, location or reply that carries another
+user's marker means request context leaked between sessions.
+
+    uv run python benchmarks/bench_isolation.py --sessions 100
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+from typing import List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scratch_dir  # noqa: F401  (before any backend module)
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from agent_manager import AgentManager
+from chat_graph_manager import ChatGraphManager, user_locations
+from fake_chat_model import FakeChatModel, user_text
+from plan_service import get_plan_service
+
+
+def _tool_call(name: str, args: dict) -> dict:
+    return {"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:12]}", "type": "tool_call"}
+
+
+def scripted_turn(messages: List[BaseMessage]) -> AIMessage:
+    """set location + write plan, then read plan, then echo the plan back."""
+    last_human = max(i for i, m in enumerate(messages) if isinstance(m, HumanMessage))
+    marker = user_text(messages[last_human])
+    results = [m for m in messages[last_human:] if isinstance(m, ToolMessage)]
+    if not results:
+        return AIMessage(content="", tool_calls=[
+            _tool_call("set_users_location", {"location": marker}),
+            _tool_call("write_plan", {"content": marker}),
+        ])
+    if len(results) == 2:
+        return AIMessage(content="", tool_calls=[_tool_call("read_plan", {})])
+    return AIMessage(content=results[-1].content)
+
+
+async def run_session(agent_manager: AgentManager, username: str) -> str:
+    chunks = []
+    async for chunk in agent_manager.process_message(username, f"marker-{username}"):
+        chunks.append(chunk)
+    return "".join(chunks)
+
+
+async def run(sessions: int, latency: float) -> int:
+    model = FakeChatModel(latency=latency, responder=scripted_turn)
+    agent_manager = AgentManager(chat_graph=ChatGraphManager(chat_model=model))
+    usernames = [f"user{i:03d}" for i in range(sessions)]
+
+    start = time.perf_counter()
+    replies = await asyncio.gather(*(run_session(agent_manager, u) for u in usernames))
+    elapsed = time.perf_counter() - start
+    await agent_manager.aclose()
+
+    leaks = 0
+    for username, reply in zip(usernames, replies):
+        marker = f"marker-{username}"
+        plan = get_plan_service().get_plan(username)["content"].rstrip()
+        location = user_locations.get(username)
+        if location != marker or not plan.endswith(marker) or not reply.rstrip().endswith(marker):
+            leaks += 1
+            print(f"LEAK {username}: location={location!r} reply={reply[-40:]!r}")
+
+    print(f"{sessions} sessions in {elapsed:.2f}s, {leaks} leaked")
+    return leaks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-user isolation stress test")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub model latency in seconds")
+    args = parser.parse_args()
+
+    # Plans are written relative to the working directory
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        leaks = asyncio.run(run(args.sessions, args.latency))
+    sys.exit(1 if leaks else 0)
+
+
+if __name__ == "__main__":
+    main()
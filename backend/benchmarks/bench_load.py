@@ -0,0 +1,347 @@
+"""Offline load test of the API: /users, /ws/chat and the plan endpoints.
+
+Starts the stub MCP server and main.py in a scratch working directory, with
+FAKE_CHAT_MODEL=1 so every model call (the assistant, the provider search
+agent and history summaries) replays load_script.json instead of calling
+Databricks. Virtual users then run a scenario:
+
+    users  POST /users
+    chat   POST /users, then the scripted conversation over one /ws/chat socket
+    plan   POST /plan, then GET /plan (no model calls)
+    mixed  chat, with a GET /plan after every turn
+
+It reports throughput, latency percentiles per operation (for chat turns also
+time to first token), server memory and the server's per-stage latencies from
+/stats/latency. With --output each run is appended as one JSON line tagged
+with the git commit, and --compare prints the change against the last run
+with the same parameters, so commits can be compared.
+
+    uv run python benchmarks/bench_load.py --scenario mixed --users 50 --latency 0.2 --tokens-per-second 50
+    uv run python benchmarks/bench_load.py --output load.jsonl
+    uv run python benchmarks/bench_load.py --compare load.jsonl --output load.jsonl
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+LOCATIONS = ["Austin, TX", "Denver, CO", "Portland, OR", "Raleigh, NC", "Madison, WI", "Tucson, AZ"]
+
+
+def conversation(user: int) -> List[str]:
+    """The messages a virtual user sends; a handful of locations, so the provider cache sees repeats."""
+    return [
+        f"I live in {LOCATIONS[user % len(LOCATIONS)]}.",
+        f"My due date is March {1 + user % 28}.",
+        "Can you find me an OBGYN provider?",
+        "What should I eat this week?",
+    ]
+
+
+class Recorder:
+    """Latencies (seconds) and errors per operation."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def add(self, operation: str, seconds: float) -> None:
+        self.latencies[operation].append(seconds)
+
+    def error(self, operation: str) -> None:
+        self.errors[operation] += 1
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for operation in sorted(set(self.latencies) | set(self.errors)):
+            samples = sorted(self.latencies[operation])
+            stats = {"count": len(samples), "errors": self.errors[operation]}
+            if samples:
+                stats.update({
+                    "mean_ms": round(statistics.fmean(samples) * 1000, 2),
+                    **{f"p{q}_ms": round(samples[min(len(samples) * q // 100, len(samples) - 1)] * 1000, 2) for q in (50, 95, 99)},
+                })
+            result[operation] = stats
+        return result
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _http(method: str, url: str, body: Optional[Dict] = None, timeout: float = 300) -> Any:
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        payload = response.read()
+    return json.loads(payload) if payload.startswith((b"{", b"[")) else payload.decode()
+
+
+def _wait_for_port(port: int, process: subprocess.Popen, timeout: float = 120) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server for port {port} exited with code {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not come up")
+
+
+def _process_tree(pid: int) -> List[int]:
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+    except OSError:
+        return pids
+    for child in children:
+        pids += _process_tree(child)
+    return pids
+
+
+def server_memory_mb(pid: int) -> Optional[Dict[str, float]]:
+    """Current and peak resident memory of the server and its workers (Linux only)."""
+    totals = {"rss_mb": 0.0, "peak_rss_mb": 0.0}
+    for process_id in _process_tree(pid):
+        try:
+            with open(f"/proc/{process_id}/status") as f:
+                fields = dict(line.split(":", 1) for line in f if ":" in line)
+        except OSError:
+            continue
+        totals["rss_mb"] += int(fields.get("VmRSS", "0 kB").split()[0]) / 1024
+        totals["peak_rss_mb"] += int(fields.get("VmHWM", "0 kB").split()[0]) / 1024
+    if not totals["peak_rss_mb"]:
+        return None
+    return {key: round(value, 1) for key, value in totals.items()}
+
+
+def git_commit() -> Dict[str, Any]:
+    def git(*args: str) -> str:
+        return subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+
+    try:
+        return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+class LoadClient:
+    def __init__(self, base_url: str, recorder: Recorder, executor: ThreadPoolExecutor):
+        self.base_url = base_url
+        self.ws_url = base_url.replace("http://", "ws://", 1)
+        self.recorder = recorder
+        self.executor = executor
+
+    async def request(self, operation: str, method: str, path: str, body: Optional[Dict] = None) -> Any:
+        start = time.perf_counter()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self.executor, _http, method, self.base_url + path, body)
+        except Exception:
+            self.recorder.error(operation)
+            return None
+        self.recorder.add(operation, time.perf_counter() - start)
+        return result
+
+    async def chat(self, username: str, messages: List[str], read_plan: bool) -> None:
+        import websockets
+
+        async with websockets.connect(f"{self.ws_url}/ws/chat", max_size=None) as websocket:
+            for message in messages:
+                start = time.perf_counter()
+                first_token = None
+                await websocket.send(json.dumps({"username": username, "message": message}))
+                while True:
+                    frame = json.loads(await websocket.recv())
+                    if frame["type"] == "token" and first_token is None:
+                        first_token = time.perf_counter() - start
+                    if frame["type"] in ("done", "error"):
+                        break
+                if frame["type"] == "error":
+                    self.recorder.error("chat.turn")
+                    continue
+                self.recorder.add("chat.turn", time.perf_counter() - start)
+                if first_token is not None:
+                    self.recorder.add("chat.first_token", first_token)
+                if read_plan:
+                    await self.request("plan.get", "GET", f"/plan/{username}")
+
+    async def run_user(self, scenario: str, user: int, plan_reads: int) -> None:
+        username = f"load-{user:05d}"
+        if scenario in ("users", "chat", "mixed"):
+            await self.request("users.create", "POST", "/users", {"username": username})
+        if scenario in ("chat", "mixed"):
+            try:
+                await self.chat(username, conversation(user), read_plan=scenario == "mixed")
+            except Exception:
+                self.recorder.error("chat.turn")
+        if scenario == "plan":
+            await self.request("plan.write", "POST", f"/plan/{username}",
+                               {"content": f"# Pregnancy Plan\n\n- Location: {LOCATIONS[user % len(LOCATIONS)]}\n"})
+            for _ in range(plan_reads):
+                await self.request("plan.get", "GET", f"/plan/{username}")
+
+
+async def drive(base_url: str, scenario: str, users: int, concurrency: int, plan_reads: int, recorder: Recorder) -> float:
+    slots = asyncio.Semaphore(concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        client = LoadClient(base_url, recorder, executor)
+
+        async def one(user: int) -> None:
+            async with slots:
+                await client.run_user(scenario, user, plan_reads)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(user) for user in range(users)))
+        return time.perf_counter() - start
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    recorder = Recorder()
+    with tempfile.TemporaryDirectory() as workdir:
+        mcp_port, api_port = _free_port(), _free_port()
+        env = dict(
+            os.environ,
+            FAKE_CHAT_MODEL="1",
+            FAKE_CHAT_MODEL_LATENCY=str(args.latency),
+            FAKE_CHAT_MODEL_TOKENS_PER_SECOND=str(args.tokens_per_second),
+            FAKE_CHAT_MODEL_SCRIPT=args.script,
+            NIMBLE_MCP_URL=f"http://127.0.0.1:{mcp_port}/sse",
+            NIMBLE_TOOL_CACHE=os.path.join(workdir, "nimble_tools.json"),
+            PROVIDER_CACHE_DB=os.path.join(workdir, "provider_search.sqlite"),
+            SESSION_STORE="sqlite:///" + os.path.join(workdir, "sessions.sqlite") if args.workers > 1 else "memory",
+            SESSION_SPILL="sqlite:///" + os.path.join(workdir, "session-spill.sqlite"),
+            CHECKPOINT_DB=os.path.join(workdir, "checkpoints.sqlite"),
+            PLANS_DIR=os.path.join(workdir, "plans"),
+        )
+        mcp_server = subprocess.Popen(
+            [sys.executable, os.path.join(BENCHMARKS_DIR, "stub_mcp_server.py"), "--port", str(mcp_port), "--latency", str(args.mcp_latency)],
+            cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(BACKEND_DIR, "main.py"), "--host", "127.0.0.1", "--port", str(api_port), "--workers", str(args.workers)],
+            cwd=workdir, env=env,
+        )
+        base_url = f"http://127.0.0.1:{api_port}"
+        try:
+            _wait_for_port(mcp_port, mcp_server)
+            _wait_for_port(api_port, server)
+            if args.workers > 1:
+                time.sleep(2)  # let the remaining workers finish importing
+            idle_memory = server_memory_mb(server.pid)
+            elapsed = asyncio.run(drive(base_url, args.scenario, args.users, args.concurrency, args.plan_reads, recorder))
+            memory = server_memory_mb(server.pid)
+            stages = _http("GET", f"{base_url}/stats/latency")
+        finally:
+            for process in (server, mcp_server):
+                process.terminate()
+                process.wait()
+
+    operations = recorder.summary()
+    completed = sum(stats["count"] for stats in operations.values())
+    return {
+        **git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "params": {**{key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+                   "script": os.path.basename(args.script)},
+        "elapsed_s": round(elapsed, 3),
+        "throughput_ops_per_s": round(completed / elapsed, 2),
+        "throughput_users_per_s": round(args.users / elapsed, 2),
+        "operations": operations,
+        "server_memory": {"idle": idle_memory, "after": memory},
+        # Per process; with several workers this is whichever worker answered
+        "server_stages_ms": {stage: {q: round(v * 1000, 2) for q, v in values.items()} for stage, values in stages.items()},
+    }
+
+
+def print_result(result: Dict[str, Any]) -> None:
+    params = result["params"]
+    print(f"commit {(result['commit'] or 'unknown')[:12]}{' (dirty)' if result['dirty'] else ''}, "
+          f"scenario {params['scenario']}: {params['users']} users, concurrency {params['concurrency']}, {params['workers']} worker(s)")
+    print(f"elapsed {result['elapsed_s']:.2f}s, {result['throughput_ops_per_s']:.1f} ops/s, {result['throughput_users_per_s']:.2f} users/s")
+    for operation, stats in result["operations"].items():
+        if stats["count"]:
+            print(f"  {operation:<18} n={stats['count']:<6} errors={stats['errors']:<4} "
+                  f"p50 {stats['p50_ms']:9.1f}ms  p95 {stats['p95_ms']:9.1f}ms  p99 {stats['p99_ms']:9.1f}ms")
+        else:
+            print(f"  {operation:<18} n=0      errors={stats['errors']}")
+    memory = result["server_memory"]
+    if memory["after"]:
+        print(f"server memory: {memory['idle']['rss_mb']:.1f}MB idle, {memory['after']['rss_mb']:.1f}MB after, "
+              f"{memory['after']['peak_rss_mb']:.1f}MB peak")
+    for stage, values in sorted(result["server_stages_ms"].items()):
+        print(f"  server {stage:<18} p50 {values['p50']:9.1f}ms  p95 {values['p95']:9.1f}ms  p99 {values['p99']:9.1f}ms")
+
+
+def compare(result: Dict[str, Any], path: str) -> None:
+    """Print the change against the most recent run in `path` with the same parameters."""
+    if not os.path.exists(path):
+        print(f"No previous results in {path}")
+        return
+    with open(path) as f:
+        previous = [json.loads(line) for line in f if line.strip()]
+    matching = [run for run in previous if run["params"] == result["params"]]
+    if not matching:
+        print(f"No previous run in {path} with the same parameters")
+        return
+    baseline = matching[-1]
+    print(f"vs {(baseline['commit'] or 'unknown')[:12]} ({baseline['timestamp']}):")
+
+    def change(new: float, old: float) -> str:
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    print(f"  throughput        {change(result['throughput_ops_per_s'], baseline['throughput_ops_per_s'])}")
+    for operation, stats in result["operations"].items():
+        old = baseline["operations"].get(operation)
+        if stats["count"] and old and old["count"]:
+            print(f"  {operation:<18} p50 {change(stats['p50_ms'], old['p50_ms'])}  p95 {change(stats['p95_ms'], old['p95_ms'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test of the BabyGPT API")
+    parser.add_argument("--scenario", choices=["users", "chat", "plan", "mixed"], default="mixed")
+    parser.add_argument("--users", type=int, default=50, help="Virtual users")
+    parser.add_argument("--concurrency", type=int, default=25, help="Virtual users active at once")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub model time to first token, in seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=50, help="Stub model streaming rate")
+    parser.add_argument("--mcp-latency", type=float, default=0.5, help="Stub MCP tool call latency, in seconds")
+    parser.add_argument("--plan-reads", type=int, default=20, help="GET /plan calls per user in the plan scenario")
+    parser.add_argument("--script", default=os.path.join(BENCHMARKS_DIR, "load_script.json"), help="Stub model script")
+    parser.add_argument("--output", help="Append the results as a JSON line to this file")
+    parser.add_argument("--compare", help="Compare with the last run with the same parameters in this file")
+    args = parser.parse_args()
+    args.script = os.path.abspath(args.script)
+
+    result = run(args)
+    print_result(result)
+    if args.compare:
+        compare(result, args.compare)
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(json.dumps(result) + "\n")
+    failed = sum(stats["errors"] for stats in result["operations"].values())
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
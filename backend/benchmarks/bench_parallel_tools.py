@@ -0,0 +1,93 @@
+"""Latency of a model step that requests several tools, run one by one vs concurrently.
+
+The stub model asks for one slow provider search and a few plan reads/writes
+in a single step; the fake tools just sleep for their injected latency.
+"sequential" runs the tool node synchronously with max_concurrency=1, like
+the blocking _run implementations did; "parallel" is the async path the
+agent uses, with blocking work on the bounded tool pool (TOOL_MAX_WORKERS).
+Tool results must come back in the order the model asked for them.
+
+    uv run python benchmarks/bench_parallel_tools.py --plan-calls 3 --provider-latency 1.0 --plan-latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from typing import List, Type
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.tools import BaseTool
+from langgraph.prebuilt import create_react_agent
+from pydantic import BaseModel, Field
+
+from fake_chat_model import FakeChatModel
+from tool_executor import run_blocking
+
+
+class SleepInput(BaseModel):
+    label: str = Field(description="Echoed back in the result")
+
+
+class SleepTool(BaseTool):
+    """Blocking tool that takes `latency` seconds."""
+    args_schema: Type[BaseModel] = SleepInput
+    latency: float = 0.0
+
+    def _run(self, label: str) -> str:
+        time.sleep(self.latency)
+        return label
+
+    async def _arun(self, label: str) -> str:
+        return await run_blocking(self._run, label)
+
+
+def one_step(calls: List[dict]):
+    def respond(messages: List[BaseMessage]) -> AIMessage:
+        if isinstance(messages[-1], HumanMessage):
+            return AIMessage(content="", tool_calls=calls)
+        return AIMessage(content="Done.")
+    return respond
+
+
+def build(plan_calls: int, provider_latency: float, plan_latency: float):
+    tools = [
+        SleepTool(name="find_provider", description="Slow provider search", latency=provider_latency),
+        SleepTool(name="plan_io", description="Plan read or write", latency=plan_latency),
+    ]
+    calls = [{"name": "find_provider", "args": {"label": "provider"}, "id": f"call_{uuid.uuid4().hex[:12]}", "type": "tool_call"}]
+    calls += [{"name": "plan_io", "args": {"label": f"plan-{i}"}, "id": f"call_{uuid.uuid4().hex[:12]}", "type": "tool_call"}
+              for i in range(plan_calls)]
+    graph = create_react_agent(model=FakeChatModel(latency=0, responder=one_step(calls)), tools=tools)
+    return graph, [call["args"]["label"] for call in calls]
+
+
+def report(mode: str, elapsed: float, result: dict, expected: List[str]) -> None:
+    results = [m.content for m in result["messages"] if isinstance(m, ToolMessage)]
+    print(f"{mode:>10}: {elapsed:6.2f}s for {len(results)} tool calls, results in call order: {results == expected}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sequential vs parallel tool execution within one step")
+    parser.add_argument("--plan-calls", type=int, default=3)
+    parser.add_argument("--provider-latency", type=float, default=1.0)
+    parser.add_argument("--plan-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    graph, expected = build(args.plan_calls, args.provider_latency, args.plan_latency)
+    payload = {"messages": [{"role": "user", "content": "Update my plan and find providers"}]}
+
+    start = time.perf_counter()
+    result = graph.invoke(payload, config={"max_concurrency": 1})
+    report("sequential", time.perf_counter() - start, result, expected)
+
+    start = time.perf_counter()
+    result = asyncio.run(graph.ainvoke(payload))
+    report("parallel", time.perf_counter() - start, result, expected)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Model calls per turn with and without the plan injected into the model input.
+
+The stub model follows the behaviour seen with the real endpoint: when the
+plan isn't in front of it, a turn starts with a read_plan call; either way it
+then records what the user said with set_plan_field and answers.
+
+    uv run python benchmarks/bench_plan_context.py --turns 10
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+from typing import List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scratch_dir  # noqa: F401  (before any backend module)
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from agent_manager import AgentManager
+from chat_graph_manager import PLAN_CONTEXT_HEADER, ChatGraphManager
+from fake_chat_model import FakeChatModel, user_text
+from session_store import InMemorySessionStore
+
+
+def _tool_call(name: str, args: dict) -> dict:
+    return {"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:12]}", "type": "tool_call"}
+
+
+def scripted_turn(messages: List[BaseMessage]) -> AIMessage:
+    last_human = max(i for i, m in enumerate(messages) if isinstance(m, HumanMessage))
+    has_plan = PLAN_CONTEXT_HEADER in str(messages[last_human].content)
+    called = [m.name for m in messages[last_human:] if isinstance(m, ToolMessage)]
+    if not has_plan and "read_plan" not in called:
+        return AIMessage(content="", tool_calls=[_tool_call("read_plan", {})])
+    if "set_plan_field" not in called:
+        return AIMessage(content="", tool_calls=[_tool_call("set_plan_field", {"field": "Last question", "value": user_text(messages[last_human])})])
+    return AIMessage(content="Noted, and here is what to expect this week.")
+
+
+async def run(inject_plan: bool, turns: int, workdir: str) -> None:
+    model = FakeChatModel(latency=0, responder=scripted_turn)
+    chat_graph = ChatGraphManager(
+        chat_model=model,
+        checkpoint_path=os.path.join(workdir, f"checkpoints-{inject_plan}.sqlite"),
+        inject_plan=inject_plan,
+    )
+    agent_manager = AgentManager(chat_graph=chat_graph, session_store=InMemorySessionStore())
+
+    username = f"bench-{inject_plan}"
+    start = time.perf_counter()
+    for i in range(turns):
+        async for _ in agent_manager.stream_turn(username, f"Week {10 + i}: is it normal to feel tired?"):
+            pass
+    elapsed = time.perf_counter() - start
+    await agent_manager.aclose()
+    mode = "injected" if inject_plan else "read_plan"
+    print(f"{mode:>10}: {model.calls / turns:.2f} model calls per turn, {elapsed / turns * 1000:.1f}ms per turn (stub model)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan injected into context vs read_plan round trips")
+    parser.add_argument("--turns", type=int, default=10)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        for inject_plan in (False, True):
+            asyncio.run(run(inject_plan, args.turns, workdir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Output tokens per turn for plan updates: whole-document rewrites vs edit operations.
+
+Replays a scripted conversation where each turn records one new fact in the
+plan. "rewrite" is what the model emits with write_plan (the whole plan every
+turn); "edit" is the arguments of the matching plan edit tool. Both end in
+the same plan, which the script checks.
+
+    uv run python benchmarks/bench_plan_edits.py
+"""
+import json
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plan_manager import PlanManager
+
+# (user message, edit operation, arguments)
+SCRIPT = [
+    ("I'm 8 weeks pregnant, due March 1st", "set_field", ("Due date", "2026-03-01")),
+    ("I live in Austin", "set_field", ("Location", "Austin, TX")),
+    ("I need to find an OB", "add_checklist_item", ("Providers", "Choose an OBGYN provider")),
+    ("My insurance is Aetna", "set_field", ("Insurance", "Aetna PPO")),
+    ("What should I eat?", "upsert_section", ("Nutrition", "- Prenatal vitamin with folic acid daily\n- Avoid raw fish and unpasteurized cheese\n- Limit caffeine to 200mg/day")),
+    ("I picked Dr. Lee", "set_field", ("Provider", "Dr. Lee, Austin Women's Health")),
+    ("I chose my OB", "complete_checklist_item", ("Choose an OBGYN provider",)),
+    ("First visit is on the 10th", "add_checklist_item", ("Appointments", "2025-08-10 First prenatal visit with Dr. Lee")),
+    ("They mentioned an NT scan", "add_checklist_item", ("Appointments", "2025-08-24 NT scan")),
+    ("I've been nauseous", "upsert_section", ("Symptoms", "- Morning nausea, eating small frequent meals helps")),
+    ("Had my first visit", "complete_checklist_item", ("First prenatal visit",)),
+    ("Glucose test at 26 weeks", "add_checklist_item", ("Appointments", "2025-12-01 Glucose screening")),
+    ("Can I keep running?", "upsert_section", ("Exercise", "- Running is fine at a conversational pace\n- Stop if dizzy or short of breath")),
+    ("NT scan done, all normal", "complete_checklist_item", ("NT scan",)),
+    ("Want to take a birth class", "add_checklist_item", ("Birth preparation", "Sign up for a childbirth class")),
+]
+
+
+def tokens(text: str) -> int:
+    # Same rough 4 characters per token estimate as the history manager
+    return len(text) // 4
+
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        rewrites = PlanManager(plans_dir=os.path.join(workdir, "rewrite"))
+        edits = PlanManager(plans_dir=os.path.join(workdir, "edit"))
+
+        print(f"{'turn':>4} {'rewrite tokens':>15} {'edit tokens':>12}  message")
+        total_rewrite = total_edit = 0
+        for turn, (message, operation, args) in enumerate(SCRIPT, start=1):
+            getattr(edits, operation)("bench", *args)
+            # The rewrite path emits the whole updated plan
+            plan = edits.read_plan("bench")
+            rewrites.update_plan("bench", lambda _: plan)
+            rewrite_tokens = tokens(json.dumps({"content": plan}))
+            edit_tokens = tokens(json.dumps({"name": operation, "args": args}))
+            total_rewrite += rewrite_tokens
+            total_edit += edit_tokens
+            print(f"{turn:>4} {rewrite_tokens:>15} {edit_tokens:>12}  {message}")
+
+        assert rewrites.read_plan("bench") == edits.read_plan("bench")
+        print(f"total output tokens: {total_rewrite} rewriting, {total_edit} with edit operations "
+              f"({total_rewrite / total_edit:.1f}x fewer)")
+
+
+if __name__ == "__main__":
+    main()
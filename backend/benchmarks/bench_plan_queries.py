@@ -0,0 +1,82 @@
+"""Appointments in a date range: indexed plan store vs scanning Markdown files.
+
+Creates N plans, each with a handful of dated appointments, both as rows in
+the plan store and as the Markdown files plans used to be kept in, then times
+the same date-range query against each.
+
+    uv run python benchmarks/bench_plan_queries.py --users 5000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plan_store import DATE_RE, PlanStore, split_sections
+
+
+def make_plan(username: str, rng: random.Random) -> str:
+    start = date(2026, 1, 1)
+    appointments = "\n".join(
+        f"- [ ] {start + timedelta(days=rng.randrange(365))} Prenatal visit {i}" for i in range(6)
+    )
+    return (f"# Pregnancy Plan for {username}\n\n- **Due date:** {start + timedelta(days=rng.randrange(365))}\n\n"
+            f"## Appointments\n{appointments}\n\n## Nutrition\n- Prenatal vitamins\n")
+
+
+def scan_files(plans_dir: str, start: str, end: str) -> list:
+    found = []
+    for username in os.listdir(plans_dir):
+        path = os.path.join(plans_dir, username, "pregnancy_plan.md")
+        if not os.path.isfile(path):
+            continue
+        with open(path) as f:
+            _, sections = split_sections(f.read())
+        for heading, body in sections:
+            if "appointment" not in heading.casefold():
+                continue
+            for line in body:
+                match = DATE_RE.search(line)
+                if match and start <= match.group(1) <= end:
+                    found.append((username, match.group(1)))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan query benchmark")
+    parser.add_argument("--users", type=int, default=5000)
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        plans_dir = os.path.join(workdir, "plans")
+        store = PlanStore(os.path.join(workdir, "plans.sqlite"))
+        for i in range(args.users):
+            username = f"user{i:05d}"
+            plan = make_plan(username, rng)
+            store.save(username, plan)
+            os.makedirs(os.path.join(plans_dir, username))
+            with open(os.path.join(plans_dir, username, "pregnancy_plan.md"), "w") as f:
+                f.write(plan)
+
+        start, end = "2026-06-01", "2026-06-07"
+        t0 = time.perf_counter()
+        scanned = scan_files(plans_dir, start, end)
+        scan_time = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        indexed = store.appointments_between(start, end)
+        index_time = time.perf_counter() - t0
+
+    assert len(scanned) == len(indexed)
+    print(f"{args.users} plans, {len(indexed)} appointments between {start} and {end}")
+    print(f"scan Markdown files: {scan_time * 1000:.1f}ms")
+    print(f"plan store index:    {index_time * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
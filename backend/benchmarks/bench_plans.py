@@ -0,0 +1,79 @@
+"""Plan read/write throughput under concurrent users, and torn-read detection.
+
+Every simulated user alternates write_plan/read_plan (on worker threads) on their own plan while
+a poller (like the Streamlit sidebar) keeps reading the plans. A read that
+matches neither the old nor the new version of a plan is counted as torn.
+
+    uv run python benchmarks/bench_plans.py --users 50 --ops 200 --plan-kb 16
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plan_manager import PlanManager
+
+
+def plan_text(username: str, version: int, size: int) -> str:
+    line = f"- [ ] {username} version {version}\n"
+    return line * (size // len(line) + 1)
+
+
+async def user_loop(plan_manager: PlanManager, username: str, ops: int, size: int, valid: dict) -> None:
+    for i in range(ops // 2):
+        content = plan_text(username, i, size)
+        valid[username].add(content)
+        await asyncio.to_thread(plan_manager.write_plan, username, content)
+        await asyncio.to_thread(plan_manager.read_plan, username)
+
+
+async def poller(plan_manager: PlanManager, usernames: list, valid: dict, stop: asyncio.Event, result: dict) -> None:
+    while not stop.is_set():
+        for username in usernames:
+            content = await asyncio.to_thread(plan_manager.read_plan, username)
+            result["reads"] += 1
+            if content is not None and content not in valid[username]:
+                result["torn"] += 1
+
+
+async def run(users: int, ops: int, size: int, workdir: str) -> None:
+    plan_manager = PlanManager(plans_dir=os.path.join(workdir, "plans"))
+    usernames = [f"user{i:03d}" for i in range(users)]
+    # Seed every plan first so the header is only added once and valid versions are known
+    valid = {u: set() for u in usernames}
+    for username in usernames:
+        plan_manager.write_plan(username, "")
+        valid[username].add(plan_manager.read_plan(username))
+
+    stop = asyncio.Event()
+    poll_result = {"reads": 0, "torn": 0}
+    poll_task = asyncio.create_task(poller(plan_manager, usernames, valid, stop, poll_result))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user_loop(plan_manager, u, ops, size, valid) for u in usernames))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await poll_task
+
+    total_ops = users * (ops // 2) * 2
+    print(f"{users} users, {total_ops} plan ops of ~{size // 1024}KB in {elapsed:.2f}s "
+          f"({total_ops / elapsed:.0f} ops/s)")
+    print(f"poller: {poll_result['reads']} reads, {poll_result['torn']} torn")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan I/O throughput benchmark")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--ops", type=int, default=200, help="Reads + writes per user")
+    parser.add_argument("--plan-kb", type=int, default=16)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        asyncio.run(run(args.users, args.ops, args.plan_kb * 1024, workdir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Per-message overhead of the Streamlit async bridge, per-call loops vs one background loop.
+
+"per-call" is the old run_async: a new ThreadPoolExecutor and asyncio.run for
+every message, so the graph and its checkpointer connection are rebuilt each
+time. "background" submits every message to one long-lived BackgroundLoop.
+The stub model answers instantly, so the numbers are pure overhead.
+
+    uv run python benchmarks/bench_run_async.py --messages 50
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scratch_dir  # noqa: F401  (before any backend module)
+
+from agent_manager import AgentManager
+from background_loop import BackgroundLoop
+from chat_graph_manager import ChatGraphManager
+from fake_chat_model import FakeChatModel
+
+
+def run_per_call(coro):
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+async def send_message(agent_manager: AgentManager, username: str, message: str) -> str:
+    return "".join([chunk async for chunk in agent_manager.process_message(username, message)])
+
+
+def run(mode: str, messages: int, workdir: str) -> None:
+    agent_manager = AgentManager(chat_graph=ChatGraphManager(
+        chat_model=FakeChatModel(latency=0), checkpoint_path=os.path.join(workdir, f"{mode}.sqlite")))
+    background = BackgroundLoop() if mode == "background" else None
+    run_async = background.run if background else run_per_call
+
+    latencies = []
+    for i in range(messages):
+        start = time.perf_counter()
+        run_async(send_message(agent_manager, "bench", f"Message {i}: how much water should I drink?"))
+        latencies.append(time.perf_counter() - start)
+    run_async(agent_manager.aclose())
+    if background:
+        background.stop()
+
+    # The first message pays for graph compilation in both modes
+    steady = latencies[1:] or latencies
+    print(f"{mode:>10}: first {latencies[0] * 1000:7.1f}ms, median {statistics.median(steady) * 1000:7.2f}ms, "
+          f"p95 {sorted(steady)[int(len(steady) * 0.95) - 1] * 1000:7.2f}ms per message")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-call event loops vs a long-lived background loop")
+    parser.add_argument("--messages", type=int, default=50)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in ("per-call", "background"):
+            run(mode, args.messages, workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Session creation latency and open sockets, per-session models vs the shared registry.
+
+"per-session" builds a new DatabricksChatModel (and so a new HTTP client) for
+every session, like each Streamlit session used to. "shared" takes the model
+from get_chat_model. With --invoke every session also sends one message to the
+endpoint, so the open socket count reflects real connections (this needs
+DATABRICKS_HOST/DATABRICKS_TOKEN and costs one request per session).
+
+    uv run python benchmarks/bench_sessions.py --sessions 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scratch_dir  # noqa: F401  (before any backend module)
+
+# Building a client doesn't contact the workspace, placeholders are enough without --invoke
+os.environ.setdefault("DATABRICKS_HOST", "https://example.cloud.databricks.com")
+os.environ.setdefault("DATABRICKS_TOKEN", "placeholder")
+
+from agent_manager import AgentManager
+from chat_graph_manager import ChatGraphManager
+from DatabricksClient import DatabricksChatModel, get_chat_model
+
+
+def open_sockets() -> int:
+    """Count socket file descriptors of this process (Linux only)."""
+    fd_dir = "/proc/self/fd"
+    if not os.path.isdir(fd_dir):
+        return -1
+    count = 0
+    for fd in os.listdir(fd_dir):
+        try:
+            if os.readlink(os.path.join(fd_dir, fd)).startswith("socket:"):
+                count += 1
+        except OSError:
+            pass
+    return count
+
+
+def create_session(shared: bool, checkpoint_path: str) -> AgentManager:
+    model = get_chat_model() if shared else DatabricksChatModel()
+    return AgentManager(chat_graph=ChatGraphManager(chat_model=model.chat_model, checkpoint_path=checkpoint_path))
+
+
+def run(mode: str, sessions: int, invoke: bool, workdir: str) -> None:
+    latencies = []
+    managers = []
+    for i in range(sessions):
+        start = time.perf_counter()
+        manager = create_session(mode == "shared", os.path.join(workdir, f"{mode}.sqlite"))
+        latencies.append(time.perf_counter() - start)
+        managers.append(manager)
+        if invoke:
+            manager.chat_graph.chat_model.invoke("Reply with OK.")
+    print(f"{mode:>12}: median {statistics.median(latencies) * 1000:.2f}ms per session, "
+          f"{len({id(m.chat_graph.chat_model) for m in managers})} model clients, {open_sockets()} open sockets")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Session creation benchmark")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--invoke", action="store_true", help="Send one real request per session")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        for mode in ("per-session", "shared"):
+            run(mode, args.sessions, args.invoke, workdir)
+
+
+if __name__ == "__main__":
+    main()
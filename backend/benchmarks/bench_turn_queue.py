@@ -0,0 +1,104 @@
+"""Model calls and wall time for bursty input, serialized turns vs coalesced turns.
+
+Every user sends --burst messages in quick succession (a few milliseconds
+apart, like a fast typist or two tabs). "serial" answers each message in its
+own turn; "coalesce" answers everything sent during a turn in the next one.
+First checks that a reader leaving with a full buffer neither stalls the
+other readers of its turn nor keeps the user's next turn waiting; exits
+non-zero if it does.
+
+    uv run python benchmarks/bench_turn_queue.py --users 10 --burst 4 --latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scratch_dir  # noqa: F401  (before any backend module)
+
+from agent_manager import AgentManager
+from chat_graph_manager import ChatGraphManager
+from fake_chat_model import FakeChatModel
+from session_store import InMemorySessionStore
+from turn_queue import TurnQueue
+
+
+async def check_abandoned_readers(frames: int = 20, timeout: float = 5) -> bool:
+    """A reader that stops reading and then leaves must not block its turn, the other readers or the next turn."""
+    turn_queue = TurnQueue(coalesce=True, max_buffered_frames=2)
+
+    async def run(username: str, message: str):
+        for i in range(frames):
+            yield {"type": "token", "content": str(i)}
+            await asyncio.sleep(0)
+
+    async def read_all(frames_iter) -> int:
+        return len([frame async for frame in frames_iter if frame["type"] == "token"])
+
+    async def leave_after_first_frame(frames_iter) -> None:
+        await frames_iter.__anext__()
+        await asyncio.sleep(0.05)  # its buffer fills up and the turn waits on it
+        await frames_iter.aclose()
+
+    # Two readers of one coalesced turn, one of which goes away
+    leaver = asyncio.create_task(leave_after_first_frame(turn_queue.submit("check", "first", run)))
+    reader = asyncio.create_task(read_all(turn_queue.submit("check", "second", run)))
+    try:
+        received = await asyncio.wait_for(reader, timeout)
+        await leaver
+        # The only reader goes away: the turn is cancelled and the user's next turn runs
+        await leave_after_first_frame(turn_queue.submit("check", "third", run))
+        follow_up = await asyncio.wait_for(read_all(turn_queue.submit("check", "fourth", run)), timeout)
+    except asyncio.TimeoutError:
+        print("abandoned reader: FAILED (turn stalled)")
+        return False
+    ok = received == frames and follow_up == frames and turn_queue.stats()["cancelled"] == 1
+    print(f"abandoned reader: {'ok' if ok else 'FAILED'} ({received}/{frames} frames to the other reader, "
+          f"{turn_queue.stats()['cancelled']} turn cancelled, {follow_up}/{frames} frames on the next turn)")
+    return ok
+
+
+async def send(agent_manager: AgentManager, username: str, message: str, delay: float) -> None:
+    await asyncio.sleep(delay)
+    async for _ in agent_manager.stream_turn(username, message):
+        pass
+
+
+async def run(mode: str, users: int, burst: int, latency: float, workdir: str) -> None:
+    model = FakeChatModel(latency=latency)
+    agent_manager = AgentManager(
+        chat_graph=ChatGraphManager(chat_model=model, checkpoint_path=os.path.join(workdir, f"{mode}.sqlite")),
+        session_store=InMemorySessionStore(),
+        coalesce_turns=mode == "coalesce",
+    )
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        send(agent_manager, f"bench-{u}", f"Message {i}: also, is coffee okay?", i * 0.01)
+        for u in range(users) for i in range(burst)
+    ))
+    elapsed = time.perf_counter() - start
+    await agent_manager.aclose()
+    stats = agent_manager.get_turn_queue_stats()
+    print(f"{mode:>9}: {elapsed:6.2f}s, {model.calls:4d} model calls, {stats['turns_run']:4d} turns, "
+          f"max queue depth {stats['max_depth_seen']}, {stats['coalesced']} messages coalesced")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-user turn serialization and coalescing")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--burst", type=int, default=4, help="Messages each user sends back to back")
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub model latency in seconds")
+    args = parser.parse_args()
+    if not asyncio.run(check_abandoned_readers()):
+        sys.exit(1)
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in ("serial", "coalesce"):
+            asyncio.run(run(mode, args.users, args.burst, args.latency, workdir))
+
+
+if __name__ == "__main__":
+    main()
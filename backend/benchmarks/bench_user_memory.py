@@ -0,0 +1,112 @@
+"""Resident memory per 10k idle users, before and after bounding per-user state.
+
+Every simulated user has had a short conversation: transcript messages, a
+location, the last turn's prompt cache usage, a cached plan, the plan context
+message and turn metrics, the state AgentManager, ChatGraphManager,
+HistoryManager and PlanService keep per user. Then everyone goes idle.
+
+    dicts    plain dicts per user and transcript dicts with ISO timestamps (the old layout)
+    records  TranscriptMessage records, still all resident
+    spill    records, with idle users spilled to SQLite and dropped from memory
+
+Memory is measured with tracemalloc (Python allocations only). The spill mode
+also times reading a spilled transcript back on the user's next message.
+
+    uv run python benchmarks/bench_user_memory.py --users 10000 --turns 5
+"""
+import argparse
+import gc
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from idle_cache import IdleCache
+from session_store import InMemorySessionStore, SQLiteSessionStore
+from transcript import TranscriptMessage
+
+REPLY = "Thanks for sharing that. Keep taking your prenatal vitamin, drink plenty of water and let me know about any new symptoms. "
+
+
+def plan_for(user: int) -> str:
+    return (f"# Pregnancy Plan\n\n- Due date: March {1 + user % 28}\n- Location: City {user}\n\n"
+            "## Appointments\n- [ ] Book the first prenatal visit\n- [ ] Glucose screening\n\n"
+            "## Nutrition\n" + "- Eat small balanced meals with protein and whole grains\n" * 10)
+
+
+def populate(mode: str, users: int, turns: int, workdir: str):
+    if mode == "spill":
+        store = InMemorySessionStore(spill=SQLiteSessionStore(os.path.join(workdir, "spill.sqlite")),
+                                     max_resident_keys=3 * users, idle_seconds=0.5)
+        caches = [IdleCache(users, 0.5) for _ in range(4)]
+    else:
+        store = InMemorySessionStore()
+        caches = [IdleCache() for _ in range(4)]
+    restored, plan_cache, plan_messages, turn_metrics = caches
+
+    for user in range(users):
+        username = f"user{user:06d}"
+        for turn in range(turns):
+            for role, content in (("user", f"Question {turn} from {username}: what should I eat this week?"),
+                                  ("assistant", f"{REPLY * 2}({username}, turn {turn})")):
+                if mode == "dicts":
+                    message = {"role": role, "content": content, "timestamp": datetime.now().isoformat()}
+                else:
+                    message = TranscriptMessage.now(role, content)
+                store.append(f"transcript:{username}", message, max_len=200)
+        store.set(f"location:{username}", f"City {user}")
+        store.set(f"prompt_cache_usage:{username}", {"cached_tokens": 1200, "uncached_tokens": 300, "cache_writes": 0})
+        plan = plan_for(user)
+        restored.set(username, True)
+        plan_cache.set(username, {"content": plan, "last_updated": datetime.now().isoformat(), "version": 3})
+        plan_messages.set(username, (3, f"Current pregnancy plan for this user (version 3):\n\n{plan}"))
+        turn_metrics.set(username, {"model_calls": 2, "tokens_before": 900, "tokens_after": 700, "compactions": 0})
+    return store, caches
+
+
+def run(mode: str, users: int, turns: int) -> None:
+    with tempfile.TemporaryDirectory() as workdir:
+        gc.collect()
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        store, caches = populate(mode, users, turns, workdir)
+
+        if mode == "spill":
+            time.sleep(0.6)  # everyone is idle now
+            store.evict_idle()
+            for cache in caches:
+                cache.evict_idle()
+        gc.collect()
+        resident = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+
+        line = (f"{mode:>8}: {resident / 1024 / 1024 / users * 10000:8.1f} MB per 10k idle users, "
+                f"{store.resident_keys()} resident session keys")
+        if mode == "spill":
+            latencies = []
+            for user in range(0, users, max(1, users // 1000)):
+                start = time.perf_counter()
+                history = store.get_list(f"transcript:user{user:06d}")
+                latencies.append(time.perf_counter() - start)
+                assert len(history) == 2 * turns
+            line += f", rehydrate median {statistics.median(latencies) * 1000:.2f}ms"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resident memory of idle users' state")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--turns", type=int, default=5, help="Conversation turns per user")
+    parser.add_argument("--modes", nargs="+", choices=["dicts", "records", "spill"], default=["dicts", "records", "spill"])
+    args = parser.parse_args()
+    for mode in args.modes:
+        run(mode, args.users, args.turns)
+
+
+if __name__ == "__main__":
+    main()
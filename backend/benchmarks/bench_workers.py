@@ -0,0 +1,139 @@
+"""Chat throughput of the API with 1 vs N uvicorn workers, sharing state through the session store.
+
+Every message opens a new /ws/chat connection, so consecutive turns of a
+user land on whichever worker accepts the connection; the transcript check
+at the end shows every turn was recorded regardless. The workers serve
+main.app with the stub model (this module is also the uvicorn app).
+
+    uv run python benchmarks/bench_workers.py --workers 1 4 --users 40 --turns 3 --store sqlite
+    uv run python benchmarks/bench_workers.py --workers 1 4 --store redis   # against mini_redis.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scratch_dir  # noqa: F401  (before any backend module)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if __name__ != "__main__":
+    # Imported by a uvicorn worker: serve the real app, with the stub model
+    os.environ.setdefault("DATABRICKS_HOST", "https://example.cloud.databricks.com")
+    os.environ.setdefault("DATABRICKS_TOKEN", "placeholder")
+
+    import main
+    from agent_manager import AgentManager
+    from chat_graph_manager import ChatGraphManager
+    from fake_chat_model import FakeChatModel
+
+    main.agent_manager = AgentManager(chat_graph=ChatGraphManager(
+        chat_model=FakeChatModel(latency=float(os.getenv("BENCH_MODEL_LATENCY", "0.05"))),
+        checkpoint_path=os.environ["CHECKPOINT_DB"],
+    ))
+    app = main.app
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_until_up(port: int, timeout: float = 60) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/stats/provider-cache", timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not come up")
+
+
+async def send_turn(port: int, username: str, message: str) -> float:
+    import websockets
+
+    start = time.perf_counter()
+    async with websockets.connect(f"ws://127.0.0.1:{port}/ws/chat") as websocket:
+        await websocket.send(json.dumps({"username": username, "message": message}))
+        while True:
+            frame = json.loads(await websocket.recv())
+            if frame["type"] in ("done", "error"):
+                break
+    return time.perf_counter() - start
+
+
+async def run_load(port: int, users: int, turns: int) -> List[float]:
+    async def user(i: int) -> List[float]:
+        return [await send_turn(port, f"bench-{i}", f"Turn {t}: what should I eat this week?") for t in range(turns)]
+
+    results = await asyncio.gather(*(user(i) for i in range(users)))
+    return [latency for latencies in results for latency in latencies]
+
+
+def run(workers: int, users: int, turns: int, store: str, latency: float) -> None:
+    from session_store import create_session_store
+
+    with tempfile.TemporaryDirectory() as workdir:
+        helpers = []
+        if store == "redis":
+            redis_port = _free_port()
+            helpers.append(subprocess.Popen([sys.executable, os.path.join(BACKEND_DIR, "mini_redis.py"), "--port", str(redis_port)]))
+            store_url = f"redis://127.0.0.1:{redis_port}/0"
+        else:
+            store_url = "sqlite:///" + os.path.join(workdir, "sessions.sqlite")
+
+        port = _free_port()
+        env = dict(os.environ, SESSION_STORE=store_url, PLAN_WATCH="1",
+                   CHECKPOINT_DB=os.path.join(workdir, "checkpoints.sqlite"), PLANS_DIR=os.path.join(workdir, "plans"),
+                   BENCH_MODEL_LATENCY=str(latency))
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "bench_workers:app", "--app-dir", os.path.dirname(os.path.abspath(__file__)),
+             "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+            cwd=workdir, env=env,
+        )
+        try:
+            _wait_until_up(port)
+            time.sleep(2)  # let the remaining workers finish importing
+            start = time.perf_counter()
+            latencies = asyncio.run(run_load(port, users, turns))
+            elapsed = time.perf_counter() - start
+
+            session_store = create_session_store(store_url)
+            complete = sum(len(session_store.get_list(f"transcript:bench-{i}")) == 2 * turns for i in range(users))
+        finally:
+            for process in [server] + helpers:
+                process.terminate()
+                process.wait()
+
+    latencies.sort()
+    print(f"{workers:>3} workers ({store}): {len(latencies) / elapsed:7.1f} turns/s, "
+          f"p50 {statistics.median(latencies) * 1000:7.1f}ms, p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:7.1f}ms, "
+          f"complete transcripts {complete}/{users}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-worker throughput with externalized session state")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--users", type=int, default=40)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--store", choices=["sqlite", "redis"], default="sqlite")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub model latency in seconds")
+    args = parser.parse_args()
+    for workers in args.workers:
+        run(workers, args.users, args.turns, args.store, args.latency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""Keeps benchmark runs out of the backend's real caches and stores.
+
+Import it before any backend module. It points every on-disk path the backend
+defaults to (session spill, provider search cache, MCP tool snapshot,
+checkpoints, plans) at a throwaway directory through its environment
+variable, unless that variable is already set. Servers a benchmark starts
+inherit the same paths; the directory is removed when the benchmark exits.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+SCRATCH_DIR = os.environ.get("BENCH_SCRATCH_DIR")
+if SCRATCH_DIR is None:
+    SCRATCH_DIR = os.environ["BENCH_SCRATCH_DIR"] = tempfile.mkdtemp(prefix="babygpt-bench-")
+    # Registered first so it runs last, after the session store's flush
+    atexit.register(shutil.rmtree, SCRATCH_DIR, ignore_errors=True)
+
+for name, value in {
+    "SESSION_SPILL": "sqlite:///" + os.path.join(SCRATCH_DIR, "session-spill.sqlite"),
+    "PROVIDER_CACHE_DB": os.path.join(SCRATCH_DIR, "provider_search.sqlite"),
+    "NIMBLE_TOOL_CACHE": os.path.join(SCRATCH_DIR, "nimble_tools.json"),
+    "CHECKPOINT_DB": os.path.join(SCRATCH_DIR, "checkpoints.sqlite"),
+    "PLANS_DIR": os.path.join(SCRATCH_DIR, "plans"),
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,54 @@
+"""Stand-in for the Nimble MCP server: one provider search tool over SSE, with fixed latency.
+
+Point the backend at it with NIMBLE_MCP_URL=http://127.0.0.1:<port>/sse. The
+results are derived from the location only, so every run sees the same data.
+
+    uv run python benchmarks/stub_mcp_server.py --port 8765 --latency 0.5
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+
+from mcp.server.fastmcp import FastMCP
+
+PRACTICES = ["Women's Health Partners", "Riverside OBGYN", "Family Birth Center", "Maple Midwifery", "City Perinatal Group"]
+
+
+def providers_near(location: str, count: int = 3) -> list:
+    seed = int(hashlib.sha256(location.lower().encode()).hexdigest(), 16)
+    return [
+        {
+            "name": PRACTICES[(seed + i) % len(PRACTICES)],
+            "address": f"{100 + (seed >> i) % 900} Main Street, {location}",
+            "rating": round(3.5 + ((seed >> (8 * i)) % 15) / 10, 1),
+            "accepting_new_patients": bool((seed >> i) % 2),
+        }
+        for i in range(count)
+    ]
+
+
+def create_server(host: str, port: int, latency: float) -> FastMCP:
+    server = FastMCP("nimble-stub", host=host, port=port)
+
+    @server.tool()
+    async def search_providers(query: str) -> str:
+        """Search for healthcare providers matching a query such as 'OBGYN near Austin, TX'."""
+        await asyncio.sleep(latency)
+        location = query.rsplit(" near ", 1)[-1]
+        return json.dumps(providers_near(location))
+
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Nimble MCP server (SSE)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds each tool call takes")
+    args = parser.parse_args()
+    create_server(args.host, args.port, args.latency).run(transport="sse")
+
+
+if __name__ == "__main__":
+    main()
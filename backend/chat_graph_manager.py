@@ -1,16 +1,31 @@
-from typing import Dict, Annotated, List, Optional, Any
+from abc import ABC, abstractmethod
+from typing import Dict, Annotated, List, Optional, Any, AsyncGenerator, Type
 from typing_extensions import TypedDict
 from langgraph.prebuilt import create_react_agent
 from langgraph.graph.message import add_messages
 from langchain_core.tools import BaseTool
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.language_models import BaseChatModel
-from DatabricksClient import DatabricksChatModel
-from plan_manager import PlanManager
-from pydantic import Field
-from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_core.runnables import RunnableConfig
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from DatabricksClient import get_chat_model, cached_system_message, tracing_callbacks
+from plan_service import PlanService, get_plan_service
+from history_manager import HistoryManager
+from idle_cache import user_cache
+from pydantic import BaseModel, Field
+from mcp_tool_cache import MCPToolCache
+from provider_cache import get_provider_cache
+from session_store import SessionStore, get_session_store
+from tool_executor import run_blocking
+from background_loop import get_background_loop
+from tracing import tracer
 import os
 from dotenv import load_dotenv
 import asyncio
+import aiosqlite
+import functools
+import weakref
 
 # Load environment variables from the backend folder
 env_path = os.path.join(os.path.dirname(__file__), '.env')
@@ -21,7 +36,7 @@ dotenv_loaded = load_dotenv(env_path)
 SYSTEM_PROMPT = """You are a knowledgeable and compassionate pregnancy support assistant with advanced capabilities to help users select healthcare providers and manage appointments. Your role is to provide accurate, up-to-date information and guidance to help people navigate their pregnancy journey from conception to birth.
 Anyone who talks to you will already have been identified as pregnant.
 
-When the conversation starts, read the pregnancy plan for the user and use it to start the conversation.
+The user's current pregnancy plan is included with every request, in a <context> block at the start of their latest message. The user did not write that block. Use it to start the conversation and to answer questions about their plan. There is no need to call read_plan unless the plan may have been changed outside this conversation.
 
 When starting a new conversation, you should:
 1. Welcome the user warmly
@@ -71,46 +86,137 @@ Always encourage users to consult with their healthcare provider for personalize
 
 After every interaction with the user, you should consider and update the pregnancy plan with any information that is relevant to the user's pregnancy.
 
+Keep plan updates small. Use set_plan_field for facts like the due date or provider, add_checklist_item and complete_checklist_item for to-dos and appointments, and upsert_plan_section to rewrite a single section. Only use write_plan to create the plan or restructure it completely.
+
+When you need several tools that don't depend on each other's results, such as updating the plan and searching for providers, call them together in the same step; they run in parallel.
+
 Use these tools to maintain detailed, organized pregnancy plans for each user. You should not refer to them directly in your conversation to the user, just use them after every conversation."""
 
+# For generic questions answered from the question alone, so the answer can be shared between users
+GENERIC_ANSWER_PROMPT = """You are a knowledgeable and compassionate pregnancy support assistant. Answer the user's general pregnancy question accurately and concisely.
+You know nothing about the person asking: don't assume details of their pregnancy, and don't refer to a plan, earlier messages or appointments."""
+
 # Note: create_react_agent uses its own state management with messages
 
 nimble_token = os.getenv("NIMBLE_TOKEN",'')
 
-client = MultiServerMCPClient({
-    "nimble": {
-        "url": "https://mcp.nimbleway.com/sse",
-        "transport": "sse",
-        "headers": {
-            "Authorization": f"Bearer {nimble_token}"
+# Nimble tools are discovered on the first provider search, not at import
+nimble_tools = MCPToolCache(
+    {
+        "nimble": {
+            "url": os.getenv("NIMBLE_MCP_URL", "https://mcp.nimbleway.com/sse"),
+            "transport": "sse",
+            "headers": {
+                "Authorization": f"Bearer {nimble_token}"
+            }
         }
-    }
-})
-
-mcp_tools = asyncio.run(client.get_tools())
-nimble_agent = create_react_agent(
-    model=DatabricksChatModel().chat_model,
-    tools=mcp_tools,
-    prompt="Using the tools provided your aim is to provide the best options for OBGYN provider"
+    },
+    snapshot_path=os.getenv("NIMBLE_TOOL_CACHE", os.path.join(os.path.dirname(__file__), ".cache", "nimble_tools.json")),
+    ttl_seconds=float(os.getenv("NIMBLE_TOOL_TTL_SECONDS", "3600")),
 )
 
+_nimble_agent = None
+_nimble_agent_tools = None
+
+async def get_nimble_agent():
+    """Build the provider search agent lazily, rebuilding it when the tool cache refreshes."""
+    global _nimble_agent, _nimble_agent_tools
+    mcp_tools = await nimble_tools.aget_tools()
+    if _nimble_agent is None or mcp_tools is not _nimble_agent_tools:
+        _nimble_agent = create_react_agent(
+            model=get_chat_model().chat_model,
+            tools=mcp_tools,
+            prompt="Using the tools provided your aim is to provide the best options for OBGYN provider"
+        )
+        _nimble_agent_tools = mcp_tools
+    return _nimble_agent
+
+def _username_from_config(config: RunnableConfig) -> Optional[str]:
+    """Read the username the current run was started for."""
+    return (config or {}).get("configurable", {}).get("username")
+
+
+class LocationStore:
+    """Last location each user gave, keyed by username.
+
+    Tools are shared between all conversations, so per-user state lives here
+    instead of on the tool instances. It is kept in the session store so every
+    worker sees the same value.
+    """
+    def __init__(self, session_store: Optional[SessionStore] = None):
+        self._session_store = session_store
+
+    @property
+    def session_store(self) -> SessionStore:
+        # Resolved on first use so importing this module doesn't open the store
+        return self._session_store or get_session_store()
+
+    def get(self, username: str) -> Optional[str]:
+        return self.session_store.get(f"location:{username}")
+
+    def set(self, username: str, location: str) -> None:
+        self.session_store.set(f"location:{username}", location)
+
+user_locations = LocationStore()
+
+
+class NoInput(BaseModel):
+    pass
+
+class SetLocationInput(BaseModel):
+    location: str = Field(description="The user's city, town or postcode")
+
+class WritePlanInput(BaseModel):
+    content: str = Field(description="The full pregnancy plan in Markdown")
+
+class UpsertSectionInput(BaseModel):
+    heading: str = Field(description="Section heading, e.g. 'Nutrition'")
+    body: str = Field(description="New Markdown body of the section, without the heading")
+
+class ChecklistItemInput(BaseModel):
+    section: str = Field(description="Section heading to add the item to, e.g. 'Appointments'")
+    item: str = Field(description="Text of the checklist item")
+
+class CompleteItemInput(BaseModel):
+    item: str = Field(description="Text (or part of the text) of the checklist item to mark done")
+
+class SetFieldInput(BaseModel):
+    field: str = Field(description="Field name, e.g. 'Due date', 'Provider', 'Insurance'")
+    value: str = Field(description="Field value")
+
+
 class GetOBGYNProviderOptions(BaseTool):
     name: str = "find_provider"
     description: str = "Finds OBGYN providers based on the user's location"
+    args_schema: Type[BaseModel] = NoInput
 
-    def _run(self) -> str:
-        from chat_graph_manager import current_location_context
-        location = getattr(current_location_context, 'location', None)
+    def _run(self, config: RunnableConfig) -> str:
+        # The MCP tools are async only; asyncio.run() would fail under a running loop
+        return get_background_loop().run(self._arun(config))
+
+    async def _arun(self, config: RunnableConfig) -> str:
+        location = await run_blocking(user_locations.get, _username_from_config(config))
         if not location:
             return "Please set your location first using the set_users_location tool"
 
+        # Provider search results are shared between users searching the same place
+        cached = await run_blocking(get_provider_cache().get, location)
+        if cached is not None:
+            return cached
+
         try:
-            result = nimble_agent.invoke({"messages": [{"role": "user", "content": f"What OBGYN Providers are available near {location}"}]})
-            # Extract the final message content from the result
-        
+            nimble_agent = await get_nimble_agent()
+            with tracer.span("nimble_agent.run", location=location):
+                result = await nimble_agent.ainvoke({"messages": [{"role": "user", "content": f"What OBGYN Providers are available near {location}"}]})
+
             if isinstance(result, dict) and 'messages' in result:
-                return result['messages'][-1].content if result['messages'] else "No providers found"
-            return str(result)
+                if not result['messages']:
+                    return "No providers found"
+                providers = _text_of(result['messages'][-1].content)
+            else:
+                providers = str(result)
+            await run_blocking(get_provider_cache().put, location, providers)
+            return providers
         except Exception as e:
             return f"Error finding providers: {str(e)}"
 
@@ -118,105 +224,361 @@ class GetOBGYNProviderOptions(BaseTool):
 class SetUsersLocation(BaseTool):
     name: str = "set_users_location"
     description: str = "Set the user's location"
-    def _run(self, location: str) -> str:
-        from chat_graph_manager import current_location_context
-        current_location_context.location = location
+    args_schema: Type[BaseModel] = SetLocationInput
+
+    def _run(self, location: str, config: RunnableConfig) -> str:
+        username = _username_from_config(config)
+        if not username:
+            return "No username available"
+        user_locations.set(username, location)
         return "Location set successfully you can now use the find_provider tool to find OBGYN providers"
 
+    async def _arun(self, location: str, config: RunnableConfig) -> str:
+        return await run_blocking(self._run, location, config)
+
     
 
 class ReadPlanTool(BaseTool):
     name: str = "read_plan"
-    description: str = "Read the current pregnancy plan for the user"
+    description: str = "Read the current pregnancy plan for the user. The plan is already provided with each request; only use this if it may have changed outside this conversation"
+    args_schema: Type[BaseModel] = NoInput
     
-    def _run(self) -> str:
-        # Get the username from the graph manager instance
-        from chat_graph_manager import current_username_context
-        username = getattr(current_username_context, 'username', None)
+    def _run(self, config: RunnableConfig) -> str:
+        username = _username_from_config(config)
         if not username:
             return "No username available"
         
-        from plan_manager import PlanManager
-        plan_manager = PlanManager()
-        plan_content = plan_manager.read_plan(username)
+        plan_content = get_plan_service().get_plan(username)["content"]
+        return plan_content if plan_content else "No existing pregnancy plan found for this user.\n"
+
+    async def _arun(self, config: RunnableConfig) -> str:
+        username = _username_from_config(config)
+        if not username:
+            return "No username available"
+
+        plan_content = (await get_plan_service().aget_plan(username))["content"]
         return plan_content if plan_content else "No existing pregnancy plan found for this user.\n"
 
 class WritePlanTool(BaseTool):
     name: str = "write_plan"
-    description: str = "Write or completely update the pregnancy plan for the user with new content"
+    description: str = "Write or completely replace the pregnancy plan for the user. Prefer the smaller plan edit tools for updates"
+    args_schema: Type[BaseModel] = WritePlanInput
     
-    def _run(self, content: str) -> str:
-        # Get the username from the graph manager instance
-        from chat_graph_manager import current_username_context
-        username = getattr(current_username_context, 'username', None)
+    def _run(self, content: str, config: RunnableConfig) -> str:
+        username = _username_from_config(config)
         if not username:
             return "No username available"
         
-        from plan_manager import PlanManager
-        plan_manager = PlanManager()
-        plan_manager.write_plan(username, content)
+        get_plan_service().write_plan(username, content)
         return "Pregnancy plan updated successfully"
 
-# Global context to pass username to tools
-class UsernameContext:
-    def __init__(self):
-        self.username = None
+    async def _arun(self, content: str, config: RunnableConfig) -> str:
+        username = _username_from_config(config)
+        if not username:
+            return "No username available"
+
+        await get_plan_service().awrite_plan(username, content)
+        return "Pregnancy plan updated successfully"
+
+def _is_top_level_agent(metadata: Dict) -> bool:
+    """True for model output from our own agent node, not the nested provider search agent."""
+    return metadata.get("langgraph_node") == "agent" and "|" not in metadata.get("langgraph_checkpoint_ns", "")
+
+def _text_of(content: Any) -> str:
+    """Flatten message content that may be a string or a list of content blocks."""
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+
+class PlanEditTool(BaseTool, ABC):
+    """Base for the tools that make one edit to the user's plan.
+
+    Subclasses implement `_edit`, a blocking call on the plan service that
+    returns the tool's reply; the async path runs it on the tool pool.
+    """
+
+    @abstractmethod
+    def _edit(self, plans: PlanService, username: str, **kwargs: Any) -> str:
+        ...
+
+    def _run(self, config: RunnableConfig, **kwargs: Any) -> str:
+        username = _username_from_config(config)
+        if not username:
+            return "No username available"
+        return self._edit(get_plan_service(), username, **kwargs)
+
+    async def _arun(self, config: RunnableConfig, **kwargs: Any) -> str:
+        username = _username_from_config(config)
+        if not username:
+            return "No username available"
+        return await run_blocking(functools.partial(self._edit, get_plan_service(), username, **kwargs))
+
+class UpsertPlanSectionTool(PlanEditTool):
+    name: str = "upsert_plan_section"
+    description: str = "Replace one section of the pregnancy plan by heading, or add it if it doesn't exist"
+    args_schema: Type[BaseModel] = UpsertSectionInput
 
-class LocationContext:
-    def __init__(self):
-        self.location = None
+    def _edit(self, plans: PlanService, username: str, heading: str, body: str) -> str:
+        plans.upsert_section(username, heading, body)
+        return f"Section '{heading}' updated"
 
-current_location_context = LocationContext()
-current_username_context = UsernameContext()
+class AddChecklistItemTool(PlanEditTool):
+    name: str = "add_checklist_item"
+    description: str = "Add an unchecked checklist item to a section of the pregnancy plan"
+    args_schema: Type[BaseModel] = ChecklistItemInput
+
+    def _edit(self, plans: PlanService, username: str, section: str, item: str) -> str:
+        plans.add_checklist_item(username, section, item)
+        return f"Added '{item}' to '{section}'"
+
+class CompleteChecklistItemTool(PlanEditTool):
+    name: str = "complete_checklist_item"
+    description: str = "Mark a checklist item in the pregnancy plan as done"
+    args_schema: Type[BaseModel] = CompleteItemInput
+
+    def _edit(self, plans: PlanService, username: str, item: str) -> str:
+        found = plans.complete_checklist_item(username, item)
+        return f"Marked '{item}' as done" if found else f"No open checklist item matching '{item}'"
+
+class SetPlanFieldTool(PlanEditTool):
+    name: str = "set_plan_field"
+    description: str = "Set a single fact at the top of the pregnancy plan, such as the due date or provider"
+    args_schema: Type[BaseModel] = SetFieldInput
+
+    def _edit(self, plans: PlanService, username: str, field: str, value: str) -> str:
+        plans.set_field(username, field, value)
+        return f"{field} set"
 
 # Create tool instances
 tools = [
     ReadPlanTool(),
     WritePlanTool(),
+    UpsertPlanSectionTool(),
+    AddChecklistItemTool(),
+    CompleteChecklistItemTool(),
+    SetPlanFieldTool(),
     GetOBGYNProviderOptions(),
     SetUsersLocation()
 ]
 
-class ChatGraphManager:
-    def __init__(self):
-        """Initialize the ChatGraphManager with create_react_agent."""
-        self.plan_manager = PlanManager()
-        self.llm = DatabricksChatModel()
-        
-        # Create the react agent using the prebuilt function
-        self.graph = create_react_agent(
-            model=self.llm.chat_model,
-            tools=tools,
-            prompt=SYSTEM_PROMPT
-        )
+PLAN_CONTEXT_HEADER = "Current pregnancy plan for this user"
+
+def _with_context(messages: List[BaseMessage], context: str) -> List[BaseMessage]:
+    """Put a context block at the start of the latest user message.
+
+    Only that message changes between calls: the system prompt and everything
+    before it stay a cacheable prompt prefix, and there is never more than the
+    one leading system message (plus the history summary) in the input.
+    """
+    last_human = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=None)
+    if last_human is None:
+        return messages
+    message = messages[last_human]
+    block = f"<context>\n{context}\n</context>\n\n"
+    if isinstance(message.content, str):
+        content = block + message.content
+    else:
+        content = [{"type": "text", "text": block}, *message.content]
+    return [*messages[:last_human], message.model_copy(update={"content": content}), *messages[last_human + 1:]]
 
-    def process_message(self, messages: List[Dict], username: str) -> Dict:
-        """Process messages with full conversation history through the LangGraph."""
-        print(f"Processing message for username: {username}\n")
-        
-        # Set the username in global context for tools to access
-        current_username_context.username = username
-        
-        try:
-            # Process the messages using create_react_agent with full history
-            result = self.graph.invoke({"messages": messages})
-            return result
-        finally:
-            # Clean up the context
-            current_username_context.username = None
-
-    def stream_message(self, messages: List[Dict], username: str):
-        """Stream messages with full conversation history through the LangGraph."""
-        print(f"Streaming message for username: {username}\n")
-        
-        # Set the username in global context for tools to access
-        current_username_context.username = username
-        
-        try:
-            # Stream the messages using create_react_agent with full history
-            for chunk in self.graph.stream({"messages": messages}):
-                yield chunk
-        finally:
-            # Clean up the context
-            current_username_context.username = None
+class ChatGraphManager:
+    def __init__(
+        self,
+        chat_model: Optional[BaseChatModel] = None,
+        checkpoint_path: Optional[str] = None,
+        history_manager: Optional[HistoryManager] = None,
+        prompt_cache: Optional[bool] = None,
+        inject_plan: Optional[bool] = None
+    ):
+        """Initialize the ChatGraphManager with create_react_agent.
+
+        A chat model can be passed in to run the graph against something other
+        than the Databricks serving endpoint (e.g. a stub model for benchmarks).
+        Conversation state is checkpointed per username in a SQLite database,
+        so each turn only submits the new message and history survives restarts.
+        The history manager keeps what each model call sees within a token budget.
+        The system prompt carries a prompt-cache marker when `prompt_cache` is
+        True (defaults to the PROMPT_CACHE environment variable, off unless set).
+        Unless `inject_plan` is False (defaults to the PLAN_CONTEXT environment
+        variable), the user's current plan is added to every model call, so turns
+        don't start with a read_plan round trip.
+        """
+        self.plan_service = get_plan_service()
+        self.chat_model = chat_model or get_chat_model().chat_model
+        self.history_manager = history_manager or HistoryManager(summary_model=self.chat_model)
+        self.system_message = cached_system_message(SYSTEM_PROMPT, prompt_cache)
+        self.checkpoint_path = checkpoint_path or os.getenv("CHECKPOINT_DB", "checkpoints.sqlite")
+        if inject_plan is None:
+            inject_plan = os.getenv("PLAN_CONTEXT", "1").lower() not in ("0", "false", "no")
+        self.inject_plan = inject_plan
+        self._plan_contexts = user_cache()  # username -> (plan version, plan context), recently active users only
+        self.graph = None
+        self._graph_loop = None
+        self._graph_conn = None
+        self._graph_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+
+    async def _aget_graph(self):
+        """Compile the react agent with a SQLite checkpointer for the running event loop.
+
+        Concurrent first calls on a loop wait for one compile; the checkpointer
+        connection of the previous loop is closed when the graph is replaced.
+        """
+        loop = asyncio.get_running_loop()
+        if self.graph is not None and self._graph_loop is loop:
+            return self.graph
+        async with self._graph_locks.setdefault(loop, asyncio.Lock()):
+            if self.graph is None or self._graph_loop is not loop:
+                # AsyncSqliteSaver binds to the loop it is created on
+                previous = self._graph_conn
+                conn = await aiosqlite.connect(self.checkpoint_path)
+                self.graph = create_react_agent(
+                    model=self.chat_model,
+                    tools=tools,
+                    prompt=self.system_message,
+                    pre_model_hook=self._apre_model_hook,
+                    checkpointer=AsyncSqliteSaver(conn)
+                )
+                self._graph_loop = loop
+                self._graph_conn = conn
+                if previous is not None:
+                    await previous.close()
+            return self.graph
+
+    async def aclose(self) -> None:
+        """Close the checkpointer connection (its worker thread keeps the process alive otherwise).
+
+        The graph is compiled again, with a new connection, on the next call.
+        """
+        conn, self._graph_conn = self._graph_conn, None
+        self.graph = None
+        self._graph_loop = None
+        if conn is not None:
+            await conn.close()
+
+    async def _apre_model_hook(self, state: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+        """Bound the history, then add the current plan to what the model sees (not to the state)."""
+        update = await self.history_manager.apre_model_hook(state, config)
+        username = _username_from_config(config)
+        if self.inject_plan and username:
+            update["llm_input_messages"] = _with_context(update["llm_input_messages"], await self._aplan_context(username))
+        return update
+
+    async def _aplan_context(self, username: str) -> str:
+        """The plan as context for the model, rebuilt only when the plan version changes."""
+        plan = await self.plan_service.aget_plan(username)
+        cached = self._plan_contexts.get(username)
+        if cached and cached[0] == plan["version"]:
+            return cached[1]
+        if plan["content"]:
+            context = f"{PLAN_CONTEXT_HEADER} (version {plan['version']}):\n\n{plan['content']}"
+        else:
+            context = f"{PLAN_CONTEXT_HEADER}: the user has no pregnancy plan yet."
+        self._plan_contexts.set(username, (plan["version"], context))
+        return context
+
+    @staticmethod
+    def _config_for(username: str, callbacks: Optional[List[BaseCallbackHandler]] = None) -> RunnableConfig:
+        """Per-request config; the username is the checkpoint thread and tools read it from here.
+
+        Model and tool calls are always traced; `callbacks` are added to that.
+        """
+        return {
+            "configurable": {"username": username, "thread_id": username},
+            "callbacks": [tracing_callbacks, *(callbacks or [])],
+        }
 
+    async def aget_messages(self, username: str) -> List[Dict]:
+        """Load the user and assistant messages saved in the user's checkpoint."""
+        graph = await self._aget_graph()
+        state = await graph.aget_state(self._config_for(username))
+        history = []
+        for message in state.values.get("messages", []) if state else []:
+            text = _text_of(message.content)
+            if isinstance(message, HumanMessage):
+                history.append({"role": "user", "content": text})
+            elif isinstance(message, AIMessage) and text:
+                history.append({"role": "assistant", "content": text})
+        return history
+
+    async def aclose_pending_tool_calls(self, username: str) -> int:
+        """Answer tool calls left open by a cancelled turn so the next turn's history is valid.
+
+        A run cancelled between the model requesting tools and the tools node
+        finishing leaves an AI message whose tool calls have no results, which
+        the serving endpoint rejects. Returns the number of calls closed.
+        """
+        graph = await self._aget_graph()
+        config = self._config_for(username)
+        state = await graph.aget_state(config)
+        messages = state.values.get("messages", []) if state else []
+        if not messages or not isinstance(messages[-1], AIMessage) or not messages[-1].tool_calls:
+            return 0
+        await graph.aupdate_state(config, {"messages": [
+            ToolMessage(content="Cancelled: the user left before this tool call finished.",
+                        tool_call_id=tool_call["id"], name=tool_call["name"])
+            for tool_call in messages[-1].tool_calls
+        ]}, as_node="tools")
+        return len(messages[-1].tool_calls)
+
+    async def astream_generic_answer(
+        self,
+        question: str,
+        callbacks: Optional[List[BaseCallbackHandler]] = None
+    ) -> AsyncGenerator[str, None]:
+        """Stream the model's answer to a generic question, without the conversation, plan or tools.
+
+        Nothing about the user is in front of the model, so the answer can go in
+        the shared answer cache. Yields text deltas.
+        """
+        messages = [SystemMessage(content=GENERIC_ANSWER_PROMPT), HumanMessage(content=question)]
+        config = {"callbacks": [tracing_callbacks, *(callbacks or [])]}
+        async for chunk in self.chat_model.astream(messages, config=config):
+            text = _text_of(chunk.content)
+            if text:
+                yield text
+
+    async def arecord_exchange(self, username: str, question: str, answer: str) -> None:
+        """Add a question answered outside the graph (e.g. from the answer cache) to the user's checkpoint."""
+        graph = await self._aget_graph()
+        await graph.aupdate_state(self._config_for(username), {"messages": [
+            HumanMessage(content=question),
+            AIMessage(content=answer),
+        ]}, as_node="agent")
+
+    async def astream_events(
+        self,
+        messages: List[Dict],
+        username: str,
+        callbacks: Optional[List[BaseCallbackHandler]] = None
+    ) -> AsyncGenerator[Dict, None]:
+        """Stream a turn as token deltas and tool start/end events.
+
+        `messages` are only the new messages for this turn; earlier turns are
+        loaded from the checkpoint. `callbacks` are attached to every model and
+        tool call of the turn. Yields frames of the form:
+            {"type": "token", "content": "..."}
+            {"type": "tool_start", "id": "...", "name": "..."}
+            {"type": "tool_end", "id": "...", "name": "..."}
+        """
+        graph = await self._aget_graph()
+        # One checkpoint write at the end of the turn instead of one per model/tool step
+        async for mode, chunk in graph.astream(
+            {"messages": messages},
+            config=self._config_for(username, callbacks),
+            stream_mode=["messages", "updates"],
+            checkpoint_during=False,
+        ):
+            if mode == "messages":
+                message, metadata = chunk
+                if isinstance(message, AIMessageChunk) and _is_top_level_agent(metadata):
+                    text = _text_of(message.content)
+                    if text:
+                        yield {"type": "token", "content": text}
+            elif mode == "updates":
+                for node, update in chunk.items():
+                    for message in (update or {}).get("messages", []):
+                        if node == "agent" and isinstance(message, AIMessage):
+                            for tool_call in message.tool_calls:
+                                yield {"type": "tool_start", "id": tool_call["id"], "name": tool_call["name"]}
+                        elif node == "tools" and isinstance(message, ToolMessage):
+                            yield {"type": "tool_end", "id": message.tool_call_id, "name": message.name}
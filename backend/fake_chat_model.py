@@ -0,0 +1,176 @@
+import asyncio
+import itertools
+import json
+import os
+import re
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# The context block ChatGraphManager puts at the start of the latest user message
+_CONTEXT_BLOCK_RE = re.compile(r"\A<context>\n.*?\n</context>\n\n", re.S)
+
+
+def user_text(message: BaseMessage) -> str:
+    """What the user wrote in a message, without the context block added for the model."""
+    content = message.content
+    if not isinstance(content, str):
+        content = "".join(block.get("text", "") for block in content if isinstance(block, dict))
+    return _CONTEXT_BLOCK_RE.sub("", content, count=1)
+
+
+class ScriptedResponder:
+    """Replays a JSON script of replies and tool calls, keyed on the user's latest message.
+
+    The script looks like:
+
+        {"reply": "Default reply.",
+         "rules": [{"match": "I live in (?P<location>[\\w ]+)",
+                    "tool_calls": [{"name": "set_users_location", "args": {"location": "{location}"}}],
+                    "reply": "Thanks, noted {location}."}]}
+
+    The first rule whose `match` regex is found in the latest human message
+    supplies the tool calls for the first model call of that turn; once their
+    results are in, the rule's `reply` (or the default) ends the turn. Named
+    groups of the match, `{message}` and `{tool_result}` (the last tool result)
+    can be used in the args and replies. The same conversation always gets the
+    same replies, so runs are comparable.
+    """
+
+    def __init__(self, script: Dict[str, Any]):
+        self.reply = script.get("reply", FakeChatModel.model_fields["reply"].default)
+        self.rules = [(re.compile(rule["match"], re.IGNORECASE), rule) for rule in script.get("rules", [])]
+        self._call_ids = itertools.count()
+
+    @classmethod
+    def from_file(cls, path: str) -> "ScriptedResponder":
+        with open(path, "r") as f:
+            return cls(json.load(f))
+
+    @staticmethod
+    def _fill(template: Any, values: Dict[str, str]) -> Any:
+        if isinstance(template, str):
+            return template.format_map(values)
+        if isinstance(template, dict):
+            return {key: ScriptedResponder._fill(value, values) for key, value in template.items()}
+        return template
+
+    def __call__(self, messages: List[BaseMessage]) -> AIMessage:
+        last_human = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=None)
+        message = user_text(messages[last_human]) if last_human is not None else ""
+        results = [m for m in messages[last_human or 0:] if isinstance(m, ToolMessage)]
+        values = {"message": message, "tool_result": str(results[-1].content)[:500] if results else ""}
+
+        for pattern, rule in self.rules:
+            match = pattern.search(message)
+            if match:
+                values.update({k: (v or "").strip() for k, v in match.groupdict().items()})
+                if not results and rule.get("tool_calls"):
+                    return AIMessage(content="", tool_calls=[
+                        {"name": call["name"], "args": self._fill(call.get("args", {}), values),
+                         "id": f"call_{next(self._call_ids):08d}", "type": "tool_call"}
+                        for call in rule["tool_calls"]
+                    ])
+                return AIMessage(content=self._fill(rule.get("reply", self.reply), values))
+        return AIMessage(content=self._fill(self.reply, values))
+
+
+class FakeChatModel(BaseChatModel):
+    """Stand-in chat model that answers after a fixed delay without calling Databricks.
+
+    Used to exercise the agent stack (graph, tools, AgentManager) offline.
+    A `responder` callable can be supplied to script replies, including tool calls.
+    When streamed, `latency` is the time to first token and `token_delay` the
+    gap between the following word-sized tokens (or set `tokens_per_second`).
+    Replies carry usage metadata estimated from the text, so token counters move.
+    """
+
+    latency: float = 0.5
+    token_delay: float = 0.0
+    tokens_per_second: Optional[float] = None
+    reply: str = "This is a stubbed response from the fake chat model."
+    responder: Optional[Callable[[List[BaseMessage]], AIMessage]] = None
+    calls: int = 0
+
+    @classmethod
+    def from_env(cls) -> "FakeChatModel":
+        """Configure from FAKE_CHAT_MODEL_LATENCY, FAKE_CHAT_MODEL_TOKENS_PER_SECOND and FAKE_CHAT_MODEL_SCRIPT."""
+        script = os.getenv("FAKE_CHAT_MODEL_SCRIPT")
+        tokens_per_second = os.getenv("FAKE_CHAT_MODEL_TOKENS_PER_SECOND")
+        return cls(
+            latency=float(os.getenv("FAKE_CHAT_MODEL_LATENCY", "0.5")),
+            tokens_per_second=float(tokens_per_second) if tokens_per_second else None,
+            responder=ScriptedResponder.from_file(script) if script else None,
+        )
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def _token_gap(self) -> float:
+        return 1 / self.tokens_per_second if self.tokens_per_second else self.token_delay
+
+    def bind_tools(self, tools: List[Any], **kwargs: Any) -> "FakeChatModel":
+        """Tools are ignored, replies come from `reply` or `responder`."""
+        return self
+
+    def _next_message(self, messages: List[BaseMessage]) -> AIMessage:
+        self.calls += 1
+        message = self.responder(messages) if self.responder else AIMessage(content=self.reply)
+        if message.usage_metadata is None:
+            # Roughly four characters per token
+            input_tokens = sum(len(str(m.content)) for m in messages) // 4
+            output_tokens = len(re.findall(r"\S+", str(message.content))) + 20 * len(message.tool_calls)
+            message.usage_metadata = {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                                      "total_tokens": input_tokens + output_tokens}
+        return message
+
+    @staticmethod
+    def _split(message: AIMessage) -> List[AIMessageChunk]:
+        """Break a reply into word-sized chunks; tool calls go out in a single chunk.
+
+        The usage metadata rides on the last chunk, as with streaming endpoints.
+        """
+        if message.tool_calls:
+            return [AIMessageChunk(
+                content=message.content,
+                tool_call_chunks=[
+                    {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+                    for i, call in enumerate(message.tool_calls)
+                ],
+                usage_metadata=message.usage_metadata,
+            )]
+        chunks = [AIMessageChunk(content=word) for word in re.findall(r"\S+\s*", message.content)] or [AIMessageChunk(content="")]
+        chunks[-1].usage_metadata = message.usage_metadata
+        return chunks
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._next_message(messages))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._next_message(messages))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for i, chunk in enumerate(self._split(self._next_message(messages))):
+            if i:
+                time.sleep(self._token_gap())
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager:
+                run_manager.on_llm_new_token(generation.text, chunk=generation)
+            yield generation
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for i, chunk in enumerate(self._split(self._next_message(messages))):
+            if i:
+                await asyncio.sleep(self._token_gap())
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager:
+                await run_manager.on_llm_new_token(generation.text, chunk=generation)
+            yield generation
@@ -0,0 +1,159 @@
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, RemoveMessage, SystemMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+
+from idle_cache import user_cache
+from tracing import tracer
+
+SUMMARY_MESSAGE_ID = "conversation-summary"
+SUMMARY_HEADER = "Summary of the earlier conversation (the pregnancy plan holds the user's recorded details):\n"
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a pregnant user and their pregnancy support assistant.
+Update the existing summary with the new messages. Keep what matters for future turns: the user's questions, concerns, decisions and anything the assistant promised to follow up on.
+Facts already recorded in the user's pregnancy plan (due date, providers, appointments, checklist items) are stored there and do not need repeating.
+Reply with the updated summary only."""
+
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    """Rough token count (about 4 characters per token) of message content and tool call arguments."""
+    chars = 0
+    for message in messages:
+        content = message.content
+        chars += len(content) if isinstance(content, str) else len(json.dumps(content))
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            chars += len(json.dumps(tool_call["args"]))
+    return chars // 4
+
+
+class HistoryManager:
+    """Keeps the messages sent to the model within a per-request token budget.
+
+    Runs as the react agent's pre_model_hook before every model call:
+    - tool results and tool call arguments from earlier turns are replaced by
+      short placeholders in what the model sees (the plan is re-read on demand,
+      so an old read_plan/write_plan payload is never needed again)
+    - once the conversation exceeds `max_tokens`, older turns are folded into a
+      rolling summary and removed from the checkpointed state
+    """
+
+    def __init__(
+        self,
+        summary_model: Optional[BaseChatModel] = None,
+        max_tokens: Optional[int] = None,
+        keep_recent_tokens: Optional[int] = None,
+        max_tool_payload_chars: int = 200,
+    ):
+        self.summary_model = summary_model
+        self.max_tokens = max_tokens or int(os.getenv("HISTORY_TOKEN_BUDGET", "8000"))
+        self.keep_recent_tokens = keep_recent_tokens or self.max_tokens // 2
+        self.max_tool_payload_chars = max_tool_payload_chars
+        self._turn_metrics = user_cache()  # username -> metrics of the current turn, recently active users only
+
+    def start_turn(self, username: str) -> None:
+        """Reset the per-turn metrics for a user."""
+        self._turn_metrics.set(username, {"model_calls": 0, "tokens_before": 0, "tokens_after": 0, "compactions": 0})
+
+    def turn_metrics(self, username: str) -> Dict[str, int]:
+        """Tokens in state vs. tokens sent to the model, summed over the model calls of the last turn."""
+        return dict(self._turn_metrics.get(username, {}))
+
+    async def apre_model_hook(self, state: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+        with tracer.span("history.build") as span:
+            update = await self._build(state, config)
+            span.set(messages=len(update["llm_input_messages"]), compacted="messages" in update)
+            return update
+
+    async def _build(self, state: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+        messages: List[BaseMessage] = list(state["messages"])
+        tokens_before = estimate_tokens(messages)
+        update: Dict[str, Any] = {}
+
+        if tokens_before > self.max_tokens:
+            compacted = await self._compact(messages)
+            if compacted is not messages:
+                messages = compacted
+                update["messages"] = [RemoveMessage(id=REMOVE_ALL_MESSAGES), *compacted]
+                self._record(config, "compactions", 1)
+
+        llm_input = self._strip_stale_tool_payloads(messages)
+        update["llm_input_messages"] = llm_input
+
+        self._record(config, "model_calls", 1)
+        self._record(config, "tokens_before", tokens_before)
+        self._record(config, "tokens_after", estimate_tokens(llm_input))
+        return update
+
+    def _record(self, config: RunnableConfig, key: str, value: int) -> None:
+        username = (config or {}).get("configurable", {}).get("username")
+        metrics = self._turn_metrics.get(username)
+        if metrics is not None:
+            metrics[key] += value
+
+    def _strip_stale_tool_payloads(self, messages: List[BaseMessage], keep_from: Optional[int] = None) -> List[BaseMessage]:
+        """Shorten tool results and tool call arguments before `keep_from` (default: the latest user message)."""
+        if keep_from is None:
+            keep_from = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=0)
+        stripped = []
+        for i, message in enumerate(messages):
+            if i < keep_from and isinstance(message, ToolMessage) and len(str(message.content)) > self.max_tool_payload_chars:
+                message = message.model_copy(update={"content": f"[{message.name} result from an earlier turn omitted]"})
+            elif i < keep_from and isinstance(message, AIMessage) and message.tool_calls:
+                message = message.model_copy(update={"tool_calls": [
+                    {**call, "args": {k: self._shorten(v) for k, v in call["args"].items()}}
+                    for call in message.tool_calls
+                ]})
+            stripped.append(message)
+        return stripped
+
+    def _shorten(self, value: Any) -> Any:
+        if isinstance(value, str) and len(value) > self.max_tool_payload_chars:
+            return value[:self.max_tool_payload_chars] + " [...]"
+        return value
+
+    async def _compact(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        """Fold everything before the recent turns into the rolling summary.
+
+        Returns `messages` itself when there is nothing older to fold in.
+        """
+        original = messages
+        summary = ""
+        if messages and isinstance(messages[0], SystemMessage) and messages[0].id == SUMMARY_MESSAGE_ID:
+            summary = messages[0].content[len(SUMMARY_HEADER):]
+            messages = messages[1:]
+
+        # Walk back over whole turns (each starts at a user message) so tool calls stay paired with their results
+        split = len(messages)
+        recent_tokens = 0
+        for i in range(len(messages) - 1, -1, -1):
+            recent_tokens += estimate_tokens([messages[i]])
+            if isinstance(messages[i], HumanMessage):
+                if recent_tokens > self.keep_recent_tokens and split < len(messages):
+                    break
+                split = i
+        older, recent = messages[:split], messages[split:]
+        if not older:
+            # Only the current turn is left (already after the summary); keep the summary in state
+            return original
+
+        summary = await self._summarize(summary, older)
+        summary_message = SystemMessage(content=SUMMARY_HEADER + summary, id=SUMMARY_MESSAGE_ID)
+        return [summary_message, *recent]
+
+    async def _summarize(self, summary: str, messages: List[BaseMessage]) -> str:
+        if self.summary_model is None:
+            # No model to summarize with, older turns are simply dropped
+            return summary
+        transcript = "\n".join(
+            f"{m.type}: {m.content}" for m in self._strip_stale_tool_payloads(messages, keep_from=len(messages))
+            if m.content
+        )
+        response = await self.summary_model.ainvoke([
+            SystemMessage(content=SUMMARY_PROMPT),
+            HumanMessage(content=f"Existing summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"),
+        ])
+        return response.content if isinstance(response.content, str) else str(response.content)
@@ -0,0 +1,91 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Hashable, List, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+# Per-user state kept in memory: at most this many users, dropped after this long without use
+MAX_RESIDENT_USERS = int(os.getenv("MAX_RESIDENT_USERS", "10000"))
+USER_IDLE_SECONDS = float(os.getenv("USER_IDLE_SECONDS", "1800"))
+
+
+class IdleCache(Generic[V]):
+    """Thread-safe mapping that forgets entries unused for `idle_seconds` or beyond `max_entries` (LRU).
+
+    Eviction happens on writes, oldest first, and by calling evict_idle().
+    `on_evict(key, value)` is called for every evicted entry, outside the lock,
+    e.g. to write it to slower storage; entries removed with pop() are not passed to it.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, idle_seconds: Optional[float] = None,
+                 on_evict: Optional[Callable[[Hashable, V], None]] = None):
+        self.max_entries = max_entries
+        self.idle_seconds = idle_seconds
+        self.on_evict = on_evict
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, Tuple[V, float]]" = OrderedDict()  # least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            self._entries[key] = (entry[0], time.monotonic())
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: Hashable, value: V) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            evicted = self._take_evictable()
+        self._evicted(evicted)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def evict_idle(self) -> int:
+        """Evict everything idle for longer than `idle_seconds`; returns how many entries went."""
+        with self._lock:
+            evicted = self._take_evictable()
+        self._evicted(evicted)
+        return len(evicted)
+
+    def items(self) -> List[Tuple[Hashable, V]]:
+        with self._lock:
+            return [(key, entry[0]) for key, entry in self._entries.items()]
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _take_evictable(self) -> List[Tuple[Hashable, V]]:
+        evicted = []
+        cutoff = time.monotonic() - self.idle_seconds if self.idle_seconds is not None else None
+        while self._entries:
+            key, (value, touched) = next(iter(self._entries.items()))
+            over_capacity = self.max_entries is not None and len(self._entries) > self.max_entries
+            if not over_capacity and (cutoff is None or touched > cutoff):
+                break
+            del self._entries[key]
+            evicted.append((key, value))
+        self.evictions += len(evicted)
+        return evicted
+
+    def _evicted(self, evicted: List[Tuple[Hashable, V]]) -> None:
+        if self.on_evict:
+            for key, value in evicted:
+                self.on_evict(key, value)
+
+
+def user_cache(**kwargs: Any) -> IdleCache:
+    """An IdleCache for per-user state, bounded by MAX_RESIDENT_USERS and USER_IDLE_SECONDS."""
+    return IdleCache(MAX_RESIDENT_USERS, USER_IDLE_SECONDS, **kwargs)
@@ -1,13 +1,25 @@
-from fastapi import FastAPI, WebSocket, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from typing import Optional, List
 import json
 import argparse
 import asyncio
+import os
+from contextlib import aclosing, asynccontextmanager
 from agent_manager import AgentManager
+from provider_cache import get_provider_cache
+from plan_service import get_plan_service
+from tracing import tracer
 
-app = FastAPI(title="BabyGPT API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # The checkpointer's connection thread would otherwise keep the worker from exiting
+    await agent_manager.aclose()
+
+app = FastAPI(title="BabyGPT API", lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -30,7 +42,7 @@ class ChatMessage(BaseModel):
 
 class PregnancyPlan(BaseModel):
     content: str
-    last_updated: str
+    last_updated: Optional[str] = None  # set by the server, ignored on updates
 
 @app.post("/users")
 async def create_user(user: User):
@@ -44,28 +56,84 @@ async def create_user(user: User):
         "initial_response": "".join(response_chunks)
     }
 
+# Frames buffered per chat socket before a slow client holds up its turns
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))
+
+async def _send_frames(websocket: WebSocket, outbox: asyncio.Queue):
+    while True:
+        frame = await outbox.get()
+        await websocket.send_text(json.dumps(frame))
+
+async def _stream_turn_to(outbox: asyncio.Queue, username: str, message: str):
+    # Frames: token deltas, tool_start/tool_end events, then done (or error)
+    with tracer.span("ws.turn", username=username) as span:
+        async with aclosing(agent_manager.stream_turn(username, message)) as frames:
+            async for frame in frames:
+                if "first_frame_ms" not in span.attributes:
+                    span.set(first_frame_ms=round(span.elapsed() * 1000, 1))
+                await outbox.put(frame)
+
 @app.websocket("/ws/chat")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
+    # Turns run as tasks so the socket keeps being read and a disconnect is noticed
+    # mid-turn; it cancels the turns, and with them the model and tool calls
+    outbox = asyncio.Queue(WS_SEND_QUEUE_SIZE)
+    sender = asyncio.create_task(_send_frames(websocket, outbox))
+    turns = set()
     try:
         while True:
             data = await websocket.receive_text()
-            message_data = json.loads(data)
-            username = message_data.get("username")
-            message = message_data.get("message")
+            with tracer.span("ws.receive", bytes=len(data)):
+                message_data = json.loads(data)
+                username = message_data.get("username")
+                message = message_data.get("message")
             
             if not username or not message:
-                await websocket.send_text(json.dumps({
-                    "error": "Missing username or message"
-                }))
+                await outbox.put({
+                    "type": "error",
+                    "content": "Missing username or message"
+                })
                 continue
 
-            async for chunk in agent_manager.process_message(username, message):
-                await websocket.send_text(json.dumps({
-                    "chunk": chunk
-                }))
+            turn = asyncio.create_task(_stream_turn_to(outbox, username, message))
+            turns.add(turn)
+            turn.add_done_callback(turns.discard)
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
         await websocket.close()
+    finally:
+        for task in list(turns) + [sender]:
+            task.cancel()
+
+@app.websocket("/ws/plan/{username}")
+async def plan_updates(websocket: WebSocket, username: str):
+    """Push plan changes: the current plan on connect, then version + diff per change."""
+    await websocket.accept()
+    plan_service = get_plan_service()
+    subscription = plan_service.events.subscribe(username, asyncio.get_running_loop())
+    # Watch for the client going away while we're waiting for the next change
+    receive = asyncio.create_task(websocket.receive())
+    change = asyncio.create_task(subscription.get())
+    try:
+        plan = await plan_service.aget_plan(username)
+        await websocket.send_text(json.dumps({"type": "plan", **plan}))
+        while True:
+            done, _ = await asyncio.wait({receive, change}, return_when=asyncio.FIRST_COMPLETED)
+            if receive in done:
+                if receive.result()["type"] == "websocket.disconnect":
+                    break
+                receive = asyncio.create_task(websocket.receive())  # client messages are ignored
+            if change in done:
+                await websocket.send_text(json.dumps(change.result().to_frame()))
+                change = asyncio.create_task(subscription.get())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receive.cancel()
+        change.cancel()
+        plan_service.events.unsubscribe(subscription)
 
 @app.get("/plan/{username}")
 async def get_pregnancy_plan(username: str):
@@ -77,37 +145,85 @@ async def update_pregnancy_plan(username: str, plan: PregnancyPlan):
     updated_plan = await agent_manager.update_pregnancy_plan(username, plan.content)
     return updated_plan
 
+@app.get("/stats/provider-cache")
+async def provider_cache_stats():
+    """Hit/miss counters of the shared provider search cache."""
+    return get_provider_cache().stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-stage latency histograms and p50/p95/p99, model token counts."""
+    return PlainTextResponse(tracer.metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats/latency")
+async def latency_stats():
+    """p50/p95/p99 in seconds per stage (websocket, turn, history, model, tool, plan I/O)."""
+    return tracer.metrics.quantiles()
+
+@app.get("/stats/answer-cache")
+async def answer_cache_stats():
+    """Hit rate and size of the semantic answer cache (empty when ANSWER_CACHE is off)."""
+    return agent_manager.get_answer_cache_stats()
+
+@app.delete("/answer-cache")
+async def invalidate_answer_cache(question: Optional[str] = None):
+    """Drop cached answers matching `question`, or all of them."""
+    if agent_manager.answer_cache is None:
+        raise HTTPException(status_code=404, detail="The answer cache is off")
+    return {"removed": agent_manager.answer_cache.invalidate(question)}
+
+@app.get("/stats/turn-queue")
+async def turn_queue_stats():
+    """Per-user turn queue depth and how many messages were coalesced."""
+    return agent_manager.get_turn_queue_stats()
+
 async def cli_chat():
     """Command line interface for testing the chat functionality."""
     print("Welcome to BabyGPT CLI mode!")
     username = input("Please enter your username: ")
     
-    print("\nInitializing conversation...")
-    async for chunk in agent_manager.start_conversation(username):
-        print(chunk, end="", flush=True)
-    print("\n")
-    
-    print("\nType 'exit' to quit")
-    while True:
-        user_input = input("\nYou: ")
-        if user_input.lower() == 'exit':
-            break
-            
-        print("\nAssistant: ", end="", flush=True)
-        async for chunk in agent_manager.process_message(username, user_input):
+    try:
+        print("\nInitializing conversation...")
+        async for chunk in agent_manager.start_conversation(username):
             print(chunk, end="", flush=True)
-        print()  # New line after response
+        print("\n")
+
+        print("\nType 'exit' to quit")
+        while True:
+            user_input = input("\nYou: ")
+            if user_input.lower() == 'exit':
+                break
+
+            print("\nAssistant: ", end="", flush=True)
+            async for chunk in agent_manager.process_message(username, user_input):
+                print(chunk, end="", flush=True)
+            print()  # New line after response
+    finally:
+        await agent_manager.aclose()
 
 def main():
     parser = argparse.ArgumentParser(description='BabyGPT Backend')
     parser.add_argument('--cli', action='store_true', help='Run in CLI mode')
+    parser.add_argument('--host', default="0.0.0.0")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=1, help='Number of uvicorn worker processes')
     args = parser.parse_args()
 
     if args.cli:
         asyncio.run(cli_chat())
+    elif args.workers > 1:
+        import uvicorn
+        # Workers share state through the session store, the plan database and the
+        # checkpoint file; an in-memory store would give each worker its own sessions
+        if os.getenv("SESSION_STORE", "memory") == "memory":
+            os.environ["SESSION_STORE"] = "sqlite:///" + os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "sessions.sqlite")
+        # Plan changes made by one worker are pushed to /ws/plan clients of the others
+        os.environ.setdefault("PLAN_WATCH", "1")
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers,
+                    app_dir=os.path.dirname(os.path.abspath(__file__)))
     else:
         import uvicorn
-        uvicorn.run(app, host="0.0.0.0", port=8000)
+        uvicorn.run(app, host=args.host, port=args.port)
 
 if __name__ == "__main__":
     main()
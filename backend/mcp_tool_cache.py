@@ -0,0 +1,109 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.tools import BaseTool
+from langchain_mcp_adapters.sessions import create_session
+from langchain_mcp_adapters.tools import convert_mcp_tool_to_langchain_tool
+from mcp.types import Tool as MCPTool
+
+
+class MCPToolCache:
+    """Discovers tools from MCP servers on first use and caches them.
+
+    The tool schemas are snapshotted to disk, so a warm start rebuilds the tools
+    without an MCP handshake. Once the TTL has passed, the cached tools keep being
+    served while a background task fetches fresh schemas. Each tool call still
+    opens its own session with the server.
+    """
+
+    def __init__(self, connections: Dict[str, Dict[str, Any]], snapshot_path: str, ttl_seconds: float = 3600):
+        self.connections = connections
+        self.snapshot_path = snapshot_path
+        self.ttl_seconds = ttl_seconds
+        self._tools: Optional[List[BaseTool]] = None
+        self._fetched_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def tools(self) -> Optional[List[BaseTool]]:
+        """Currently cached tools, or None if nothing has been discovered yet."""
+        return self._tools
+
+    async def aget_tools(self) -> List[BaseTool]:
+        """Return the cached tools, discovering them if this is the first call."""
+        if self._tools is None:
+            self._load_snapshot()
+        if self._tools is None:
+            await self._refresh_in_flight()
+        elif time.time() - self._fetched_at > self.ttl_seconds:
+            self._schedule_refresh()
+        return self._tools
+
+    async def refresh(self) -> List[BaseTool]:
+        """Fetch the tool schemas from every server and update the cache and snapshot."""
+        schemas: Dict[str, List[Dict]] = {}
+        for server_name, connection in self.connections.items():
+            async with create_session(connection) as session:
+                await session.initialize()
+                result = await session.list_tools()
+            schemas[server_name] = [tool.model_dump(mode="json") for tool in result.tools]
+
+        fetched_at = time.time()
+        self._set_tools(schemas, fetched_at)
+        self._save_snapshot(schemas, fetched_at)
+        return self._tools
+
+    def _set_tools(self, schemas: Dict[str, List[Dict]], fetched_at: float) -> None:
+        tools = []
+        for server_name, tool_schemas in schemas.items():
+            connection = self.connections.get(server_name)
+            if connection is None:
+                continue
+            for schema in tool_schemas:
+                tools.append(convert_mcp_tool_to_langchain_tool(None, MCPTool.model_validate(schema), connection=connection))
+        self._tools = tools
+        self._fetched_at = fetched_at
+
+    def _load_snapshot(self) -> None:
+        if not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, 'r') as f:
+                snapshot = json.load(f)
+            self._set_tools(snapshot["servers"], snapshot["fetched_at"])
+        except Exception as e:
+            print(f"Ignoring unreadable MCP tool snapshot {self.snapshot_path}: {str(e)}\n")
+
+    def _save_snapshot(self, schemas: Dict[str, List[Dict]], fetched_at: float) -> None:
+        # Only the schemas are stored; connection headers (tokens) stay in memory
+        os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"fetched_at": fetched_at, "servers": schemas}, f)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def _in_flight(self) -> Optional[asyncio.Task]:
+        # A task from another event loop (e.g. a finished asyncio.run) can't be awaited here
+        task = self._refresh_task
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            return None
+        return task
+
+    async def _refresh_in_flight(self) -> None:
+        task = self._in_flight()
+        if task is None:
+            task = self._refresh_task = asyncio.ensure_future(self.refresh())
+        await task
+
+    def _schedule_refresh(self) -> None:
+        if self._in_flight() is None:
+            self._refresh_task = asyncio.ensure_future(self._background_refresh())
+
+    async def _background_refresh(self) -> None:
+        try:
+            await self.refresh()
+        except Exception as e:
+            print(f"MCP tool refresh failed, keeping cached tools: {str(e)}\n")
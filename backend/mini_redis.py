@@ -0,0 +1,130 @@
+"""Local stand-in for a Redis server, speaking just enough RESP for RedisSessionStore.
+
+Supports PING, SELECT, GET, SET, DEL, RPUSH, LRANGE, LTRIM and FLUSHALL on
+in-memory data. Meant for development and benchmarks, not production.
+
+    uv run python mini_redis.py --port 6379
+"""
+import argparse
+import asyncio
+from typing import Dict, List, Optional, Union
+
+Value = Union[bytes, List[bytes]]
+
+
+class MiniRedis:
+    def __init__(self):
+        self.data: Dict[int, Dict[bytes, Value]] = {}
+
+    def handle(self, db: int, command: List[bytes]) -> bytes:
+        name = command[0].upper().decode()
+        args = command[1:]
+        data = self.data.setdefault(db, {})
+        handler = getattr(self, f"_cmd_{name.lower()}", None)
+        if handler is None:
+            return b"-ERR unknown command '%s'\r\n" % name.encode()
+        try:
+            return handler(data, *args)
+        except (TypeError, ValueError) as e:
+            return b"-ERR %s\r\n" % str(e).encode()
+
+    def _cmd_ping(self, data, *args) -> bytes:
+        return b"+PONG\r\n"
+
+    def _cmd_flushall(self, data) -> bytes:
+        self.data.clear()
+        return b"+OK\r\n"
+
+    def _cmd_get(self, data, key) -> bytes:
+        value = data.get(key)
+        if isinstance(value, list):
+            return b"-WRONGTYPE Operation against a key holding the wrong kind of value\r\n"
+        return _bulk(value)
+
+    def _cmd_set(self, data, key, value) -> bytes:
+        data[key] = value
+        return b"+OK\r\n"
+
+    def _cmd_del(self, data, *keys) -> bytes:
+        return b":%d\r\n" % sum(data.pop(key, None) is not None for key in keys)
+
+    def _cmd_rpush(self, data, key, *values) -> bytes:
+        items = data.setdefault(key, [])
+        items.extend(values)
+        return b":%d\r\n" % len(items)
+
+    def _cmd_lrange(self, data, key, start, stop) -> bytes:
+        items = data.get(key, [])
+        selected = items[_index(start, len(items)):_index(stop, len(items)) + 1]
+        return b"*%d\r\n" % len(selected) + b"".join(_bulk(item) for item in selected)
+
+    def _cmd_ltrim(self, data, key, start, stop) -> bytes:
+        items = data.get(key, [])
+        data[key] = items[_index(start, len(items)):_index(stop, len(items)) + 1]
+        return b"+OK\r\n"
+
+
+def _bulk(value: Optional[bytes]) -> bytes:
+    return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _index(raw: bytes, length: int) -> int:
+    index = int(raw)
+    return max(length + index, 0) if index < 0 else index
+
+
+async def _read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        return line.split()  # inline command, e.g. from telnet
+    command = []
+    for _ in range(int(line[1:])):
+        length = int((await reader.readline())[1:])
+        command.append((await reader.readexactly(length + 2))[:-2])
+    return command
+
+
+async def serve(host: str = "127.0.0.1", port: int = 6379, server: Optional[MiniRedis] = None) -> asyncio.AbstractServer:
+    """Start serving on the running loop; returns the asyncio server."""
+    server = server or MiniRedis()
+
+    async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        db = 0
+        try:
+            while True:
+                command = await _read_command(reader)
+                if not command:
+                    break
+                if command[0].upper() == b"SELECT":
+                    db = int(command[1])
+                    writer.write(b"+OK\r\n")
+                else:
+                    writer.write(server.handle(db, command))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle_client, host, port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Redis-protocol stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+
+    async def run():
+        server = await serve(args.host, args.port)
+        print(f"mini_redis listening on {args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
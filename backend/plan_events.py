@@ -0,0 +1,195 @@
+import asyncio
+import difflib
+import logging
+import os
+import queue
+import threading
+import weakref
+from typing import Dict, List, Optional
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:  # optional; the watcher falls back to polling file stats
+    INotify = None
+
+logger = logging.getLogger(__name__)
+
+
+def plan_diff(old: str, new: str, old_version: int, new_version: int) -> str:
+    """Unified diff between two plan revisions."""
+    return "\n".join(difflib.unified_diff(
+        old.splitlines(), new.splitlines(),
+        fromfile=f"v{old_version}", tofile=f"v{new_version}", lineterm="", n=1,
+    ))
+
+
+class PlanChange:
+    """A new plan version, as published to subscribers."""
+
+    def __init__(self, username: str, version: int, last_updated: str, content: str, diff: str):
+        self.username = username
+        self.version = version
+        self.last_updated = last_updated
+        self.content = content
+        self.diff = diff
+
+    def to_frame(self) -> Dict:
+        """The websocket payload: the new version and the diff that produced it."""
+        return {
+            "type": "plan_update",
+            "version": self.version,
+            "last_updated": self.last_updated,
+            "diff": self.diff,
+        }
+
+
+class PlanSubscription:
+    """Receives a user's plan changes.
+
+    Created with a loop, changes are awaited with get(); without one they are
+    collected with poll(), which never blocks (the Streamlit case).
+    """
+
+    def __init__(self, username: str, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.username = username
+        self._loop = loop
+        self._queue = asyncio.Queue() if loop else queue.SimpleQueue()
+
+    def deliver(self, change: PlanChange) -> None:
+        if self._loop is None:
+            self._queue.put(change)
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, change)
+        except RuntimeError:
+            pass  # loop already closed; the subscriber is gone
+
+    def poll(self) -> List[PlanChange]:
+        """Changes received since the last poll, oldest first."""
+        changes = []
+        while not self._queue.empty():
+            changes.append(self._queue.get_nowait())
+        return changes
+
+    def pending(self) -> bool:
+        return not self._queue.empty()
+
+    async def get(self) -> PlanChange:
+        return await self._queue.get()
+
+
+class PlanEventBus:
+    """In-process pub/sub of plan changes, keyed by username.
+
+    Subscriptions are held weakly, so a Streamlit session that goes away
+    without unsubscribing doesn't leak. Each version is published at most once,
+    whether it came from a local write or the file watcher. Only users with
+    subscribers are tracked: a user's entries are dropped with their last
+    subscription.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, weakref.WeakSet] = {}
+        self._published: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, username: str, loop: Optional[asyncio.AbstractEventLoop] = None) -> PlanSubscription:
+        subscription = PlanSubscription(username, loop)
+        with self._lock:
+            self._subscribers.setdefault(username, weakref.WeakSet()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: PlanSubscription) -> None:
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.username)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    self._forget(subscription.username)
+
+    def _forget(self, username: str) -> None:
+        self._subscribers.pop(username, None)
+        self._published.pop(username, None)
+
+    def usernames(self) -> List[str]:
+        """Users that currently have at least one subscriber."""
+        with self._lock:
+            # Sessions that went away without unsubscribing leave empty sets behind
+            for username in [username for username, subs in self._subscribers.items() if not subs]:
+                self._forget(username)
+            return list(self._subscribers)
+
+    def publish(self, change: PlanChange) -> bool:
+        """Deliver a change to the user's subscribers; False if nobody is subscribed or that version was already published."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(change.username, ()))
+            if not subscribers:
+                self._forget(change.username)
+                return False
+            if change.version <= self._published.get(change.username, 0):
+                return False
+            self._published[change.username] = change.version
+        for subscription in subscribers:
+            subscription.deliver(change)
+        return True
+
+
+class PlanFileWatcher(threading.Thread):
+    """Publishes plan changes written by other processes (e.g. other API workers).
+
+    Watches the plan database and its WAL with inotify when inotify_simple is
+    installed, otherwise polls their stats every `interval` seconds. On a
+    change it asks the plan service to re-check users that have subscribers.
+    """
+
+    def __init__(self, plan_service, db_path: str, interval: float = 1.0):
+        super().__init__(name="plan-file-watcher", daemon=True)
+        self.plan_service = plan_service
+        self.db_path = os.path.abspath(db_path)
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def run(self) -> None:
+        if INotify is not None:
+            self._watch_inotify()
+        else:
+            self._watch_stats()
+
+    def _watch_inotify(self) -> None:
+        inotify = INotify()
+        inotify.add_watch(os.path.dirname(self.db_path),
+                          inotify_flags.MODIFY | inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO)
+        prefix = os.path.basename(self.db_path)
+        while not self._stop_event.is_set():
+            events = inotify.read(timeout=int(self.interval * 1000), read_delay=50)
+            if any(event.name.startswith(prefix) for event in events):
+                self._changed()
+        inotify.close()
+
+    def _watch_stats(self) -> None:
+        last = self._stats()
+        while not self._stop_event.wait(self.interval):
+            current = self._stats()
+            if current != last:
+                last = current
+                self._changed()
+
+    def _stats(self):
+        stats = []
+        for path in (self.db_path, self.db_path + "-wal"):
+            try:
+                st = os.stat(path)
+                stats.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stats.append(None)
+        return stats
+
+    def _changed(self) -> None:
+        for username in self.plan_service.events.usernames():
+            try:
+                self.plan_service.refresh(username)
+            except Exception as e:
+                logger.warning("Plan watcher failed to refresh %s: %s", username, e)
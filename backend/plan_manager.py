@@ -1,51 +1,146 @@
 import os
+import threading
 from datetime import datetime
-from typing import Optional
+from typing import Callable, Dict, List, Optional, Tuple
+
+from plan_store import CHECKLIST_RE, FIELD_RE, PlanStore, find_section, join_sections, split_sections
+
+USER_LOCK_STRIPES = 64
 
 class PlanManager:
-    def __init__(self, plans_dir: str = "plans"):
-        """Initialize the PlanManager with a directory for storing plans."""
+    def __init__(self, plans_dir: str = "plans", db_path: Optional[str] = None):
+        """Initialize the PlanManager with a directory for storing plans.
+
+        Plans live in a SQLite store (plans.sqlite in the plans directory by
+        default). Markdown files from before the store are imported the first
+        time a user's plan is read.
+        """
         self.plans_dir = plans_dir
         self._ensure_base_directory()
+        self.store = PlanStore(db_path or os.path.join(plans_dir, "plans.sqlite"))
+        # Striped rather than one lock per user, so memory doesn't grow with the number of users
+        self._user_locks = [threading.RLock() for _ in range(USER_LOCK_STRIPES)]
 
     def _ensure_base_directory(self):
         """Ensure the base plans directory exists."""
         os.makedirs(self.plans_dir, exist_ok=True)
 
-    def _ensure_user_directory(self, username: str):
-        """Ensure the user-specific directory exists."""
-        user_dir = os.path.join(self.plans_dir, username)
-        os.makedirs(user_dir, exist_ok=True)
-        return user_dir
+    def _user_lock(self, username: str) -> threading.RLock:
+        """Lock serializing the legacy import of one user's plan (shared with other users on its stripe)."""
+        return self._user_locks[hash(username) % len(self._user_locks)]
+
+    def _legacy_plan_path(self, username: str) -> str:
+        """Where plans were kept as Markdown files before the SQLite store."""
+        return os.path.join(self.plans_dir, username, "pregnancy_plan.md")
 
-    def get_plan_path(self, username: str) -> str:
-        """Get the path to a user's plan file."""
-        user_dir = self._ensure_user_directory(username)
-        return os.path.join(user_dir, "pregnancy_plan.md")
+    def _import_legacy_plan(self, username: str) -> None:
+        if self.store.version(username) is not None:
+            return
+        try:
+            with open(self._legacy_plan_path(username), 'r') as f:
+                content = f.read()
+        except FileNotFoundError:
+            return
+        with self._user_lock(username):
+            if self.store.version(username) is None:
+                self.store.save(username, content)
+
+    def get_plan_version(self, username: str) -> Optional[Tuple[int, float]]:
+        """(version, updated_at timestamp) of a user's plan, or None if no plan exists."""
+        self._import_legacy_plan(username)
+        return self.store.version(username)
     
     def read_plan(self, username: str) -> Optional[str]:
         """Read a user's pregnancy plan. Returns None if no plan exists."""
-        plan_path = self.get_plan_path(username)
-        if os.path.exists(plan_path):
-            with open(plan_path, 'r') as f:
-                x = f.read()
-                print(f"Plan for {username}: {x}\n")
-                return x
-        return None
+        self._import_legacy_plan(username)
+        return self.store.render(username)
 
     def write_plan(self, username: str, content: str) -> None:
-        """Write or completely replace a user's pregnancy plan."""
-        plan_path = self.get_plan_path(username)
-        print(f"Writing plan for {username}\n")
-        
-        # If no plan exists, create one with basic structure
-        if not os.path.exists(plan_path):
-            header = f"""# Pregnancy Plan for {username}
+        """Write or completely replace a user's pregnancy plan.
+
+        The plan is saved in one transaction, so concurrent readers see either
+        the previous or the new plan in full.
+        """
+        self._import_legacy_plan(username)
+        header = f"""# Pregnancy Plan for {username}
 
 *Last updated: {datetime.now().strftime('%Y-%m-%d %H:%M')}*
 
 """
-            content = header + content
-        
-        with open(plan_path, 'w') as f:
-            f.write(content) 
\ No newline at end of file
+        # If no plan exists, create one with basic structure
+        self.store.update(username, lambda current: content if current is not None else header + content)
+
+    def update_plan(self, username: str, edit: Callable[[str], str]) -> str:
+        """Apply `edit` to the current plan (a new one if none exists) and save the result.
+
+        The read and the write happen in one store transaction, so edits from
+        other threads or worker processes in between can't be lost.
+        """
+        self._import_legacy_plan(username)
+        _, content = self.store.update(username, lambda current: edit(current or f"# Pregnancy Plan for {username}\n"))
+        return content
+
+    def find_appointments(self, start: str, end: str) -> List[Dict]:
+        """All users' appointments dated between two ISO dates (inclusive)."""
+        return self.store.appointments_between(start, end)
+
+    def upsert_section(self, username: str, heading: str, body: str) -> None:
+        """Replace the body of the section with this heading, or append the section."""
+        def edit(content: str) -> str:
+            preamble, sections = split_sections(content)
+            i = find_section(sections, heading)
+            if i is None:
+                sections.append((heading.strip().lstrip("#").strip(), body.strip("\n").splitlines()))
+            else:
+                sections[i] = (sections[i][0], body.strip("\n").splitlines())
+            return join_sections(preamble, sections)
+        self.update_plan(username, edit)
+
+    def add_checklist_item(self, username: str, section: str, item: str) -> None:
+        """Append an unchecked item to a section, creating the section if needed."""
+        def edit(content: str) -> str:
+            preamble, sections = split_sections(content)
+            i = find_section(sections, section)
+            if i is None:
+                sections.append((section.strip().lstrip("#").strip(), []))
+                i = len(sections) - 1
+            body = sections[i][1]
+            while body and not body[-1].strip():
+                body.pop()
+            body.append(f"- [ ] {item.strip()}")
+            return join_sections(preamble, sections)
+        self.update_plan(username, edit)
+
+    def complete_checklist_item(self, username: str, item: str) -> bool:
+        """Tick the first open checklist item containing `item`. Returns False if none matched."""
+        found = False
+        def edit(content: str) -> str:
+            nonlocal found
+            lines = content.splitlines()
+            for i, line in enumerate(lines):
+                match = CHECKLIST_RE.match(line)
+                if match and match.group("mark") == " " and item.strip().casefold() in match.group("text").casefold():
+                    lines[i] = f"{match.group('indent')}- [x] {match.group('text')}"
+                    found = True
+                    break
+            return "\n".join(lines) + "\n"
+        self.update_plan(username, edit)
+        return found
+
+    def set_field(self, username: str, field: str, value: str) -> None:
+        """Set a `- **Field:** value` line in the plan's top block, adding it if missing."""
+        def edit(content: str) -> str:
+            preamble, sections = split_sections(content)
+            for i, existing in enumerate(preamble):
+                match = FIELD_RE.match(existing)
+                if match and match.group("name").strip().casefold() == field.strip().casefold():
+                    preamble[i] = f"- **{match.group('name').strip()}:** {value.strip()}"
+                    break
+            else:
+                while preamble and not preamble[-1].strip():
+                    preamble.pop()
+                if not any(FIELD_RE.match(existing) for existing in preamble):
+                    preamble.append("")
+                preamble.append(f"- **{field.strip()}:** {value.strip()}")
+            return join_sections(preamble, sections)
+        self.update_plan(username, edit)
@@ -0,0 +1,132 @@
+import os
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Optional, TypeVar
+
+from idle_cache import user_cache
+from plan_events import PlanChange, PlanEventBus, PlanFileWatcher, plan_diff
+from plan_manager import PlanManager
+from tool_executor import run_blocking
+from tracing import tracer
+
+T = TypeVar("T")
+
+
+class PlanService:
+    """The one place plans are read and written, for the REST API, the agent tools and the UI.
+
+    Reads go through a cache keyed on the plan version stored alongside the
+    plan, so a write from any worker process invalidates every other worker's
+    copy on its next read. Writes through the service also drop the entry directly.
+    Only recently read plans are cached (MAX_RESIDENT_USERS, USER_IDLE_SECONDS).
+
+    Every new version is published on `events` with a diff against the previous
+    one. Changes made by other processes are picked up by the optional file
+    watcher (start_watcher).
+    """
+
+    def __init__(self, plan_manager: Optional[PlanManager] = None):
+        self.plan_manager = plan_manager or PlanManager()
+        self.events = PlanEventBus()
+        self._cache = user_cache()  # username -> plan dict of the cached version
+        self._lock = threading.Lock()
+        self._watcher: Optional[PlanFileWatcher] = None
+
+    def get_plan(self, username: str) -> Dict:
+        """The user's plan as {"content", "last_updated", "version"}; version 0 means no plan yet."""
+        with tracer.span("plan.read", username=username) as span:
+            plan = self._get_plan(username)
+            span.set(version=plan["version"])
+            return plan
+
+    def _get_plan(self, username: str) -> Dict:
+        version = self.plan_manager.get_plan_version(username)
+        if version is None:
+            return {"content": "", "last_updated": "", "version": 0}
+
+        cached = self._cache.get(username)
+        if cached and cached["version"] == version[0]:
+            return cached
+
+        plan = {
+            "content": self.plan_manager.read_plan(username) or "",
+            "last_updated": datetime.fromtimestamp(version[1]).isoformat(),
+            "version": version[0],
+        }
+        self._cache.set(username, plan)
+        return plan
+
+    def write_plan(self, username: str, content: str) -> Dict:
+        """Replace the user's plan and return the new version."""
+        previous = self.get_plan(username)
+        with tracer.span("plan.write", username=username, chars=len(content)):
+            self.plan_manager.write_plan(username, content)
+        self._invalidate(username)
+        return self._publish(username, previous)
+
+    def upsert_section(self, username: str, heading: str, body: str) -> None:
+        self._edit(username, "upsert_section", lambda: self.plan_manager.upsert_section(username, heading, body))
+
+    def add_checklist_item(self, username: str, section: str, item: str) -> None:
+        self._edit(username, "add_checklist_item", lambda: self.plan_manager.add_checklist_item(username, section, item))
+
+    def complete_checklist_item(self, username: str, item: str) -> bool:
+        """Tick the first open checklist item containing `item`. Returns False if none matched."""
+        return self._edit(username, "complete_checklist_item", lambda: self.plan_manager.complete_checklist_item(username, item))
+
+    def set_field(self, username: str, field: str, value: str) -> None:
+        self._edit(username, "set_field", lambda: self.plan_manager.set_field(username, field, value))
+
+    def _edit(self, username: str, operation: str, edit: Callable[[], T]) -> T:
+        """Run a PlanManager edit, invalidate the cache and publish the new version."""
+        previous = self.get_plan(username)
+        with tracer.span("plan.edit", username=username, operation=operation):
+            result = edit()
+        self._invalidate(username)
+        self._publish(username, previous)
+        return result
+
+    def refresh(self, username: str) -> Dict:
+        """Re-check the stored version and publish it if another process changed the plan."""
+        previous = self._cache.get(username)
+        return self._publish(username, previous or {"content": "", "version": 0})
+
+    def start_watcher(self, interval: float = 1.0) -> PlanFileWatcher:
+        """Start watching the plan database for writes from other processes (idempotent)."""
+        with self._lock:
+            if self._watcher is None:
+                self._watcher = PlanFileWatcher(self, self.plan_manager.store.db_path, interval)
+                self._watcher.start()
+            return self._watcher
+
+    def _publish(self, username: str, previous: Dict) -> Dict:
+        plan = self.get_plan(username)
+        if plan["version"] != previous["version"]:
+            self.events.publish(PlanChange(
+                username, plan["version"], plan["last_updated"], plan["content"],
+                plan_diff(previous["content"], plan["content"], previous["version"], plan["version"]),
+            ))
+        return plan
+
+    def _invalidate(self, username: str) -> None:
+        self._cache.pop(username)
+
+    async def aget_plan(self, username: str) -> Dict:
+        return await run_blocking(self.get_plan, username)
+
+    async def awrite_plan(self, username: str, content: str) -> Dict:
+        return await run_blocking(self.write_plan, username, content)
+
+
+_plan_service: Optional[PlanService] = None
+_plan_service_lock = threading.Lock()
+
+def get_plan_service() -> PlanService:
+    """The process-wide PlanService, created on first use, over the plans in PLANS_DIR (default: ./plans)."""
+    global _plan_service
+    with _plan_service_lock:
+        if _plan_service is None:
+            _plan_service = PlanService(PlanManager(os.getenv("PLANS_DIR", "plans")))
+            if os.getenv("PLAN_WATCH", "0").lower() in ("1", "true", "yes"):
+                _plan_service.start_watcher(float(os.getenv("PLAN_WATCH_INTERVAL", "1.0")))
+        return _plan_service
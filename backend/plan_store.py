@@ -0,0 +1,233 @@
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Plan layout understood by the store and the plan edit operations:
+#   # Pregnancy Plan for <user>          <- header
+#   - **Due date:** 2026-03-01           <- fields, before the first section
+#   ## Appointments                      <- sections
+#   - [ ] 2026-08-10 First visit         <- checklist items (dated ones under an
+#                                           "Appointments" heading are appointments)
+FIELD_RE = re.compile(r"^(- )?\*\*(?P<name>[^*]+?):\*\*\s*(?P<value>.*)$")
+CHECKLIST_RE = re.compile(r"^(?P<indent>\s*)- \[(?P<mark>[ xX])\] (?P<text>.*)$")
+DATE_RE = re.compile(r"\b(\d{4}-\d{2}-\d{2})\b")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plans (
+    username TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    due_date TEXT
+);
+CREATE TABLE IF NOT EXISTS plan_sections (
+    username TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    heading TEXT,
+    PRIMARY KEY (username, position)
+);
+CREATE TABLE IF NOT EXISTS plan_lines (
+    username TEXT NOT NULL,
+    section INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    text TEXT NOT NULL,
+    done INTEGER,
+    indent TEXT,
+    field TEXT,
+    PRIMARY KEY (username, section, position)
+);
+CREATE TABLE IF NOT EXISTS appointments (
+    username TEXT NOT NULL,
+    date TEXT NOT NULL,
+    title TEXT NOT NULL,
+    done INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS plans_due_date ON plans (due_date);
+CREATE INDEX IF NOT EXISTS plan_lines_items ON plan_lines (kind, done);
+CREATE INDEX IF NOT EXISTS appointments_date ON appointments (date);
+CREATE INDEX IF NOT EXISTS appointments_username ON appointments (username);
+"""
+
+
+def split_sections(content: str) -> Tuple[List[str], List[Tuple[str, List[str]]]]:
+    """Split a plan into the lines before the first `## ` heading and (heading, body lines) pairs."""
+    preamble: List[str] = []
+    sections: List[Tuple[str, List[str]]] = []
+    for line in content.splitlines():
+        if line.startswith("## "):
+            sections.append((line[3:].strip(), []))
+        elif sections:
+            sections[-1][1].append(line)
+        else:
+            preamble.append(line)
+    return preamble, sections
+
+
+def join_sections(preamble: List[str], sections: List[Tuple[str, List[str]]]) -> str:
+    """Inverse of split_sections, keeping one blank line between blocks."""
+    lines = list(preamble)
+    for heading, body in sections:
+        while lines and not lines[-1].strip():
+            lines.pop()
+        lines += ["", f"## {heading}", *body]
+    return "\n".join(lines).strip("\n") + "\n"
+
+
+def find_section(sections: List[Tuple[str, List[str]]], heading: str) -> Optional[int]:
+    wanted = heading.strip().lstrip("#").strip().casefold()
+    for i, (existing, _) in enumerate(sections):
+        if existing.casefold() == wanted:
+            return i
+    return None
+
+
+class PlanStore:
+    """Pregnancy plans stored as rows in an embedded SQLite database.
+
+    Sections, lines, checklist items, fields, appointments and due dates are
+    rows, so questions like "who has an appointment next week" are indexed
+    lookups. Markdown is rendered on demand; PlanService caches it per plan version.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def version(self, username: str) -> Optional[Tuple[int, float]]:
+        """(version, updated_at) of a user's plan, or None if they have none."""
+        with self._lock:
+            row = self._conn.execute("SELECT version, updated_at FROM plans WHERE username = ?", (username,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def render(self, username: str) -> Optional[str]:
+        """The plan as Markdown, or None if the user has no plan."""
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM plans WHERE username = ?", (username,)).fetchone() is None:
+                return None
+            return self._render_rows(username)
+
+    def save(self, username: str, content: str) -> int:
+        """Replace a user's plan with the parsed Markdown. Returns the new version."""
+        rows = self._parse(username, content)
+        with self._transaction():
+            return self._write(username, rows)
+
+    def update(self, username: str, edit: Callable[[Optional[str]], str]) -> Tuple[int, str]:
+        """Read, edit and save a user's plan in one write transaction. Returns (new version, content).
+
+        `edit` gets the current Markdown (None if the user has no plan) and
+        returns the new plan. The transaction takes SQLite's write lock before
+        reading, so no other process can save in between and an edit is never lost.
+        """
+        with self._transaction():
+            exists = self._conn.execute("SELECT 1 FROM plans WHERE username = ?", (username,)).fetchone()
+            content = edit(self._render_rows(username) if exists else None)
+            version = self._write(username, self._parse(username, content))
+        return version, content
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _parse(self, username: str, content: str) -> Tuple[list, list, list, Optional[str]]:
+        """Section, line and appointment rows plus the due date of a Markdown plan."""
+        preamble, sections = split_sections(content)
+        blocks = [(None, preamble)] + [(heading, body) for heading, body in sections]
+        section_rows, line_rows, appointment_rows = [], [], []
+        due_date = None
+        for position, (heading, body) in enumerate(blocks):
+            section_rows.append((username, position, heading))
+            is_appointments = heading is not None and "appointment" in heading.casefold()
+            for line_position, line in enumerate(body):
+                kind, text, done, indent, field = self._classify(line, in_preamble=heading is None)
+                line_rows.append((username, position, line_position, kind, text, done, indent, field))
+                if field and field.casefold() == "due date":
+                    match = DATE_RE.search(text)
+                    due_date = match.group(1) if match else text
+                if is_appointments:
+                    match = DATE_RE.search(text)
+                    if match:
+                        appointment_rows.append((username, match.group(1), text, done or 0))
+        return section_rows, line_rows, appointment_rows, due_date
+
+    def _write(self, username: str, rows: Tuple[list, list, list, Optional[str]]) -> int:
+        """Replace the user's rows and bump the version; call inside _transaction()."""
+        section_rows, line_rows, appointment_rows, due_date = rows
+        row = self._conn.execute("SELECT version FROM plans WHERE username = ?", (username,)).fetchone()
+        version = (row[0] if row else 0) + 1
+        for table in ("plan_sections", "plan_lines", "appointments"):
+            self._conn.execute(f"DELETE FROM {table} WHERE username = ?", (username,))
+        self._conn.executemany("INSERT INTO plan_sections VALUES (?, ?, ?)", section_rows)
+        self._conn.executemany("INSERT INTO plan_lines VALUES (?, ?, ?, ?, ?, ?, ?, ?)", line_rows)
+        self._conn.executemany("INSERT INTO appointments VALUES (?, ?, ?, ?)", appointment_rows)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO plans (username, version, updated_at, due_date) VALUES (?, ?, ?, ?)",
+            (username, version, time.time(), due_date),
+        )
+        return version
+
+    def appointments_between(self, start: str, end: str) -> List[Dict]:
+        """Appointments dated start..end inclusive (ISO dates), across all users."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT username, date, title, done FROM appointments WHERE date BETWEEN ? AND ? ORDER BY date, username",
+                (start, end),
+            ).fetchall()
+        return [{"username": r[0], "date": r[1], "title": r[2], "done": bool(r[3])} for r in rows]
+
+    def users_due_between(self, start: str, end: str) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT username FROM plans WHERE due_date BETWEEN ? AND ? ORDER BY due_date", (start, end)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    @staticmethod
+    def _classify(line: str, in_preamble: bool) -> Tuple[str, str, Optional[int], Optional[str], Optional[str]]:
+        """(kind, text, done, indent, field name) for one Markdown line."""
+        match = CHECKLIST_RE.match(line)
+        if match:
+            return "item", match.group("text"), int(match.group("mark") != " "), match.group("indent"), None
+        match = FIELD_RE.match(line) if in_preamble else None
+        if match:
+            return "field", match.group("value"), None, None, match.group("name").strip()
+        return "text", line, None, None, None
+
+    def _render_rows(self, username: str) -> str:
+        headings = dict(self._conn.execute(
+            "SELECT position, heading FROM plan_sections WHERE username = ?", (username,)
+        ).fetchall())
+        lines: List[str] = []
+        current = None
+        for section, kind, text, done, indent, field in self._conn.execute(
+            "SELECT section, kind, text, done, indent, field FROM plan_lines WHERE username = ? ORDER BY section, position",
+            (username,),
+        ):
+            while current is None or current < section:
+                current = 0 if current is None else current + 1
+                if headings.get(current) is not None:
+                    lines.append(f"## {headings[current]}")
+            if kind == "item":
+                lines.append(f"{indent}- [{'x' if done else ' '}] {text}")
+            elif kind == "field":
+                lines.append(f"- **{field}:** {text}")
+            else:
+                lines.append(text)
+        # Trailing sections without any body lines
+        for position in sorted(p for p in headings if current is None or p > current):
+            if headings[position] is not None:
+                lines.append(f"## {headings[position]}")
+        return "\n".join(lines) + "\n"
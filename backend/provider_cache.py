@@ -0,0 +1,121 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+def normalize_location(location: str) -> str:
+    """Canonical form of a location so "Austin, TX" and " austin tx " share a cache entry."""
+    return " ".join(re.sub(r"[^\w\s]", " ", location.casefold()).split())
+
+
+class ProviderSearchCache:
+    """TTL + LRU cache of provider search results keyed by normalized location (and insurance).
+
+    Entries are kept in memory for millisecond hits and written through to a
+    SQLite file so they survive restarts. Both tiers hold at most `max_entries`,
+    evicting the least recently used.
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: float = 24 * 3600, max_entries: int = 1000):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()  # key -> (result, expires_at)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        # Shared by every worker process: WAL lets readers run during a write, the timeout waits out the writer
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS provider_search ("
+            "key TEXT PRIMARY KEY, result TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS provider_search_last_used ON provider_search (last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(location: str, insurance: Optional[str] = None) -> str:
+        return f"{normalize_location(location)}|{normalize_location(insurance or '')}"
+
+    def get(self, location: str, insurance: Optional[str] = None) -> Optional[str]:
+        """Return the cached result, or None on a miss or expired entry."""
+        key = self.key(location, insurance)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            from_disk = entry is None
+            if from_disk:
+                row = self._conn.execute(
+                    "SELECT result, expires_at FROM provider_search WHERE key = ?", (key,)
+                ).fetchone()
+                entry = tuple(row) if row else None
+
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[1] <= now:
+                self._memory.pop(key, None)
+                self._conn.execute("DELETE FROM provider_search WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+
+            self._remember(key, entry)
+            if from_disk:
+                # Memory hits don't touch the file, so disk recency is only tracked on promotion
+                self._conn.execute("UPDATE provider_search SET last_used = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+            self.hits += 1
+            return entry[0]
+
+    def put(self, location: str, result: str, insurance: Optional[str] = None) -> None:
+        key = self.key(location, insurance)
+        now = time.time()
+        entry = (result, now + self.ttl_seconds)
+        with self._lock:
+            self._remember(key, entry)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO provider_search (key, result, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, result, entry[1], now),
+            )
+            self._conn.execute(
+                "DELETE FROM provider_search WHERE key IN "
+                "(SELECT key FROM provider_search ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._memory)}
+
+    def _remember(self, key: str, entry: Tuple[str, float]) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+
+_provider_cache: Optional[ProviderSearchCache] = None
+_provider_cache_lock = threading.Lock()
+
+def get_provider_cache() -> ProviderSearchCache:
+    """The process-wide provider search cache, opened on first use.
+
+    PROVIDER_CACHE_DB sets the SQLite file (default: .cache/provider_search.sqlite
+    next to this module), PROVIDER_CACHE_TTL_SECONDS how long results are kept.
+    """
+    global _provider_cache
+    with _provider_cache_lock:
+        if _provider_cache is None:
+            _provider_cache = ProviderSearchCache(
+                db_path=os.getenv("PROVIDER_CACHE_DB", os.path.join(os.path.dirname(__file__), ".cache", "provider_search.sqlite")),
+                ttl_seconds=float(os.getenv("PROVIDER_CACHE_TTL_SECONDS", str(24 * 3600))),
+            )
+        return _provider_cache
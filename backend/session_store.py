@@ -0,0 +1,407 @@
+import asyncio
+import atexit
+import json
+import os
+import socket
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Hashable, List, Optional
+from urllib.parse import urlparse
+
+from idle_cache import MAX_RESIDENT_USERS, USER_IDLE_SECONDS, IdleCache
+
+
+class SessionStore(ABC):
+    """Per-user session state that every worker process can see.
+
+    Values are JSON-serializable. Plain keys hold single values (a user's
+    location, the last turn's prompt cache usage); list keys hold capped
+    append-only lists (conversation transcripts). The async variants run the
+    call in a worker thread so network or disk I/O doesn't block the event loop.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def get_list(self, key: str) -> List[Any]:
+        ...
+
+    @abstractmethod
+    def append(self, key: str, value: Any, max_len: Optional[int] = None) -> None:
+        """Append to a list, keeping only the last `max_len` items."""
+
+    def replace_list(self, key: str, values: List[Any]) -> None:
+        """Replace a whole list."""
+        self.delete(key)
+        for value in values:
+            self.append(key, value)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any) -> None:
+        await asyncio.to_thread(self.set, key, value)
+
+    async def aget_list(self, key: str) -> List[Any]:
+        return await asyncio.to_thread(self.get_list, key)
+
+    async def aappend(self, key: str, value: Any, max_len: Optional[int] = None) -> None:
+        await asyncio.to_thread(self.append, key, value, max_len)
+
+
+class _Resident:
+    """A key held in memory; dirty until written back to the spill store."""
+
+    __slots__ = ("value", "dirty")
+
+    def __init__(self, value: Any, dirty: bool):
+        self.value = value
+        self.dirty = dirty
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local store; only correct with a single worker.
+
+    With a `spill` store, keys that go unused for `idle_seconds`, or that
+    exceed `max_resident_keys` (least recently used first), are written to it
+    and dropped from memory; the next access reads them back. Without one,
+    everything stays resident for the life of the process.
+    """
+
+    def __init__(self, spill: Optional[SessionStore] = None, max_resident_keys: Optional[int] = None,
+                 idle_seconds: Optional[float] = None):
+        self.spill = spill
+        if spill is None:
+            self._resident = IdleCache()
+        else:
+            self._resident = IdleCache(max_resident_keys, idle_seconds, on_evict=self._write_back)
+        self._lock = threading.RLock()
+
+    def _entry(self, key: Hashable, create: bool) -> Optional[_Resident]:
+        """The resident entry of ("value" | "list", key), read back from the spill store if it was evicted."""
+        entry = self._resident.get(key)
+        if entry is None and (create or self.spill is not None):
+            kind, name = key
+            if self.spill is None:
+                value = [] if kind == "list" else None
+            else:
+                value = self.spill.get_list(name) if kind == "list" else self.spill.get(name)
+            # Absent keys are remembered too, so repeated misses don't go to the spill store
+            entry = _Resident(value, False)
+            self._resident.set(key, entry)
+        return entry
+
+    def _write_back(self, key: Hashable, entry: _Resident) -> None:
+        if entry.dirty:
+            kind, name = key
+            if kind == "list":
+                self.spill.replace_list(name, entry.value)
+            else:
+                self.spill.set(name, entry.value)
+            entry.dirty = False
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entry(("value", key), create=False)
+            return entry.value if entry else None
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._resident.set(("value", key), _Resident(value, True))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._resident.pop(("value", key))
+            self._resident.pop(("list", key))
+            if self.spill is not None:
+                self.spill.delete(key)
+
+    def get_list(self, key: str) -> List[Any]:
+        with self._lock:
+            entry = self._entry(("list", key), create=False)
+            return list(entry.value) if entry else []
+
+    def append(self, key: str, value: Any, max_len: Optional[int] = None) -> None:
+        with self._lock:
+            entry = self._entry(("list", key), create=True)
+            entry.value.append(value)
+            if max_len is not None:
+                del entry.value[:-max_len]
+            entry.dirty = True
+
+    def evict_idle(self) -> int:
+        """Spill the keys idle for longer than `idle_seconds`; returns how many went."""
+        with self._lock:
+            return self._resident.evict_idle()
+
+    def flush(self) -> None:
+        """Write every changed key to the spill store, keeping it resident."""
+        if self.spill is None:
+            return
+        with self._lock:
+            for key, entry in self._resident.items():
+                self._write_back(key, entry)
+
+    def resident_keys(self) -> int:
+        return len(self._resident)
+
+    # Nothing to wait on without a spill store, so skip the thread hop
+    async def aget(self, key: str) -> Optional[Any]:
+        return self.get(key) if self.spill is None else await super().aget(key)
+
+    async def aset(self, key: str, value: Any) -> None:
+        if self.spill is None:
+            self.set(key, value)
+        else:
+            await super().aset(key, value)
+
+    async def aget_list(self, key: str) -> List[Any]:
+        return self.get_list(key) if self.spill is None else await super().aget_list(key)
+
+    async def aappend(self, key: str, value: Any, max_len: Optional[int] = None) -> None:
+        if self.spill is None:
+            self.append(key, value, max_len)
+        else:
+            await super().aappend(key, value, max_len)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Store in a SQLite file, shared by the worker processes of one host."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS session_values (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS session_lists (id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, value TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS session_lists_key ON session_lists (key, id);
+        """)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM session_values WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO session_values (key, value) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                (key, json.dumps(value)),
+            )
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM session_values WHERE key = ?", (key,))
+            self._conn.execute("DELETE FROM session_lists WHERE key = ?", (key,))
+
+    def get_list(self, key: str) -> List[Any]:
+        with self._lock:
+            rows = self._conn.execute("SELECT value FROM session_lists WHERE key = ? ORDER BY id", (key,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def append(self, key: str, value: Any, max_len: Optional[int] = None) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("INSERT INTO session_lists (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+                if max_len is not None:
+                    self._conn.execute(
+                        "DELETE FROM session_lists WHERE key = ? AND id <= "
+                        "(SELECT id FROM session_lists WHERE key = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                        (key, key, max_len),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def replace_list(self, key: str, values: List[Any]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM session_lists WHERE key = ?", (key,))
+                self._conn.executemany("INSERT INTO session_lists (key, value) VALUES (?, ?)",
+                                       [(key, json.dumps(value)) for value in values])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+class RespError(Exception):
+    """Error reply from a Redis-protocol server."""
+
+
+class RespClient:
+    """Minimal client for the Redis serialization protocol (RESP2), with a small connection pool."""
+
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0, timeout: float = 5.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.timeout = timeout
+        self._idle: List[socket.socket] = []
+        self._lock = threading.Lock()
+
+    def execute(self, *args: Any) -> Any:
+        return self.pipeline([args])[0]
+
+    def pipeline(self, commands: List[tuple]) -> List[Any]:
+        """Send several commands in one round trip and return their replies in order."""
+        conn = self._acquire()
+        try:
+            conn.sendall(b"".join(self._encode(command) for command in commands))
+            reader = conn.makefile("rb")
+            replies = [self._read_reply(reader) for _ in commands]
+        except (OSError, RespError) as e:
+            conn.close()
+            if isinstance(e, RespError):
+                raise
+            raise ConnectionError(f"Redis-protocol server {self.host}:{self.port} failed: {str(e)}") from e
+        self._release(conn)
+        return replies
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def _acquire(self) -> socket.socket:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        conn = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.db:
+            conn.sendall(self._encode(("SELECT", self.db)))
+            self._read_reply(conn.makefile("rb"))
+        return conn
+
+    def _release(self, conn: socket.socket) -> None:
+        with self._lock:
+            self._idle.append(conn)
+
+    @staticmethod
+    def _encode(command: tuple) -> bytes:
+        parts = [b"*%d\r\n" % len(command)]
+        for arg in command:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    @classmethod
+    def _read_reply(cls, reader) -> Any:
+        line = reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        prefix, body = line[:1], line[1:-2]
+        if prefix == b"+":
+            return body.decode()
+        if prefix == b"-":
+            raise RespError(body.decode())
+        if prefix == b":":
+            return int(body)
+        if prefix == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)[:-2]
+            return data.decode()
+        if prefix == b"*":
+            length = int(body)
+            return None if length < 0 else [cls._read_reply(reader) for _ in range(length)]
+        raise RespError(f"Unexpected reply: {line!r}")
+
+
+class RedisSessionStore(SessionStore):
+    """Store in a Redis-protocol server (Redis, Valkey, or the local stand-in in mini_redis.py)."""
+
+    def __init__(self, url: str = "redis://localhost:6379/0", prefix: str = "babygpt:"):
+        parsed = urlparse(url)
+        self.prefix = prefix
+        self.client = RespClient(
+            host=parsed.hostname or "localhost",
+            port=parsed.port or 6379,
+            db=int(parsed.path.lstrip("/") or 0),
+        )
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.client.execute("GET", self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Any) -> None:
+        self.client.execute("SET", self.prefix + key, json.dumps(value))
+
+    def delete(self, key: str) -> None:
+        self.client.execute("DEL", self.prefix + key)
+
+    def get_list(self, key: str) -> List[Any]:
+        return [json.loads(value) for value in self.client.execute("LRANGE", self.prefix + key, 0, -1)]
+
+    def append(self, key: str, value: Any, max_len: Optional[int] = None) -> None:
+        commands = [("RPUSH", self.prefix + key, json.dumps(value))]
+        if max_len is not None:
+            commands.append(("LTRIM", self.prefix + key, -max_len, -1))
+        self.client.pipeline(commands)
+
+    def replace_list(self, key: str, values: List[Any]) -> None:
+        commands = [("DEL", self.prefix + key)]
+        if values:
+            commands.append(("RPUSH", self.prefix + key, *(json.dumps(value) for value in values)))
+        self.client.pipeline(commands)
+
+
+# Where the memory store puts idle sessions (SESSION_SPILL, "none" keeps everything in memory)
+DEFAULT_SPILL_URL = "sqlite:///" + os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "session-spill.sqlite")
+
+def create_session_store(url: str) -> SessionStore:
+    """Build a store from a URL: "memory", "sqlite:///path/to/file.sqlite" or "redis://host:port/db".
+
+    The memory store spills idle keys to SESSION_SPILL (a store URL, or "none");
+    at most SESSION_MAX_RESIDENT_KEYS keys (default: three per MAX_RESIDENT_USERS)
+    stay resident, none idle for longer than USER_IDLE_SECONDS.
+    """
+    if url == "memory":
+        spill_url = os.getenv("SESSION_SPILL", DEFAULT_SPILL_URL)
+        if spill_url == "none":
+            return InMemorySessionStore()
+        store = InMemorySessionStore(
+            spill=create_session_store(spill_url),
+            max_resident_keys=int(os.getenv("SESSION_MAX_RESIDENT_KEYS", str(3 * MAX_RESIDENT_USERS))),
+            idle_seconds=USER_IDLE_SECONDS,
+        )
+        atexit.register(store.flush)
+        return store
+    if url.startswith("sqlite:///"):
+        return SQLiteSessionStore(url[len("sqlite:///"):])
+    if url.startswith("redis://"):
+        return RedisSessionStore(url)
+    raise ValueError(f"Unsupported SESSION_STORE: {url}")
+
+
+_session_store: Optional[SessionStore] = None
+_session_store_lock = threading.Lock()
+
+def get_session_store() -> SessionStore:
+    """The process-wide store, configured by the SESSION_STORE environment variable (default: memory)."""
+    global _session_store
+    with _session_store_lock:
+        if _session_store is None:
+            _session_store = create_session_store(os.getenv("SESSION_STORE", "memory"))
+        return _session_store
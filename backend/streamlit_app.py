@@ -1,7 +1,6 @@
 import streamlit as st
-import asyncio
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, Iterator, List
 import sys
 import os
 
@@ -9,7 +8,8 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from agent_manager import AgentManager
-from plan_manager import PlanManager
+from background_loop import get_background_loop
+from plan_service import get_plan_service
 
 # Configure page
 st.set_page_config(
@@ -18,6 +18,14 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource
+def get_agent_manager() -> AgentManager:
+    """One agent engine for the whole Streamlit server, shared by every browser session.
+
+    Conversations are keyed by username, so sessions don't need their own graph.
+    """
+    return AgentManager()
+
 # Initialize session state
 if "username" not in st.session_state:
     st.session_state.username = ""
@@ -28,23 +36,22 @@ if "chat_history" not in st.session_state:
 if "pregnancy_plan" not in st.session_state:
     st.session_state.pregnancy_plan = ""
 if "agent_manager" not in st.session_state:
-    st.session_state.agent_manager = AgentManager()
-if "plan_manager" not in st.session_state:
-    st.session_state.plan_manager = PlanManager()
+    st.session_state.agent_manager = get_agent_manager()
 if "plan_last_modified" not in st.session_state:
     st.session_state.plan_last_modified = None
+if "plan_subscription" not in st.session_state:
+    st.session_state.plan_subscription = None
 
 
 
-async def create_user(username: str) -> bool:
+def create_user(username: str) -> bool:
     """Initialize a new user conversation."""
     try:
-        # Start conversation with agent manager
-        initial_response_chunks = []
-        async for chunk in st.session_state.agent_manager.start_conversation(username):
-            initial_response_chunks.append(chunk)
-        
-        initial_response = "".join(initial_response_chunks)
+        # Start conversation with agent manager; the generator runs on the background loop,
+        # session state is only touched here on the script thread
+        initial_response = "".join(get_background_loop().iterate(
+            st.session_state.agent_manager.start_conversation(username)
+        ))
         
         if initial_response:
             st.session_state.chat_history.append({
@@ -58,56 +65,60 @@ async def create_user(username: str) -> bool:
         return False
 
 def get_pregnancy_plan(username: str) -> tuple[str, float]:
-    """Fetch the current pregnancy plan from file system."""
+    """Fetch the current pregnancy plan from the plan store."""
     try:
-        # First try to get from file system (persistent storage)
-        plan_content = st.session_state.plan_manager.read_plan(username)
+        plan = get_plan_service().get_plan(username)
         
-        if plan_content:
-            # Get file modification time for change detection
-            plan_path = st.session_state.plan_manager.get_plan_path(username)
-            import os
-            mod_time = os.path.getmtime(plan_path) if os.path.exists(plan_path) else 0
-            return plan_content, mod_time
+        if plan["content"]:
+            # Use the plan's last update time for change detection
+            mod_time = datetime.fromisoformat(plan["last_updated"]).timestamp()
+            return plan["content"], mod_time
         else:
             return "No plan available yet.", 0
     except Exception as e:
         return f"Error loading plan: {str(e)}", 0
 
-async def send_message(username: str, message: str) -> str:
-    """Send a message and get response."""
-    try:
-        response_chunks = []
-        async for chunk in st.session_state.agent_manager.process_message(username, message):
-            response_chunks.append(chunk)
-        return "".join(response_chunks)
-    except Exception as e:
-        return f"Error: {str(e)}"
+def stream_reply(username: str, message: str, progress, outcome: Dict) -> Iterator[str]:
+    """Yield the reply's tokens as they arrive, for st.write_stream.
 
-def run_async(coro):
-    """Helper function to run async code in Streamlit."""
-    try:
-        # Try to get the current event loop
-        loop = asyncio.get_running_loop()
-        # If we're already in an event loop, we can't use run_until_complete
-        # Use asyncio.run instead which creates a new event loop
-        import concurrent.futures
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future = executor.submit(asyncio.run, coro)
-            return future.result()
-    except RuntimeError:
-        # No event loop is running, safe to use asyncio.run
-        return asyncio.run(coro)
+    Tool calls are reported in a status box created in `progress` on the first
+    one. Errors end the stream and are left in outcome["error"].
+    """
+    status = None
+    frames = st.session_state.agent_manager.stream_turn(username, message)
+    for frame in get_background_loop().iterate(frames):
+        if frame["type"] == "token":
+            yield frame["content"]
+        elif frame["type"] == "tool_start":
+            if status is None:
+                status = progress.status("Working on it...", expanded=False)
+            status.update(label=f"🔧 {frame['name']}...", state="running")
+            status.write(f"🔧 {frame['name']}")
+        elif frame["type"] == "tool_end" and status is not None:
+            status.write(f"✅ {frame['name']} done")
+        elif frame["type"] == "error":
+            outcome["error"] = frame["content"]
+    if status is not None:
+        status.update(label="✅ Tools finished", state="error" if "error" in outcome else "complete")
 
 def check_plan_updates():
-    """Check for plan updates and refresh if needed."""
+    """Apply plan changes pushed since the last run; the plan is only read once, on subscribe."""
     if st.session_state.user_created and st.session_state.username:
-        plan_content, mod_time = get_pregnancy_plan(st.session_state.username)
-        
-        # If plan was updated since last check
-        if mod_time != st.session_state.plan_last_modified and mod_time > 0:
+        subscription = st.session_state.plan_subscription
+        if subscription is None or subscription.username != st.session_state.username:
+            # Subscribe before the initial read so no change can slip in between
+            subscription = get_plan_service().events.subscribe(st.session_state.username)
+            st.session_state.plan_subscription = subscription
+            plan_content, mod_time = get_pregnancy_plan(st.session_state.username)
             st.session_state.pregnancy_plan = plan_content
             st.session_state.plan_last_modified = mod_time
+            return False
+
+        changes = subscription.poll()
+        if changes:
+            latest = changes[-1]
+            st.session_state.pregnancy_plan = latest.content
+            st.session_state.plan_last_modified = datetime.fromisoformat(latest.last_updated).timestamp()
             return True
     return False
 
@@ -121,6 +132,54 @@ st.title("🤱 BabyGPT - Your Pregnancy Assistant")
 if plan_updated:
     st.success("📋 Your pregnancy plan has been updated!")
 
+# Re-run just the plan panel periodically; pushed changes are applied without reading the plan again
+@st.fragment(run_every=2 if st.session_state.get("auto_refresh", True) else None)
+def plan_panel():
+    """Pregnancy plan section of the sidebar."""
+    st.header("📋 Your Pregnancy Plan")
+
+    if check_plan_updates():
+        st.toast("📋 Plan updated!", icon="✅")
+    mod_time = st.session_state.plan_last_modified or 0
+
+    # Manual refresh button
+    if st.button("🔄 Refresh Plan"):
+        plan_content, mod_time = get_pregnancy_plan(st.session_state.username)
+        st.session_state.pregnancy_plan = plan_content
+        st.session_state.plan_last_modified = mod_time
+        st.success("Plan refreshed!")
+    
+    # Display the plan
+    if st.session_state.pregnancy_plan and st.session_state.pregnancy_plan != "No plan available yet.":
+        # Plan statistics at the top
+        plan_lines = len([line for line in st.session_state.pregnancy_plan.split('\n') if line.strip()])
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("📊 Plan Lines", plan_lines)
+        with col2:
+            if mod_time > 0:
+                last_updated = datetime.fromtimestamp(mod_time).strftime('%m/%d %H:%M')
+                st.metric("🕒 Last Updated", last_updated)
+        
+        # Show plan in an expandable container for better readability
+        with st.expander("📋 View Full Plan", expanded=True):
+            st.markdown(st.session_state.pregnancy_plan)
+        
+        # Download button
+        st.download_button(
+            label="📥 Download Plan",
+            data=st.session_state.pregnancy_plan,
+            file_name=f"{st.session_state.username}_pregnancy_plan.md",
+            mime="text/markdown",
+            help="Download your pregnancy plan as a Markdown file"
+        )
+    else:
+        st.info("Your personalized pregnancy plan will appear here as you chat with the assistant.")
+        
+        # Check if plan exists but failed to load
+        if st.session_state.pregnancy_plan.startswith("Error"):
+            st.error("Failed to load plan. Please check your username or try refreshing.")
+
 # Sidebar for user setup and pregnancy plan
 with st.sidebar:
     st.header("👤 User Profile")
@@ -133,7 +192,7 @@ with st.sidebar:
             if submit_user and username_input:
                 st.session_state.username = username_input
                 with st.spinner("Initializing your pregnancy assistant..."):
-                    success = run_async(create_user(username_input))
+                    success = create_user(username_input)
                 if success:
                     st.session_state.user_created = True
                     st.success(f"Welcome, {username_input}! 🎉")
@@ -153,55 +212,7 @@ with st.sidebar:
     
     # Pregnancy Plan Section
     if st.session_state.user_created:
-        st.header("📋 Your Pregnancy Plan")
-        
-        # Auto-refresh plan with change detection
-        plan_content, mod_time = get_pregnancy_plan(st.session_state.username)
-        
-        # Check if plan has been updated
-        if mod_time != st.session_state.plan_last_modified:
-            st.session_state.pregnancy_plan = plan_content
-            st.session_state.plan_last_modified = mod_time
-            if mod_time > 0:  # Only show update notification if file exists
-                st.toast("📋 Plan updated!", icon="✅")
-        
-        # Manual refresh button
-        if st.button("🔄 Refresh Plan"):
-            plan_content, mod_time = get_pregnancy_plan(st.session_state.username)
-            st.session_state.pregnancy_plan = plan_content
-            st.session_state.plan_last_modified = mod_time
-            st.success("Plan refreshed!")
-        
-        # Display the plan
-        if st.session_state.pregnancy_plan and st.session_state.pregnancy_plan != "No plan available yet.":
-            # Plan statistics at the top
-            plan_lines = len([line for line in st.session_state.pregnancy_plan.split('\n') if line.strip()])
-            col1, col2 = st.columns(2)
-            with col1:
-                st.metric("📊 Plan Lines", plan_lines)
-            with col2:
-                if mod_time > 0:
-                    last_updated = datetime.fromtimestamp(mod_time).strftime('%m/%d %H:%M')
-                    st.metric("🕒 Last Updated", last_updated)
-            
-            # Show plan in an expandable container for better readability
-            with st.expander("📋 View Full Plan", expanded=True):
-                st.markdown(st.session_state.pregnancy_plan)
-            
-            # Download button
-            st.download_button(
-                label="📥 Download Plan",
-                data=st.session_state.pregnancy_plan,
-                file_name=f"{st.session_state.username}_pregnancy_plan.md",
-                mime="text/markdown",
-                help="Download your pregnancy plan as a Markdown file"
-            )
-        else:
-            st.info("Your personalized pregnancy plan will appear here as you chat with the assistant.")
-            
-            # Check if plan exists but failed to load
-            if st.session_state.pregnancy_plan.startswith("Error"):
-                st.error("Failed to load plan. Please check your username or try refreshing.")
+        plan_panel()
 
 # Main chat interface
 if st.session_state.user_created:
@@ -234,17 +245,16 @@ if st.session_state.user_created:
             st.caption(f"*{user_message['timestamp']}*")
         
         # Get assistant response
+        # Tokens render as they arrive; plan changes reach the sidebar through its own refresh
         with st.chat_message("assistant"):
-            with st.spinner("Getting response..."):
-                response = run_async(send_message(st.session_state.username, prompt))
+            progress = st.empty()
+            outcome = {}
+            response = st.write_stream(stream_reply(st.session_state.username, prompt, progress, outcome))
             
-            if response and not response.startswith("Error:"):
-                st.write(response)
+            if "error" not in outcome:
                 timestamp = datetime.now().strftime("%H:%M")
                 st.caption(f"*{timestamp}*")
                 
-
-                
                 # Add assistant message to history
                 assistant_message = {
                     "role": "assistant",
@@ -252,15 +262,8 @@ if st.session_state.user_created:
                     "timestamp": timestamp
                 }
                 st.session_state.chat_history.append(assistant_message)
-                
-                # Refresh pregnancy plan after interaction (plan will auto-update on next rerun)
-                # Force a slight delay to ensure plan file is written
-                import time
-                time.sleep(0.1)
-                
-                st.rerun()
             else:
-                st.error(f"Failed to get response: {response}")
+                st.error(f"Failed to get response: {outcome['error']}")
 
 else:
     # Welcome screen
@@ -306,14 +309,11 @@ st.markdown(
 # Auto-refresh toggle in sidebar
 if st.session_state.user_created:
     st.sidebar.markdown("---")
-    auto_refresh = st.sidebar.checkbox("🔄 Auto-refresh plan", value=True, 
-                                      help="Automatically check for plan updates")
+    auto_refresh = st.sidebar.checkbox("🔄 Auto-refresh plan", value=True, key="auto_refresh",
+                                      help="Show plan updates as soon as they are pushed")
     
     if auto_refresh:
-        # Add a small delay and rerun to create auto-refresh effect
-        import time
         if st.sidebar.button("🔁 Check for updates now"):
-            time.sleep(0.1)  # Small delay
             st.rerun()
 
 # Development info
@@ -322,5 +322,5 @@ if st.sidebar.button("🔧 Debug Info"):
         st.write("**Session State:**")
         debug_state = {k: str(v)[:100] + "..." if len(str(v)) > 100 else v 
                       for k, v in st.session_state.items() 
-                      if k not in ["agent_manager", "plan_manager"]}
+                      if k not in ["agent_manager", "plan_subscription"]}
         st.write(debug_state) 
\ No newline at end of file
@@ -5,7 +5,7 @@ from typing_extensions import TypedDict
 from langgraph.graph import StateGraph, START
 from langgraph.graph.message import add_messages
 import os
-from DatabricksClient import DatabricksChatModel
+from DatabricksClient import get_chat_model
 
 
 class State(TypedDict):
@@ -18,7 +18,7 @@ class State(TypedDict):
 graph_builder = StateGraph(State)
 
 # Initialize the Databricks chat model
-llm = DatabricksChatModel()
+llm = get_chat_model()
 
 def chatbot(state: State):
     return {"messages": [llm.invoke(state["messages"])]}
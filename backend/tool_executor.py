@@ -0,0 +1,24 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+# Tool calls of one model step run concurrently (the graph's tool node gathers
+# their coroutines); the blocking parts of those tools (plan and location I/O,
+# the provider cache) run on this bounded pool instead of the event loop
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "8"))
+
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="babygpt-tool")
+
+
+async def run_blocking(func: Callable[..., T], *args: Any) -> T:
+    """Run blocking tool work on the bounded tool pool without blocking the event loop.
+
+    Like asyncio.to_thread, the call sees the caller's context variables (e.g. the current trace span).
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_tool_executor, functools.partial(context.run, func, *args))
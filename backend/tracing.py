@@ -0,0 +1,212 @@
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+# Histogram buckets (seconds) for /metrics; they aggregate across workers, the quantiles don't
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Span:
+    """A timed stage of a request, shaped like an OpenTelemetry span."""
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.status = "OK"
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self._start = time.perf_counter()
+        self.duration = 0.0
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def elapsed(self) -> float:
+        """Seconds since the span started."""
+        return time.perf_counter() - self._start
+
+    def end(self) -> None:
+        self.duration = time.perf_counter() - self._start
+        self.end_ns = self.start_ns + int(self.duration * 1e9)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "attributes": self.attributes,
+            "status": self.status,
+        }
+
+
+class JsonlSpanExporter:
+    """Appends finished spans to a file, one JSON object per line."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", buffering=1)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+
+class ConsoleSpanExporter:
+    """Prints one line per finished span to stderr."""
+
+    def export(self, span: Span) -> None:
+        attributes = " ".join(f"{k}={v}" for k, v in span.attributes.items())
+        print(f"[trace {span.trace_id[:8]}] {span.name} {span.duration * 1000:.1f}ms {span.status} {attributes}", file=sys.stderr)
+
+
+class StageMetrics:
+    """Per-stage latency histograms, recent-sample quantiles and token counters."""
+
+    def __init__(self, window: int = 2048):
+        self.window = window
+        self._buckets: Dict[str, List[int]] = defaultdict(lambda: [0] * len(BUCKETS))
+        self._sum: Dict[str, float] = defaultdict(float)
+        self._count: Dict[str, int] = defaultdict(int)
+        self._errors: Dict[str, int] = defaultdict(int)
+        self._recent: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=self.window))
+        self._tokens: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, error: bool = False) -> None:
+        with self._lock:
+            buckets = self._buckets[stage]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            self._sum[stage] += seconds
+            self._count[stage] += 1
+            self._recent[stage].append(seconds)
+            if error:
+                self._errors[stage] += 1
+
+    def add_tokens(self, kind: str, count: int) -> None:
+        with self._lock:
+            self._tokens[kind] += count
+
+    def quantiles(self) -> Dict[str, Dict[str, float]]:
+        """p50/p95/p99 (seconds) per stage over the most recent `window` samples."""
+        with self._lock:
+            recent = {stage: sorted(samples) for stage, samples in self._recent.items()}
+        return {
+            stage: {f"p{int(q * 100)}": samples[min(int(q * len(samples)), len(samples) - 1)] for q in QUANTILES}
+            for stage, samples in recent.items() if samples
+        }
+
+    def render_prometheus(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        quantiles = self.quantiles()
+        lines = [
+            "# HELP babygpt_stage_duration_seconds Duration of each stage of a request.",
+            "# TYPE babygpt_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            for stage in sorted(self._count):
+                for bound, count in zip(BUCKETS, self._buckets[stage]):
+                    lines.append(f'babygpt_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'babygpt_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {self._count[stage]}')
+                lines.append(f'babygpt_stage_duration_seconds_sum{{stage="{stage}"}} {self._sum[stage]}')
+                lines.append(f'babygpt_stage_duration_seconds_count{{stage="{stage}"}} {self._count[stage]}')
+            lines += [
+                "# HELP babygpt_stage_duration_quantile_seconds Recent duration quantiles of each stage, per process.",
+                "# TYPE babygpt_stage_duration_quantile_seconds gauge",
+            ]
+            for stage, values in sorted(quantiles.items()):
+                for q in QUANTILES:
+                    lines.append(f'babygpt_stage_duration_quantile_seconds{{stage="{stage}",quantile="{q}"}} {values[f"p{int(q * 100)}"]}')
+            lines += [
+                "# HELP babygpt_stage_errors_total Stages that ended with an error.",
+                "# TYPE babygpt_stage_errors_total counter",
+            ]
+            for stage in sorted(self._errors):
+                lines.append(f'babygpt_stage_errors_total{{stage="{stage}"}} {self._errors[stage]}')
+            lines += [
+                "# HELP babygpt_model_tokens_total Prompt and completion tokens of model calls.",
+                "# TYPE babygpt_model_tokens_total counter",
+            ]
+            for kind in sorted(self._tokens):
+                lines.append(f'babygpt_model_tokens_total{{kind="{kind}"}} {self._tokens[kind]}')
+        return "\n".join(lines) + "\n"
+
+
+class Tracer:
+    """Creates spans, feeds their durations into the stage metrics and hands them to the exporters.
+
+    Spans nest through a context variable, so a span opened inside another
+    (in the same task, or a task created within it) becomes its child.
+    """
+
+    def __init__(self, exporters: Optional[List[Any]] = None, metrics: Optional[StageMetrics] = None):
+        self.exporters = exporters or []
+        self.metrics = metrics or StageMetrics()
+        self._current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+    def start(self, name: str, parent: Optional[Span] = None, **attributes: Any) -> Span:
+        """Start a span without making it current (for spans that end in a callback)."""
+        parent = parent or self._current.get()
+        return Span(name, parent.trace_id if parent else secrets.token_hex(16), parent.span_id if parent else None, attributes)
+
+    def finish(self, span: Span, error: Optional[BaseException] = None) -> None:
+        span.end()
+        if error is not None:
+            span.status = "ERROR"
+            span.attributes["error"] = f"{type(error).__name__}: {error}"
+        self.metrics.observe(span.name, span.duration, error is not None)
+        for exporter in self.exporters:
+            exporter.export(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        span = self.start(name, **attributes)
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self.finish(span, e)
+            raise
+        else:
+            self.finish(span)
+        finally:
+            try:
+                self._current.reset(token)
+            except ValueError:
+                pass  # closed from another context, e.g. an abandoned async generator
+
+    def current(self) -> Optional[Span]:
+        return self._current.get()
+
+
+def _exporters_from_env() -> List[Any]:
+    """TRACE_EXPORT: comma separated "console" and/or "jsonl:<path>" (default: none)."""
+    exporters = []
+    for target in filter(None, (t.strip() for t in os.getenv("TRACE_EXPORT", "").split(","))):
+        if target == "console":
+            exporters.append(ConsoleSpanExporter())
+        elif target.startswith("jsonl:"):
+            exporters.append(JsonlSpanExporter(target[len("jsonl:"):]))
+        else:
+            raise ValueError(f"Unsupported TRACE_EXPORT target: {target}")
+    return exporters
+
+
+tracer = Tracer(exporters=_exporters_from_env())
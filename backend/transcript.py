@@ -0,0 +1,42 @@
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, NamedTuple
+
+
+class TranscriptMessage(NamedTuple):
+    """One displayed message of a conversation, as stored in the session store.
+
+    A named tuple has no per-instance dict, roles are interned and the
+    timestamp is milliseconds since the epoch (0 when unknown), so a resident
+    transcript costs a fraction of the equivalent dicts with ISO timestamp
+    strings. It is stored as a JSON array: [role, content, timestamp].
+    """
+
+    role: str
+    content: str
+    timestamp: int = 0
+
+    @classmethod
+    def now(cls, role: str, content: str) -> "TranscriptMessage":
+        return cls(sys.intern(role), content, int(time.time() * 1000))
+
+    @classmethod
+    def from_stored(cls, value: Any) -> "TranscriptMessage":
+        """Rebuild from what a store returns: the tuple itself, a JSON array, or a dict from older versions."""
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, dict):
+            timestamp = value.get("timestamp")
+            if isinstance(timestamp, str):
+                timestamp = int(datetime.fromisoformat(timestamp).timestamp() * 1000)
+            return cls(sys.intern(value["role"]), value["content"], timestamp or 0)
+        role, content, timestamp = value
+        return cls(sys.intern(role), content, timestamp)
+
+    def to_dict(self) -> Dict[str, str]:
+        """The message as the API returns it: role, content and an ISO timestamp (if known)."""
+        message = {"role": self.role, "content": self.content}
+        if self.timestamp:
+            message["timestamp"] = datetime.fromtimestamp(self.timestamp / 1000).isoformat()
+        return message
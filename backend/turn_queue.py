@@ -0,0 +1,140 @@
+import asyncio
+from collections import defaultdict
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from tracing import tracer
+
+
+class _Batch:
+    """One model turn and everyone waiting for its frames."""
+
+    def __init__(self):
+        self.messages: List[str] = []
+        self.subscribers: List[asyncio.Queue] = []
+        self.task: Optional[asyncio.Task] = None
+
+    def subscribe(self, maxsize: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize)
+        self.subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> bool:
+        """Drop a subscriber that stopped reading. Cancels the turn if it was the last one and returns True."""
+        self.subscribers.remove(queue)
+        # A publish may be waiting for room in this queue; emptying it lets that put finish
+        while not queue.empty():
+            queue.get_nowait()
+        if not self.subscribers and not self.task.done():
+            self.task.cancel()
+            return True
+        return False
+
+    async def publish(self, frame: Optional[Dict]) -> None:
+        # Waits while a subscriber's queue is full, so slow readers slow the turn down
+        for queue in list(self.subscribers):
+            if queue in self.subscribers:  # may have left while an earlier put waited
+                await queue.put(frame)
+
+
+class TurnQueue:
+    """Runs each user's turns one at a time, in arrival order.
+
+    Messages sent while a turn is in flight (a quick follow-up, a second tab)
+    wait for it instead of running a second graph execution against the same
+    conversation. With `coalesce`, all messages that arrive while a turn is in
+    flight are joined into the next turn, so a burst costs one model call,
+    and every sender receives that turn's frames.
+
+    Each sender's frames are buffered up to `max_buffered_frames`; beyond that
+    the turn waits for the slowest reader. A turn whose senders have all
+    stopped reading (e.g. their websockets closed) is cancelled, which
+    cancels the model and tool calls it is waiting on.
+    """
+
+    def __init__(self, coalesce: bool = False, max_buffered_frames: int = 64):
+        self.coalesce = coalesce
+        self.max_buffered_frames = max_buffered_frames
+        self.cancelled = 0
+        self.submitted = 0
+        self.turns_run = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._depth: Dict[str, int] = defaultdict(int)  # username -> queued + running turns
+        self._open: Dict[str, _Batch] = {}  # username -> batch still accepting messages
+
+    async def submit(self, username: str, message: str,
+                     run: Callable[[str, str], AsyncIterator[Dict]]) -> AsyncIterator[Dict]:
+        """Queue a message and yield the frames of the turn that answers it."""
+        self.submitted += 1
+        batch = self._open.get(username) if self.coalesce else None
+        if batch is None:
+            batch = _Batch()
+            if self.coalesce:
+                self._open[username] = batch
+            self._depth[username] += 1
+            self.max_depth = max(self.max_depth, self._depth[username])
+            batch.task = asyncio.create_task(self._run(username, batch, run))
+        else:
+            self.coalesced += 1
+        batch.messages.append(message)
+
+        queue = batch.subscribe(self.max_buffered_frames)
+        finished = False
+        try:
+            while True:
+                frame = await queue.get()
+                if frame is None:
+                    finished = True
+                    return
+                yield frame
+        finally:
+            # The reader is gone (closed generator or cancelled task)
+            if not finished and batch.unsubscribe(queue):
+                self.cancelled += 1
+
+    async def _run(self, username: str, batch: _Batch, run: Callable[[str, str], AsyncIterator[Dict]]) -> None:
+        lock = self._locks.setdefault(username, asyncio.Lock())
+        try:
+            # The wait span ends with an error if the turn is cancelled before its turn comes
+            with tracer.span("turn.queue_wait", username=username):
+                await lock.acquire()
+            try:
+                # From here on, new messages start the next batch
+                if self._open.get(username) is batch:
+                    del self._open[username]
+                self.turns_run += 1
+                with tracer.span("turn", username=username, messages=len(batch.messages)):
+                    if len(batch.messages) > 1:
+                        await batch.publish({"type": "coalesced", "messages": len(batch.messages)})
+                    # Closed right away when the turn is cancelled, so the generator's cleanup runs in this task
+                    async with aclosing(run(username, "\n\n".join(batch.messages))) as frames:
+                        async for frame in frames:
+                            await batch.publish(frame)
+            finally:
+                lock.release()
+        except Exception as e:
+            await batch.publish({"type": "error", "content": f"Error processing message: {str(e)}"})
+        finally:
+            if self._open.get(username) is batch:
+                del self._open[username]  # cancelled while still waiting for its turn
+            self._depth[username] -= 1
+            if not self._depth[username]:
+                del self._depth[username]
+                self._locks.pop(username, None)
+            await batch.publish(None)
+
+    def stats(self) -> Dict[str, int]:
+        """Queue depth and coalescing counters."""
+        depths = list(self._depth.values())
+        return {
+            "running_turns": len(depths),
+            "queued_turns": sum(depth - 1 for depth in depths),
+            "max_user_depth": max(depths, default=0),
+            "max_depth_seen": self.max_depth,
+            "submitted": self.submitted,
+            "turns_run": self.turns_run,
+            "coalesced": self.coalesced,
+            "cancelled": self.cancelled,
+        }